@@ -0,0 +1,42 @@
+from flask import Blueprint, Response, request
+
+from api import v2
+from api.records import AsyncAPI, parse_fields, split_slugs
+from service.record.codec import record_dict
+
+aio = Blueprint("aio", __name__, url_prefix="/v2/async")
+api = AsyncAPI(v2.api)
+
+
+@aio.route("/records/<id>/<version>", methods=["GET"])
+async def get_record(id: str, version: str) -> Response:
+    """Get record by id slug, ?fields=a,b limits data to those keys."""
+    record = await api.get_records(
+        id, version=version, fields=parse_fields(request.args.getlist("fields"))
+    )
+    return api.response(record_dict(record))
+
+
+@aio.route("/records/<id>/<version>", methods=["POST"])
+async def post_record(id: str, version: str) -> tuple[str, int]:
+    """Update or create if id slug found in data store."""
+    data = request.json
+    await api.post_records(id, data, version=version)
+    return ("", 204)
+
+
+@aio.route("/records", methods=["GET"])
+async def get_records() -> Response:
+    """Get many records by ?slugs=1,2,3 at ?version=, defaults to latest."""
+    results = await api.get_records_many(
+        split_slugs(request.args.getlist("slugs")),
+        version=request.args.get("version", "latest"),
+    )
+    return api.response({"results": results})
+
+
+@aio.route("/records/<id>/versions", methods=["GET"])
+async def get_versions(id: str) -> Response:
+    """Get versions by id slug."""
+    versions = await api.get_versions(id)
+    return api.response({"versions": versions})
@@ -1,16 +1,81 @@
-from flask import Blueprint
+import cProfile
+import pathlib
+import time
+from datetime import datetime
+from typing import Any
 
+from flask import Blueprint, current_app, g, request
+
+from api.aio import aio
+from api.v1 import api as v1_api
 from api.v1 import v1
+from api.v2 import api as v2_api
 from api.v2 import v2
+from metrics import metrics
+from pool import pool_stats
+from service.record.cached import CachedRecordService
 
 records_api = Blueprint("api", __name__, url_prefix="/api")
 
 
+@records_api.before_request
+def start_metrics() -> None:
+    """Time the request and collect its SQL and codec time, profile it if enabled."""
+    if not current_app.config["METRICS"]:
+        return
+
+    g.metrics_token = metrics.start_request()
+    if current_app.config["PROFILE_SLOW_MS"] is not None:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+    g.request_start = time.perf_counter()
+
+
+@records_api.teardown_request
+def finish_metrics(error: BaseException | None) -> None:
+    """Record the request in metrics and dump its profile if it was slow."""
+    if "request_start" not in g:
+        return
+
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or "unknown"
+    metrics.finish_request(endpoint, elapsed, g.metrics_token)
+
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+
+    profiler.disable()
+    if elapsed * 1e3 >= current_app.config["PROFILE_SLOW_MS"]:
+        directory = pathlib.Path(current_app.config["PROFILE_DIR"])
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / (
+            f"{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint}-{elapsed * 1e3:.0f}ms.prof"
+        )
+        profiler.dump_stats(path)
+        current_app.logger.warning("Slow request %s, profile in %s", request.path, path)
+
+
 @records_api.route("/health")
 def health() -> dict[str, bool]:
     """Return ok response."""
     return {"ok": True}
 
 
+@records_api.route("/metrics")
+def get_metrics() -> dict[str, Any]:
+    """Return latency histograms, time spent per request and pool and cache counters."""
+    return {
+        **metrics.snapshot(),
+        "pools": pool_stats(),
+        "caches": {
+            name: api.service.stats()
+            for name, api in (("v1", v1_api), ("v2", v2_api))
+            if isinstance(api.service, CachedRecordService)
+        },
+    }
+
+
 records_api.register_blueprint(v1)
 records_api.register_blueprint(v2)
+records_api.register_blueprint(aio)
@@ -7,6 +7,12 @@ class ResourceNotFound(HTTPException):
     code = 404
 
 
+class NotSupportedError(HTTPException):
+    """Raised when the record backend cannot serve a request."""
+
+    code = 501
+
+
 class ResourceKeyInvalidError(HTTPException):
     """Raised for invalid record key."""
 
@@ -1,22 +1,173 @@
-import logging
+import hashlib
+import itertools
+import json
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Any
 
-from api.exceptions import ResourceNotFound
+from flask import Request, Response
+from werkzeug.http import is_resource_modified
+
+from api.exceptions import (
+    NotSupportedError,
+    ResourceKeyInvalidError,
+    ResourceNotFound,
+)
 from entity.record import Record
-from service.record.base import RecordDoesNotExistError
+from service.record.aio import DEFAULT_MAX_WORKERS, AsyncRecordService
+from service.record.base import Change, RecordDoesNotExistError
+from service.record.cached import CachedRecordService
+from service.record.codec import (
+    Codec,
+    CompressedCodec,
+    JsonCodec,
+    change_dict,
+    deflate_splice,
+    record_dict,
+)
+from service.record.instrumented import InstrumentedRecordService
+from service.record.search import SearchResult, parse_path
 
 if TYPE_CHECKING:
     from service.record.base import RecordService
 
-logger = logging.getLogger(__name__)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# where=path=value integers are bound as sqlite integers, which are signed 64-bit
+MIN_WHERE_INT = -(2**63)
+MAX_WHERE_INT = 2**63 - 1
+# numbered versions never change, so clients and CDNs may keep them for a year,
+# also after prune-history deleted them from the database
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# longest ?wait= of a change long poll, in seconds
+MAX_CHANGES_WAIT = 30.0
+# waiters check the change log this often for writes made by other processes
+CHANGES_POLL_INTERVAL = 1.0
+# idle event streams send a comment this often so proxies keep them open
+CHANGES_HEARTBEAT = 15.0
+
+
+def split_slugs(values: list[str]) -> list[str]:
+    """Get slugs from repeated and/or comma separated query values."""
+    return [slug for value in values for slug in value.split(",") if slug]
+
+
+def parse_fields(values: list[str]) -> list[str] | None:
+    """Get the data keys of a ?fields=a,b projection, None for all of them."""
+    return split_slugs(values) or None
+
+
+def parse_where(values: list[str]) -> dict[str, Any]:
+    """Get data path filters from ?where=path=value, values are JSON or else text."""
+    where: dict[str, Any] = {}
+    for condition in values:
+        path, sep, text = condition.partition("=")
+        try:
+            parse_path(path)
+        except ValueError as e:
+            raise ResourceKeyInvalidError(description=str(e)) from e
+        try:
+            value = json.loads(text)
+        except ValueError:
+            value = text
+        if not sep or not isinstance(value, (str, int, float)):
+            raise ResourceKeyInvalidError(
+                description="Expected where=path=value with a string, number or boolean"
+            )
+        if isinstance(value, int) and not MIN_WHERE_INT <= value <= MAX_WHERE_INT:
+            raise ResourceKeyInvalidError(
+                description="Expected a where=path=value integer in the 64-bit range"
+            )
+        where[path] = value
+
+    return where
+
+
+def parse_timestamp(value: str | None) -> datetime:
+    """Parse an ISO 8601 query value into the naive local time records are stored in."""
+    try:
+        timestamp = datetime.fromisoformat(value or "")
+    except ValueError as e:
+        raise ResourceKeyInvalidError(
+            description="Expected an ISO 8601 timestamp"
+        ) from e
+
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+
+    return timestamp
+
+
+def many_results(
+    slugs: list[str], records: dict[str, "Record | None"]
+) -> list[dict[str, Any]]:
+    """Get one found or missing result per requested slug, in request order."""
+    results: list[dict[str, Any]] = []
+    for slug in slugs:
+        record = records.get(slug)
+        if record is None:
+            results.append({"slug": slug, "status": "missing"})
+        else:
+            results.append(
+                {"slug": slug, "status": "found", "record": record_dict(record)}
+            )
+
+    return results
+
+
+def validators(slug: str, version: int | None, timestamp: Any) -> tuple[str, datetime]:
+    """Get the ETag and Last-Modified time of one version of a record."""
+    etag = hashlib.blake2b(
+        repr((slug, version, str(timestamp))).encode(), digest_size=12
+    ).hexdigest()
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+
+    # stored timestamps are naive local time
+    return etag, timestamp.astimezone(timezone.utc)
 
 
 class API:
     """Record API."""
 
-    def __init__(self, service: "RecordService") -> None:
-        """Create a Record API instance."""
-        self.service = service
+    def __init__(
+        self, service: "RecordService", cache: bool = True, codec: Codec | None = None
+    ) -> None:
+        """Create a Record API instance, reads go through an LRU cache by default."""
+        self.codec = codec or JsonCodec()
+        # build single record bodies from the stored data column, see stored_response
+        self.passthrough = False
+        # writes through this API bump the generation and wake change waiters
+        self._changed = threading.Condition()
+        self._generation = 0
+        self.use(service, cache)
+
+    def use(
+        self,
+        service: "RecordService",
+        cache: bool = True,
+        codec: Codec | None = None,
+        passthrough: bool = False,
+        instrument: bool = True,
+    ) -> None:
+        """Serve requests from another record service and the codec it stores with.
+
+        Service calls are timed in metrics unless instrument is off, cache hits are
+        not service calls.
+        """
+        if instrument:
+            service = InstrumentedRecordService(service)
+        self.service = CachedRecordService(service) if cache else service
+        self.codec = codec or self.codec
+        self.passthrough = passthrough
+
+    def response(self, body: Any, status: int = 200) -> Response:
+        """Encode body as a JSON response."""
+        return Response(
+            self.codec.encode(body), status=status, mimetype="application/json"
+        )
 
     def get_records(self, id: str, **kwargs: Any) -> "Record":
         """Get record by id."""
@@ -25,19 +176,389 @@ class API:
         except RecordDoesNotExistError as e:
             raise ResourceNotFound from e
 
+    def record_response(
+        self, request: Request, id: str, immutable: bool = False, **kwargs: Any
+    ) -> Response:
+        """Respond with record by id, or with 304 if the client's copy is current.
+
+        Conditional requests are checked against a version-only lookup, so the
+        record is only read and encoded when it changed.
+        """
+        if request.if_none_match or request.if_modified_since:
+            try:
+                version, timestamp = self.service.get_record_stamp(id, **kwargs)
+            except RecordDoesNotExistError as e:
+                raise ResourceNotFound from e
+
+            etag, last_modified = validators(id, version, timestamp)
+            if not is_resource_modified(
+                request.environ, etag, last_modified=last_modified
+            ):
+                return self._cacheable(
+                    Response(status=304), etag, last_modified, immutable
+                )
+
+        # stored bodies hold every field
+        if self.passthrough and kwargs.get("fields") is None:
+            response = self.stored_response(request, id, immutable, **kwargs)
+            if response is not None:
+                return response
+
+        record = self.get_records(id, **kwargs)
+        etag, last_modified = validators(id, record.version, record.timestamp)
+
+        return self._cacheable(
+            self.response(record_dict(record)), etag, last_modified, immutable
+        )
+
+    def stored_response(
+        self, request: Request, id: str, immutable: bool = False, **kwargs: Any
+    ) -> Response | None:
+        """Respond with a body spliced around the stored data, without decoding it.
+
+        Compressed data is passed on as is to clients accepting deflate. Returns
+        None when the service or codec cannot provide the stored JSON.
+        """
+        try:
+            stored = self.service.get_record_stored(id, **kwargs)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+        if stored is None:
+            return None
+
+        meta = record_dict(
+            Record(stored.slug, {}, version=stored.version, timestamp=stored.timestamp)
+        )
+        del meta["data"]
+        head = (self.codec.encode(meta)[:-1] + ',"data":').encode()
+        tail = b"}"
+
+        response: Response | None = None
+        if isinstance(stored.value, str):
+            response = self._json_response(head + stored.value.encode() + tail)
+        elif isinstance(self.codec, CompressedCodec):
+            body = None
+            if request.accept_encodings["deflate"]:
+                body = deflate_splice(head, stored.value, tail)
+            if body is not None:
+                response = self._json_response(body)
+                response.content_encoding = "deflate"
+            else:
+                text = self.codec.inflate(stored.value)
+                response = self._json_response(head + text.encode() + tail)
+        if response is None:
+            return None
+
+        response.vary.add("Accept-Encoding")
+        etag, last_modified = validators(id, stored.version, stored.timestamp)
+
+        # deflated bodies differ from identity ones byte for byte, not in content
+        return self._cacheable(
+            response,
+            etag,
+            last_modified,
+            immutable,
+            weak=response.content_encoding == "deflate",
+        )
+
+    @staticmethod
+    def _json_response(body: bytes) -> Response:
+        return Response(body, mimetype="application/json")
+
+    @staticmethod
+    def _cacheable(
+        response: Response,
+        etag: str,
+        last_modified: datetime,
+        immutable: bool,
+        weak: bool = False,
+    ) -> Response:
+        response.set_etag(etag, weak)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            # may be stored, but has to be revalidated with the ETag before reuse
+            response.cache_control.no_cache = True
+
+        return response
+
+    def stream(self, bodies: Iterable[Any]) -> Response:
+        """Encode bodies as a newline delimited JSON response, one line per body."""
+        lines = (self.codec.encode(body) + "\n" for body in bodies)
+        return Response(lines, mimetype="application/x-ndjson")
+
+    def get_record_as_of(self, id: str, timestamp: datetime) -> "Record":
+        """Get the version of record that was latest at timestamp."""
+        try:
+            return self.service.get_record_as_of(id, timestamp)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream every record as it was at timestamp."""
+        return self.service.iter_records_as_of(timestamp)
+
+    def get_records_many(self, slugs: list[str], **kwargs: Any) -> list[dict[str, Any]]:
+        """Get many records, missing records are reported per item."""
+        if not slugs:
+            raise ResourceKeyInvalidError(description="Expected at least one slug")
+
+        return many_results(slugs, self.service.get_records_many(slugs, **kwargs))
+
     def post_records(self, id: str, data: dict[str, str | None], **kwargs: Any) -> None:
-        """Create record or update if exists."""
-        try:  # record exists
-            self.service.get_record(id, **kwargs)
-            self.service.update_record(id, data, **kwargs)
+        """Create record or update if exists, in one write transaction."""
+        self.service.upsert_record(id, data, **kwargs)
+        self.notify_changed()
+
+    def post_records_many(self, items: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        """Create or update many records, invalid items are reported per item."""
+        if not isinstance(items, list):
+            raise ResourceKeyInvalidError(description="Expected a list of records")
+
+        results: list[dict[str, Any]] = [{} for _ in items]
+        valid = []
+        for i, item in enumerate(items):
+            if (
+                isinstance(item, dict)
+                and isinstance(item.get("slug"), (str, int))
+                and isinstance(item.get("data"), dict)
+            ):
+                valid.append(i)
+            else:
+                slug = item.get("slug") if isinstance(item, dict) else None
+                results[i] = {
+                    "slug": slug,
+                    "status": "error",
+                    "error": "Expected an object with slug and data",
+                }
 
-        except RecordDoesNotExistError as e:  # record does not exist
-            logger.warn(f"Record not found {e}")
-            # exclude deletions
-            revised_data = {k: v for k, v in data.items() if v}
+        records = [(str(items[i]["slug"]), items[i]["data"]) for i in valid]
+        for i, result in zip(valid, self.service.bulk_upsert(records, **kwargs)):
+            results[i] = result
+        self.notify_changed()
 
-            self.service.create_record(Record(id, revised_data, **kwargs))
+        return results
 
     def get_versions(self, id: str, **kwargs: Any) -> list[int]:
         """Get all versions by id."""
-        return self.service.get_versions(id, **kwargs)
+        try:
+            return self.service.get_versions(id, **kwargs)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+
+    def get_versions_page(
+        self, id: str, cursor: str | None, limit: str | None
+    ) -> tuple[list[int], str | None]:
+        """Get a page of versions by id, cursor comes from the previous page."""
+        try:
+            after = int(cursor) if cursor else None
+            page_size = int(limit) if limit else DEFAULT_PAGE_SIZE
+        except ValueError as e:
+            raise ResourceKeyInvalidError(description="Invalid cursor or limit") from e
+
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ResourceKeyInvalidError(
+                description=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            )
+
+        try:
+            versions, next_after = self.service.get_versions_page(id, after, page_size)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+
+        return versions, None if next_after is None else str(next_after)
+
+    def diff_versions(
+        self, id: str, old: str | None, new: str | None
+    ) -> dict[str, Any]:
+        """Get the changes from version old to new by id, new defaults to latest."""
+        new = new or "latest"
+        if old is None or not all(
+            version == "latest" or version.isdigit() for version in (old, new)
+        ):
+            raise ResourceKeyInvalidError(
+                description="Expected from and to versions, numbers or latest"
+            )
+
+        try:
+            return self.service.diff_versions(id, old, new)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        cursor: str | None,
+        limit: str | None,
+        timestamp: str | None = None,
+    ) -> SearchResult:
+        """Get a page of records matching where after cursor, the last slug seen.
+
+        Searches latest versions, or the versions at timestamp if given.
+        """
+        try:
+            page_size = int(limit) if limit else DEFAULT_PAGE_SIZE
+        except ValueError as e:
+            raise ResourceKeyInvalidError(description="Invalid limit") from e
+
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ResourceKeyInvalidError(
+                description=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            )
+
+        return self.service.search_records(
+            where,
+            cursor or None,
+            page_size,
+            parse_timestamp(timestamp) if timestamp else None,
+        )
+
+    def iter_history(self, id: str) -> Iterator["Record"]:
+        """Stream every version by id, raises before streaming if there is none."""
+        records = self.service.iter_history(id)
+        first = next(records, None)
+        if first is None:
+            raise ResourceNotFound
+
+        return itertools.chain([first], records)
+
+    def get_changes(
+        self, cursor: str | None, limit: str | None, wait: str | None = None
+    ) -> tuple[list[Change], str]:
+        """Get a page of changes after cursor, the seq of the last change seen.
+
+        With wait, an empty page is only returned after waiting that many seconds
+        for a change. The returned cursor continues after the page.
+        """
+        try:
+            after = int(cursor) if cursor else 0
+            page_size = int(limit) if limit else DEFAULT_PAGE_SIZE
+            timeout = float(wait) if wait else 0.0
+        except ValueError as e:
+            raise ResourceKeyInvalidError(
+                description="Invalid cursor, limit or wait"
+            ) from e
+
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ResourceKeyInvalidError(
+                description=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+            )
+        if not 0 <= timeout <= MAX_CHANGES_WAIT:
+            raise ResourceKeyInvalidError(
+                description=f"wait must be between 0 and {MAX_CHANGES_WAIT:.0f}"
+            )
+
+        changes = self.wait_changes(after, page_size, timeout)
+
+        return changes, str(changes[-1].seq if changes else after)
+
+    def wait_changes(self, after: int, limit: int, timeout: float) -> list[Change]:
+        """Get changes after a seq, waiting up to timeout seconds for the first one.
+
+        Writes through this API wake waiters at once, writes made by other processes
+        are seen on the next poll of the change log.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self._generation
+            try:
+                changes = self.service.get_changes(after, limit)
+            except NotImplementedError as e:
+                raise NotSupportedError(
+                    description="The record backend keeps no change log"
+                ) from e
+
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes
+
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._generation != generation,
+                    min(remaining, CHANGES_POLL_INTERVAL),
+                )
+
+    def change_events(self, cursor: str | None) -> Response:
+        """Push changes after cursor as server-sent events until the client leaves.
+
+        Event ids are change seqs, so reconnecting clients resume with Last-Event-ID.
+        """
+        changes, position = self.get_changes(cursor, None)
+
+        def events() -> Iterator[str]:
+            pending, after = changes, int(position)
+            while True:
+                for change in pending:
+                    body = self.codec.encode(change_dict(change))
+                    yield f"id: {change.seq}\nevent: change\ndata: {body}\n\n"
+                if pending:
+                    after = pending[-1].seq
+
+                pending = self.wait_changes(after, DEFAULT_PAGE_SIZE, CHANGES_HEARTBEAT)
+                if not pending:
+                    yield ": keep-alive\n\n"
+
+        return Response(
+            events(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    def notify_changed(self) -> None:
+        """Wake change waiters after a write."""
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+
+class AsyncAPI:
+    """Record API for async views, service calls run on a DB executor."""
+
+    def __init__(self, api: API, max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        """Create an async API sharing the service and cache of a sync API."""
+        self.api = api
+        self._service = AsyncRecordService(api.service, max_workers)
+
+    @property
+    def service(self) -> AsyncRecordService:
+        """Async front for the service the sync API currently uses."""
+        self._service.service = self.api.service
+        return self._service
+
+    def response(self, body: Any, status: int = 200) -> Response:
+        """Encode body as a JSON response."""
+        return self.api.response(body, status)
+
+    async def get_records(self, id: str, **kwargs: Any) -> "Record":
+        """Get record by id."""
+        try:
+            return await self.service.get_record(id, **kwargs)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
+
+    async def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Get many records, missing records are reported per item."""
+        if not slugs:
+            raise ResourceKeyInvalidError(description="Expected at least one slug")
+
+        records = await self.service.get_records_many(slugs, **kwargs)
+        return many_results(slugs, records)
+
+    async def post_records(
+        self, id: str, data: dict[str, str | None], **kwargs: Any
+    ) -> None:
+        """Create record or update if exists, in one write transaction."""
+        await self.service.upsert_record(id, data, **kwargs)
+        self.api.notify_changed()
+
+    async def get_versions(self, id: str, **kwargs: Any) -> list[int]:
+        """Get all versions by id."""
+        try:
+            return await self.service.get_versions(id, **kwargs)
+        except RecordDoesNotExistError as e:
+            raise ResourceNotFound from e
@@ -1,18 +1,22 @@
-import jsonpickle
-from flask import Blueprint, request
+from flask import Blueprint, Response, request
 
-from api.records import API
+from api.records import API, parse_fields, split_slugs
 from service.record.v1 import SqliteRecordService
 
 v1 = Blueprint("v1", __name__, url_prefix="/v1")
-api = API(SqliteRecordService())
+service = SqliteRecordService()
+api = API(service, codec=service.codec)
 
 
 @v1.route("/records/<id>", methods=["GET"])
-def get_record(id: str) -> str:
-    """Get record by id, return record or 404."""
-    record = api.get_records(id)
-    return jsonpickle.encode(record)
+def get_record(id: str) -> Response:
+    """Get record by id, return record, 304 if the client's copy is current or 404.
+
+    ?fields=a,b limits data to those keys.
+    """
+    return api.record_response(
+        request, id, fields=parse_fields(request.args.getlist("fields"))
+    )
 
 
 @v1.route("/records/<id>", methods=["POST"])
@@ -21,3 +25,17 @@ def post_record(id: str) -> tuple[str, int]:
     data = request.json
     api.post_records(id, data)
     return ("", 204)
+
+
+@v1.route("/records", methods=["GET"])
+def get_records() -> Response:
+    """Get many records by ?slugs=1,2,3, missing slugs are reported per item."""
+    results = api.get_records_many(split_slugs(request.args.getlist("slugs")))
+    return api.response({"results": results})
+
+
+@v1.route("/records", methods=["POST"])
+def post_records() -> Response:
+    """Create or update a list of {slug, data} records in one transaction."""
+    results = api.post_records_many(request.json)
+    return api.response({"results": results})
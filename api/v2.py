@@ -1,19 +1,33 @@
-import jsonpickle
-from flask import Blueprint, request
+from flask import Blueprint, Response, request
 
-from api.records import API
+from api.records import (
+    API,
+    parse_fields,
+    parse_timestamp,
+    parse_where,
+    split_slugs,
+)
+from service.record.codec import change_dict, record_dict
 from service.record.v2 import RecordRevisionHistoryService
 
 v2 = Blueprint("v2", __name__, url_prefix="/v2")
 service = RecordRevisionHistoryService()
-api = API(service)
+api = API(service, codec=service.codec)
 
 
 @v2.route("/records/<id>/<version>", methods=["GET"])
-def get_record(id: str, version: str) -> str:
-    """Get record by id slug."""
-    record = api.get_records(id, version=version)
-    return jsonpickle.encode(record)
+def get_record(id: str, version: str) -> Response:
+    """Get record by id slug, numbered versions are cacheable for good.
+
+    ?fields=a,b limits data to those keys.
+    """
+    return api.record_response(
+        request,
+        id,
+        immutable=version != "latest",
+        version=version,
+        fields=parse_fields(request.args.getlist("fields")),
+    )
 
 
 @v2.route("/records/<id>/<version>", methods=["POST"])
@@ -24,8 +38,111 @@ def post_record(id: str, version: str) -> tuple[str, int]:
     return ("", 204)
 
 
+@v2.route("/records/<id>/as-of", methods=["GET"])
+def get_record_as_of(id: str) -> Response:
+    """Get the version of a record that was latest at ?timestamp=."""
+    timestamp = parse_timestamp(request.args.get("timestamp"))
+    record = api.get_record_as_of(id, timestamp)
+    return api.response(record_dict(record))
+
+
+@v2.route("/snapshot", methods=["GET"])
+def get_snapshot() -> Response:
+    """Stream every record as of ?timestamp= as newline delimited JSON."""
+    timestamp = parse_timestamp(request.args.get("timestamp"))
+    records = api.iter_records_as_of(timestamp)
+    return api.stream(record_dict(record) for record in records)
+
+
+@v2.route("/records", methods=["GET"])
+def get_records() -> Response:
+    """Get many records by ?slugs=1,2,3 at ?version=, defaults to latest."""
+    results = api.get_records_many(
+        split_slugs(request.args.getlist("slugs")),
+        version=request.args.get("version", "latest"),
+    )
+    return api.response({"results": results})
+
+
+@v2.route("/records", methods=["POST"])
+def post_records() -> Response:
+    """Create or update a list of {slug, data} records, one new version per slug."""
+    results = api.post_records_many(request.json)
+    return api.response({"results": results})
+
+
+@v2.route("/records/<id>/diff", methods=["GET"])
+def get_diff(id: str) -> Response:
+    """Get the changes between versions ?from= and ?to=, which defaults to latest.
+
+    Added and changed keys map to their new values and removed keys to null.
+    """
+    changes = api.diff_versions(id, request.args.get("from"), request.args.get("to"))
+    return api.response({"changes": changes})
+
+
+@v2.route("/search", methods=["GET"])
+def search() -> Response:
+    """Find records by ?where=path=value of their data, paginated by slug.
+
+    Searches latest versions, or those at ?timestamp=, and reports the database
+    indexes used and whether every record was read.
+    """
+    result = api.search_records(
+        parse_where(request.args.getlist("where")),
+        request.args.get("cursor"),
+        request.args.get("limit"),
+        request.args.get("timestamp"),
+    )
+    return api.response(
+        {
+            "results": [record_dict(record) for record in result.records],
+            "next_cursor": result.next_after,
+            "indexes": result.indexes,
+            "scanned": result.scanned,
+        }
+    )
+
+
 @v2.route("/records/<id>/versions", methods=["GET"])
-def get_versions(id: str) -> list[str]:
-    """Get versions by id slug."""
+def get_versions(id: str) -> Response:
+    """Get versions by id slug, paginated with ?limit= and ?cursor=."""
+    if "cursor" in request.args or "limit" in request.args:
+        versions, next_cursor = api.get_versions_page(
+            id, request.args.get("cursor"), request.args.get("limit")
+        )
+        return api.response({"versions": versions, "next_cursor": next_cursor})
+
     versions = api.get_versions(id)
-    return jsonpickle.encode({"versions": versions}, 200)
+    return api.response({"versions": versions})
+
+
+@v2.route("/changes", methods=["GET"])
+def get_changes() -> Response:
+    """Get changes after ?cursor=, waiting up to ?wait= seconds for the first one."""
+    changes, next_cursor = api.get_changes(
+        request.args.get("cursor"),
+        request.args.get("limit"),
+        request.args.get("wait"),
+    )
+    return api.response(
+        {
+            "changes": [change_dict(change) for change in changes],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@v2.route("/changes/stream", methods=["GET"])
+def stream_changes() -> Response:
+    """Push changes as server-sent events, resuming after Last-Event-ID or ?cursor=."""
+    return api.change_events(
+        request.headers.get("Last-Event-ID", request.args.get("cursor"))
+    )
+
+
+@v2.route("/records/<id>/history", methods=["GET"])
+def get_history(id: str) -> Response:
+    """Stream every version of a record as newline delimited JSON, oldest first."""
+    records = api.iter_history(id)
+    return api.stream(record_dict(record) for record in records)
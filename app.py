@@ -1,13 +1,101 @@
+import pathlib
+from typing import Any
+
 from flask import Flask
 
 import db
+from api import v1, v2
 from api.api import records_api
+from commands import history_services, prune_history_command
+from pool import configure_pool
+from service.record.base import RecordService
+from service.record.codec import CompressedCodec
+from service.record.registry import BACKENDS, create_service
+from service.record.sharded import ShardedRecordService, shard_files
+
+# Override with create_app(config) or FLASK_ prefixed environment variables, e.g.
+# FLASK_RECORD_DB=/dev/shm/records.db or FLASK_RECORD_BACKEND_V2=memory. Values
+# are parsed as JSON, so FLASK_RECORD_POOL='{"size": 16}' works.
+DEFAULT_CONFIG: dict[str, Any] = {
+    "RECORD_BACKEND_V1": "sqlite",
+    "RECORD_BACKEND_V2": "sqlite-history",
+    # service attributes to override, e.g. {"storage_mode": "delta"}
+    "RECORD_OPTIONS_V1": {},
+    "RECORD_OPTIONS_V2": {},
+    "RECORD_DB": db.dbname,
+    # ConnectionPool arguments, e.g. {"size": 16, "timeout": 1.0}
+    "RECORD_POOL": {},
+    "RECORD_CACHE": True,
+    # dotted data paths /api/v2/search finds through indexes, e.g. ["address.city"],
+    # indexes of paths no longer listed are dropped
+    "RECORD_INDEXES": [],
+    # CompressedCodec arguments, e.g. {"threshold": 1024}, zdict_file names a
+    # preset dictionary file. Empty leaves data uncompressed.
+    "RECORD_COMPRESSION": {},
+    # latency histograms and per request SQL/codec time, served at /api/metrics
+    "METRICS": True,
+    # dump a cProfile of requests slower than this many ms to PROFILE_DIR, the
+    # profiler runs for every request while set, so keep it off in production
+    "PROFILE_SLOW_MS": None,
+    "PROFILE_DIR": "profiles",
+}
+
+
+def create_app(config: dict[str, Any] | None = None) -> Flask:
+    """Create the app with record backends chosen from config and environment."""
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    app.register_blueprint(records_api)
+    app.cli.add_command(prune_history_command)
+
+    app.logger.info("Initializing DB!")
+    configure_records(app.config)
+
+    return app
+
+
+def configure_records(config: dict[str, Any]) -> None:
+    """Point the v1 and v2 APIs at the configured record services."""
+    compression = dict(config["RECORD_COMPRESSION"])
+    if "zdict_file" in compression:
+        compression["zdict"] = pathlib.Path(compression.pop("zdict_file")).read_bytes()
+
+    initialized: set[str] = set()
+    for name, version in (("V1", v1), ("V2", v2)):
+        backend = config[f"RECORD_BACKEND_{name}"]
+        options = dict(config[f"RECORD_OPTIONS_{name}"])
+        if hasattr(BACKENDS.get(backend), "db_name"):
+            options.setdefault("db_name", config["RECORD_DB"])
+        if compression and hasattr(BACKENDS.get(backend), "codec"):
+            options.setdefault("codec", CompressedCodec(**compression))
+
+        service = create_service(backend, **options)
+        for db_name in database_files(service):
+            if db_name not in initialized:
+                db.initialize_db(db_name)
+                if config["RECORD_POOL"]:
+                    configure_pool(db_name, **config["RECORD_POOL"])
+                initialized.add(db_name)
 
-app = Flask(__name__)
+        if version is v2:
+            for history in history_services(service):
+                history.create_indexes(config["RECORD_INDEXES"])
+        version.api.use(
+            service,
+            config["RECORD_CACHE"],
+            codec=getattr(service, "codec", None),
+            passthrough=isinstance(getattr(service, "codec", None), CompressedCodec),
+            instrument=config["METRICS"],
+        )
 
-print("Starting up!")
 
-app.register_blueprint(records_api)
+def database_files(service: RecordService) -> list[str]:
+    """Get the database files service keeps records in, each shard has its own."""
+    if isinstance(service, ShardedRecordService):
+        return shard_files(service.db_name, service.shards)
 
-print("Initializing DB!")
-db.initialize_db()
+    db_name = getattr(service, "db_name", None)
+    return [] if db_name is None else [db_name]
@@ -0,0 +1,50 @@
+"""Point in time lookups and snapshots over a deep revision history.
+
+Run with ``python -m benchmarks.bench_as_of [records] [depth]``.
+"""
+import random
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.common import report, temporary_db
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def main(records: int = 1000, depth: int = 100) -> None:
+    """Time as-of lookups of single records and a full snapshot."""
+    with temporary_db() as db_name:
+        service = RecordRevisionHistoryService()
+        service.db_name = db_name
+
+        checkpoints = []
+        for revision in range(depth):
+            service.bulk_upsert(
+                [(str(slug), {"revision": f"{revision}"}) for slug in range(records)]
+            )
+            checkpoints.append(datetime.now())
+
+        lookups = 2000
+        start = time.perf_counter()
+        for _ in range(lookups):
+            service.get_record_as_of(
+                str(random.randrange(records)), random.choice(checkpoints)
+            )
+        lookup_us = (time.perf_counter() - start) / lookups * 1e6
+
+        start = time.perf_counter()
+        count = sum(1 for _ in service.iter_records_as_of(checkpoints[depth // 2]))
+        snapshot_rate = count / (time.perf_counter() - start)
+
+    report(
+        f"{records:,} records x {depth} versions",
+        {
+            "single slug lookup (us)": lookup_us,
+            "snapshot (records/s)": snapshot_rate,
+        },
+        "",
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
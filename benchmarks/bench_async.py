@@ -0,0 +1,92 @@
+"""Sync vs async record reads with many requests in flight.
+
+Run with ``python -m benchmarks.bench_async [in flight] [requests]``.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections.abc import Callable
+
+from benchmarks.common import make_app, report, temporary_db
+from service.record.aio import AsyncRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def threaded(fn: Callable[[int], object], in_flight: int, requests: int) -> float:
+    """Run requests calls of fn from in_flight threads and return calls per second."""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def work() -> None:
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            fn(i)
+
+    workers = [threading.Thread(target=work) for _ in range(in_flight)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    return requests / (time.perf_counter() - start)
+
+
+def gathered(service: AsyncRecordService, in_flight: int, requests: int) -> float:
+    """Run requests reads as tasks on one event loop, in_flight at a time."""
+
+    async def run() -> None:
+        limit = asyncio.Semaphore(in_flight)
+
+        async def read(i: int) -> None:
+            async with limit:
+                await service.get_record(str(i % 1000))
+
+        await asyncio.gather(*(read(i) for i in range(requests)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+
+    return requests / (time.perf_counter() - start)
+
+
+def main(in_flight: int = 64, requests: int = 5000) -> None:
+    """Compare threaded and async reads through the service and the views."""
+    with temporary_db() as db_name:
+        service = RecordRevisionHistoryService()
+        service.db_name = db_name
+        service.bulk_upsert([(str(i), {"n": str(i)}) for i in range(1000)])
+
+        async_service = AsyncRecordService(service)
+        report(
+            f"service, {in_flight} in flight",
+            {
+                f"sync, {in_flight} threads": threaded(
+                    lambda i: service.get_record(str(i % 1000)), in_flight, requests
+                ),
+                "async, one event loop": gathered(async_service, in_flight, requests),
+            },
+        )
+        async_service.close()
+
+        client = make_app(db_name, RECORD_CACHE=False).test_client()
+
+        def views(prefix: str) -> float:
+            return threaded(
+                lambda i: client.get(f"{prefix}/records/{i % 1000}/latest"),
+                in_flight,
+                requests,
+            )
+
+        report(
+            f"views, {in_flight} threads",
+            {"sync view": views("/api/v2"), "async view": views("/api/v2/async")},
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,57 @@
+"""Compare bulk_upsert with one get/update-or-create per record.
+
+Run with ``python -m benchmarks.bench_bulk [sizes...]``.
+"""
+import sys
+import time
+
+from benchmarks.common import report, temporary_db
+from entity.record import Record
+from service.record.base import RecordDoesNotExistError, RecordService
+from service.record.v1 import SqliteRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def per_record(service: RecordService, items: list[tuple[str, dict[str, str]]]) -> None:
+    """The path API.post_records takes for every single POST."""
+    for slug, data in items:
+        try:
+            service.get_record(slug)
+            service.update_record(slug, data)
+        except RecordDoesNotExistError:
+            service.create_record(Record(slug, data))
+
+
+def run(size: int) -> dict[str, float]:
+    """Get records/s of a second write pass per service and write path."""
+    # half of the second pass updates existing records, half creates new ones
+    first = [(str(i), {"name": f"record {i}"}) for i in range(size // 2)]
+    second = [(str(i), {"n": f"{i}"}) for i in range(size // 4, size // 4 + size)]
+    results = {}
+    for service_class in (SqliteRecordService, RecordRevisionHistoryService):
+        for name, write in (
+            ("per record", per_record),
+            ("bulk_upsert", lambda s, items: s.bulk_upsert(items)),
+        ):
+            with temporary_db() as db_name:
+                service = service_class()
+                service.db_name = db_name
+                service.bulk_upsert(first)
+
+                start = time.perf_counter()
+                write(service, second)
+                elapsed = time.perf_counter() - start
+
+            results[f"{service_class.__name__} {name}"] = size / elapsed
+
+    return results
+
+
+def main(*sizes: int) -> None:
+    """Report bulk and per record writes for each batch size."""
+    for size in sizes or (1000, 10000, 100000):
+        report(f"{size:,} records", run(size), "records/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
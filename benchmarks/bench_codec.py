@@ -0,0 +1,28 @@
+"""Encode and decode cost per record size for jsonpickle and the JSON codec.
+
+Run with ``python -m benchmarks.bench_codec [repeat]``.
+"""
+import sys
+import timeit
+
+from benchmarks.common import report
+from service.record.codec import JsonCodec, JsonPickleCodec
+
+
+def main(repeat: int = 200) -> None:
+    """Report encode and decode time per codec and record size."""
+    codecs = {"jsonpickle": JsonPickleCodec(), "json": JsonCodec()}
+    for keys in (10, 100, 1000, 10000):
+        data = {f"key{k}": {"value": f"value-{k}", "n": k} for k in range(keys)}
+        rows = {}
+        for name, codec in codecs.items():
+            text = codec.encode(data)
+            encode = timeit.timeit(lambda: codec.encode(data), number=repeat)
+            decode = timeit.timeit(lambda: codec.decode(text), number=repeat)
+            rows[f"{name} encode"] = encode / repeat * 1e6
+            rows[f"{name} decode"] = decode / repeat * 1e6
+        report(f"{keys} keys, {len(text):,} bytes", rows, "us")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""Stored size, codec cost and GET latency of compressed record data.
+
+Run with ``python -m benchmarks.bench_compression [repeat]``.
+"""
+import sys
+import time
+import timeit
+
+from benchmarks.common import make_app, report, temporary_db
+from service.record.codec import CompressedCodec, JsonCodec
+
+SIZES = {"1 KB": 1_000, "10 KB": 10_000, "100 KB": 100_000, "1 MB": 1_000_000}
+
+
+def make_data(size: int, seed: int = 0) -> dict[str, object]:
+    """Build record data of roughly size bytes of JSON, shaped like user records."""
+    data: dict[str, object] = {}
+    length = i = 0
+    while length < size:
+        data[f"field{i}"] = field = {
+            "name": f"record {seed}-{i}",
+            "tags": ["alpha", "beta", str(i % 7)],
+            "score": (i * 37 + seed) % 1000,
+        }
+        length += len(str(field))
+        i += 1
+
+    return data
+
+
+def main(repeat: int = 50) -> None:
+    """Report codec sizes and costs, then GET latency per encoding."""
+    plain = JsonCodec()
+    compressed = CompressedCodec(plain)
+    zdict = CompressedCodec(
+        plain,
+        zdict=CompressedCodec.train([make_data(2_000, seed) for seed in range(1, 9)]),
+    )
+    for label, size in SIZES.items():
+        data = make_data(size)
+        number = max(1, repeat * 10_000 // size)
+        rows: dict[str, float] = {}
+        for name, codec in (("json", plain), ("zlib", compressed), ("zdict", zdict)):
+            value = codec.dump(data)
+            dump = timeit.timeit(lambda: codec.dump(data), number=number)
+            load = timeit.timeit(lambda: codec.load(value), number=number)
+            rows[f"{name} stored bytes"] = len(value)
+            rows[f"{name} dump us"] = dump / number * 1e6
+            rows[f"{name} load us"] = load / number * 1e6
+        report(f"{label} record", rows, "")
+
+    for label, size in SIZES.items():
+        rows = {}
+        for compression in ({}, {"threshold": 1024}):
+            with temporary_db() as db_name:
+                app = make_app(
+                    db_name, RECORD_CACHE=False, RECORD_COMPRESSION=compression
+                )
+                client = app.test_client()
+                client.post("/api/v2/records/1/latest", json=make_data(size))
+                for encoding in ("identity", "deflate"):
+                    headers = {"Accept-Encoding": encoding}
+                    number = max(5, repeat * 10_000 // size)
+                    client.get("/api/v2/records/1/latest", headers=headers)
+                    start = time.perf_counter()
+                    for _ in range(number):
+                        response = client.get(
+                            "/api/v2/records/1/latest", headers=headers
+                        )
+                    elapsed = time.perf_counter() - start
+                    name = f"{'zlib' if compression else 'json'} {encoding}"
+                    rows[f"{name} ms"] = elapsed / number * 1e3
+                    rows[f"{name} body KB"] = len(response.data) / 1e3
+        report(f"GET {label} record", rows, "")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""Mixed read/write load from many threads against different storage settings.
+
+Run with ``python -m benchmarks.bench_concurrency [threads] [seconds] [write %]``.
+"""
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile, report, temporary_db
+from pool import configure_pool
+from service.record.v2 import RecordRevisionHistoryService
+
+CONFIGS = {
+    "rollback journal": {"journal_mode": "DELETE"},
+    "wal": None,
+    "wal + single writer": None,
+}
+
+
+def run(config: str, threads: int, seconds: float, write_ratio: float) -> None:
+    """Report throughput, latency and lock errors of one config."""
+    with temporary_db() as db_name:
+        if CONFIGS[config] is not None:
+            configure_pool(db_name, pragmas=CONFIGS[config])
+        service = RecordRevisionHistoryService()
+        service.db_name = db_name
+        service.single_writer = config.endswith("single writer")
+        service.bulk_upsert([(str(i), {"n": "0"}) for i in range(1000)])
+
+        reads: list[float] = []
+        writes: list[float] = []
+        errors = [0]
+        deadline = time.monotonic() + seconds
+
+        def work() -> None:
+            while time.monotonic() < deadline:
+                slug = str(random.randrange(1000))
+                write = random.random() < write_ratio
+                start = time.perf_counter()
+                try:
+                    if write:
+                        service.upsert_record(slug, {"n": f"{start}"})
+                    else:
+                        service.get_record(slug)
+                except sqlite3.OperationalError:
+                    errors[0] += 1
+                    continue
+                (writes if write else reads).append(time.perf_counter() - start)
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    total = len(reads) + len(writes) + errors[0]
+    report(
+        config,
+        {
+            "ops/s": (len(reads) + len(writes)) / seconds,
+            "read p50 (us)": percentile(reads, 50) * 1e6,
+            "read p99 (us)": percentile(reads, 99) * 1e6,
+            "write p50 (us)": percentile(writes, 50) * 1e6,
+            "write p99 (us)": percentile(writes, 99) * 1e6,
+            "lock errors (%)": errors[0] / total * 100,
+        },
+        "",
+    )
+
+
+def main(threads: int = 16, seconds: int = 3, write_percent: int = 20) -> None:
+    """Run the mixed load against every storage config."""
+    for config in CONFIGS:
+        run(config, threads, seconds, write_percent / 100)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
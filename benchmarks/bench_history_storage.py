@@ -0,0 +1,58 @@
+"""Compare snapshot and delta revision storage for large, slowly edited records.
+
+Run with ``python -m benchmarks.bench_history_storage [keys] [edits] [records]``.
+"""
+import random
+import sys
+import time
+
+from benchmarks.common import report, temporary_db
+from entity.record import Record
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def run(mode: str, keys: int, edits: int, records: int) -> dict[str, float]:
+    """Get revision size and read latency of a storage mode."""
+    with temporary_db() as db_name:
+        service = RecordRevisionHistoryService()
+        service.db_name = db_name
+        service.storage_mode = mode
+
+        for slug in range(records):
+            data = {f"key{k}": f"value-{k:08d}" for k in range(keys)}
+            service.create_record(Record(str(slug), data))
+            for edit in range(edits):
+                service.update_record(str(slug), {f"key{edit % keys}": f"edit-{edit}"})
+
+        with service.pool.connection() as conn:
+            revisions, data_bytes = conn.execute(
+                "SELECT COUNT(*), SUM(LENGTH(data)) FROM history"
+            ).fetchone()
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+
+        reads = 1000
+        start = time.perf_counter()
+        for _ in range(reads):
+            service.get_record(
+                str(random.randrange(records)), version=random.randint(1, edits)
+            )
+        read_us = (time.perf_counter() - start) / reads * 1e6
+
+    return {
+        "data bytes / revision": data_bytes / revisions,
+        "file bytes / revision": page_count * page_size / revisions,
+        "read latency (us)": read_us,
+    }
+
+
+def main(keys: int = 200, edits: int = 100, records: int = 10) -> None:
+    """Report snapshot and delta storage side by side."""
+    for mode in ("snapshot", "delta"):
+        report(
+            f"{mode}: {keys} keys, {edits} edits", run(mode, keys, edits, records), ""
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
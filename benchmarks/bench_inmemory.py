@@ -0,0 +1,72 @@
+"""Throughput of the in-memory record service against the sqlite v2 service.
+
+Run with ``python -m benchmarks.bench_inmemory [records] [edits]``.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.common import rate, report, temporary_db
+from entity.record import Record
+from service.record.base import RecordService
+from service.record.inmemory import InMemoryRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def run(service: RecordService, records: int, edits: int) -> dict[str, float]:
+    """Get ops/s of creates, updates and reads against service."""
+
+    def create(i: int) -> None:
+        service.create_record(Record(str(i), {"name": f"record {i}", "edits": "0"}))
+
+    def update(i: int) -> None:
+        service.update_record(str(i % records), {"edits": str(i)})
+
+    return {
+        "create": rate(create, records),
+        "update": rate(update, records * edits),
+        "get latest": rate(
+            lambda i: service.get_record(str(random.randrange(records))), records
+        ),
+        "get version": rate(
+            lambda i: service.get_record(
+                str(random.randrange(records)), version=random.randint(1, edits + 1)
+            ),
+            records,
+        ),
+        "get versions": rate(
+            lambda i: service.get_versions(str(random.randrange(records))), records
+        ),
+    }
+
+
+def main(records: int = 10000, edits: int = 10) -> None:
+    """Report sqlite against in-memory, then snapshot save and load."""
+    with temporary_db() as db_name:
+        sqlite = RecordRevisionHistoryService()
+        sqlite.db_name = db_name
+        report("sqlite", run(sqlite, records, edits), "ops/s")
+
+    memory = InMemoryRecordService()
+    report("in-memory", run(memory, records, edits), "ops/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "records.ndjson")
+        start = time.perf_counter()
+        memory.save(path)
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        InMemoryRecordService().load(path)
+        load = time.perf_counter() - start
+        report(
+            f"snapshot of {records * (edits + 1):,} versions, "
+            f"{os.path.getsize(path) / 1e6:.1f} MB",
+            {"save": save * 1e3, "load": load * 1e3},
+            "ms",
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
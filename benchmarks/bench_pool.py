@@ -0,0 +1,95 @@
+"""Compare request throughput with and without the connection pool.
+
+The in-memory backend is included as the ceiling without any sqlite I/O. The
+record cache is off, so GETs read the database instead of measuring cache hits.
+
+Run with ``python -m benchmarks.bench_pool [requests]``.
+"""
+import sqlite3
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+from unittest import mock
+
+from benchmarks.common import make_app, rate, report, temporary_db
+from service.record.v1 import SqliteRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+
+class Unpooled:
+    """Connect-per-call behaviour the services had before pooling.
+
+    Nested calls join the outer connection like the pool does, otherwise a write
+    transaction would wait on its own lock. The benchmark is single threaded.
+    """
+
+    joined: dict[str, sqlite3.Connection] = {}
+
+    def __init__(self, db_name: str) -> None:
+        """Open connections to db_name."""
+        self.db_name = db_name
+
+    @contextmanager
+    def connection(
+        self, immediate: bool = False, shared: bool = True
+    ) -> Iterator[sqlite3.Connection]:
+        """Yield a new connection, or the outer one of a nested shared call."""
+        if shared and self.db_name in self.joined:
+            yield self.joined[self.db_name]
+            return
+
+        with sqlite3.connect(self.db_name) as conn:
+            conn.row_factory = sqlite3.Row
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            if shared:
+                self.joined[self.db_name] = conn
+            try:
+                yield conn
+            finally:
+                if shared:
+                    del self.joined[self.db_name]
+        conn.close()
+
+
+def run(n: int, **config: Any) -> dict[str, float]:
+    """Get GET and POST throughput of v1 and v2, with the record cache off."""
+    results = {}
+    with temporary_db() as db_name:
+        client = make_app(db_name, RECORD_CACHE=False, **config).test_client()
+        for i in range(100):
+            client.post(f"/api/v1/records/{i}", json={"n": i})
+            client.post(f"/api/v2/records/{i}/latest", json={"n": i})
+
+        results["GET  /api/v1/records/<id>"] = rate(
+            lambda i: client.get(f"/api/v1/records/{i % 100}"), n
+        )
+        results["POST /api/v1/records/<id>"] = rate(
+            lambda i: client.post(f"/api/v1/records/{i % 100}", json={"i": i}), n
+        )
+        results["GET  /api/v2/records/<id>/latest"] = rate(
+            lambda i: client.get(f"/api/v2/records/{i % 100}/latest"), n
+        )
+        results["POST /api/v2/records/<id>/latest"] = rate(
+            lambda i: client.post(f"/api/v2/records/{i % 100}/latest", json={"i": i}),
+            n,
+        )
+
+    return results
+
+
+def main(n: int = 2000) -> None:
+    """Report connect per call, pooled and in-memory throughput."""
+    unpooled = property(lambda self: Unpooled(self.db_name))
+    with mock.patch.object(SqliteRecordService, "pool", unpooled), mock.patch.object(
+        RecordRevisionHistoryService, "pool", unpooled
+    ):
+        report("connect per call", run(n))
+
+    report("pooled", run(n))
+    report("in-memory", run(n, RECORD_BACKEND_V1="memory", RECORD_BACKEND_V2="memory"))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""Reading a few fields of large records, in full vs projected by SQLite.
+
+Run with ``python -m benchmarks.bench_projection [repeat]``.
+"""
+import sys
+import time
+from collections.abc import Callable
+
+from benchmarks.bench_compression import make_data
+from benchmarks.common import make_app, report, temporary_db
+from entity.record import Record
+from service.record.v2 import RecordRevisionHistoryService
+
+SIZES = {"100 KB": 100_000, "1 MB": 1_000_000, "4 MB": 4_000_000}
+FIELDS = ["field1", "field2"]
+
+
+def timed(fn: Callable[[], object], number: int) -> float:
+    """Call fn number times after a warm up call, returns milliseconds per call."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+
+    return (time.perf_counter() - start) / number * 1e3
+
+
+def main(repeat: int = 20) -> None:
+    """Report full and projected reads per record size."""
+    for label, size in SIZES.items():
+        number = max(3, repeat * 1_000_000 // size)
+        rows: dict[str, float] = {}
+        with temporary_db() as db_name:
+            service = RecordRevisionHistoryService()
+            service.db_name = db_name
+            service.create_record(Record("1", make_data(size)))
+
+            rows["service full ms"] = timed(lambda: service.get_record("1"), number)
+            rows["service fields ms"] = timed(
+                lambda: service.get_record("1", fields=FIELDS), number
+            )
+
+            app = make_app(db_name, RECORD_CACHE=False)
+            client = app.test_client()
+            url = "/api/v2/records/1/latest"
+            rows["GET full ms"] = timed(lambda: client.get(url), number)
+            rows["GET ?fields= ms"] = timed(
+                lambda: client.get(f"{url}?fields={','.join(FIELDS)}"), number
+            )
+        report(f"{label} record, {len(FIELDS)} fields", rows, "")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,82 @@
+"""Memory and allocations per record and per version of the Record entity.
+
+Run with ``python -m benchmarks.bench_record_memory [records]``.
+"""
+import copy
+import sys
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from benchmarks.common import report
+from entity.record import Record
+
+
+class DictRecord:
+    """The Record layout before __slots__, for comparison."""
+
+    def __init__(self, slug: str, data: dict[str, Any], **kwargs: Any) -> None:
+        """Initialize like Record does."""
+        self.slug = slug
+        self.data = data
+        self.version = kwargs.get("version")
+        self.timestamp = kwargs.get("timestamp", datetime.now())
+
+
+def measure(build: Callable[[], list[Any]], count: int) -> dict[str, float]:
+    """Get bytes and allocated blocks per item kept alive by build."""
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    items = build()
+    size, _ = tracemalloc.get_traced_memory()
+    allocations = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    del items
+
+    return {"bytes": size / count, "allocations": allocations / count}
+
+
+def main(records: int = 1_000_000) -> None:
+    """Report memory per record and per version built each way."""
+    now = datetime.now()
+    payloads = [{"name": f"record {n}", "n": n} for n in range(records)]
+    for name, cls in (("dict", DictRecord), ("slots", Record)):
+        rows = measure(
+            lambda: [
+                cls(str(n), payloads[n], version=1, timestamp=now)
+                for n in range(records)
+            ],
+            records,
+        )
+        report(f"{records:,} records, {name}, per record", rows, "")
+
+    base = Record(
+        "1", {f"key{k}": {"value": f"value-{k}"} for k in range(20)}, version=1
+    )
+    versions = records // 10
+
+    def deep_copies() -> list[Any]:
+        chain = [base]
+        for n in range(versions):
+            data = copy.deepcopy(chain[-1].data)
+            data["key0"] = {"value": str(n)}
+            chain.append(Record("1", data, version=n + 2, timestamp=now))
+        return chain
+
+    def with_changes() -> list[Any]:
+        chain = [base]
+        for n in range(versions):
+            chain.append(chain[-1].with_changes({"key0": {"value": str(n)}}))
+        return chain
+
+    for name, build in (("deepcopy", deep_copies), ("with_changes", with_changes)):
+        report(
+            f"{versions:,} versions of 20 keys, {name}, per version",
+            measure(build, versions),
+            "",
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""Write throughput of the sharded backend as the shard count grows.
+
+Shards only help once writers wait on each other's commits, so expect flat
+numbers on a single core or when the commit itself is cheap.
+
+Run with ``python -m benchmarks.bench_sharding [threads] [seconds] [bulk size]``.
+"""
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from benchmarks.common import report, temporary_db
+from service.record.sharded import ShardedRecordService
+
+
+def run(shards: int, threads: int, seconds: int, bulk_size: int) -> dict[str, float]:
+    """Get upsert and bulk write throughput with shards shards."""
+    with temporary_db() as db_name:
+        service = ShardedRecordService()
+        service.db_name = db_name
+        service.shards = shards
+
+        start = time.perf_counter()
+        service.bulk_upsert([(str(i), {"n": "0"}) for i in range(bulk_size)])
+        bulk = bulk_size / (time.perf_counter() - start)
+
+        writes = [0] * threads
+        errors = [0]
+        deadline = time.monotonic() + seconds
+
+        def work(thread: int) -> None:
+            while time.monotonic() < deadline:
+                slug = str(random.randrange(bulk_size))
+                try:
+                    service.upsert_record(slug, {"n": f"{time.perf_counter()}"})
+                except sqlite3.OperationalError:
+                    errors[0] += 1
+                    continue
+                writes[thread] += 1
+
+        workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        service.close()
+
+    return {
+        "upserts/s": sum(writes) / seconds,
+        "bulk records/s": bulk,
+        "lock errors": errors[0],
+    }
+
+
+def main(threads: int = 16, seconds: int = 3, bulk_size: int = 20000) -> None:
+    """Report write throughput for 1 to 8 shards."""
+    for shards in (1, 2, 4, 8):
+        report(
+            f"{shards} shards, {threads} threads",
+            run(shards, threads, seconds, bulk_size),
+            "",
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,59 @@
+import logging
+import pathlib
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from flask import Flask
+
+import db
+from app import create_app
+from pool import close_pools
+from writer import close_write_queues
+
+
+@contextmanager
+def temporary_db() -> Iterator[str]:
+    """Yield the path of a freshly initialized database in a temp dir."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = str(pathlib.Path(tmp) / "bench.db")
+        db.initialize_db(db_name)
+        try:
+            yield db_name
+        finally:
+            close_write_queues()
+            close_pools()
+
+
+def make_app(db_name: str, **config: Any) -> Flask:
+    """Create an app whose record services use the given database.
+
+    Config overrides app settings, e.g. RECORD_BACKEND_V2="memory".
+    """
+    logging.disable(logging.WARNING)
+    return create_app({"RECORD_DB": db_name, **config})
+
+
+def rate(fn: Callable[[int], object], n: int) -> float:
+    """Call fn n times and return calls per second."""
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+
+    return n / (time.perf_counter() - start)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Get the q-th percentile (0-100) of samples by nearest rank."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def report(title: str, rows: dict[str, float], unit: str = "req/s") -> None:
+    """Print a small aligned result table."""
+    print(title)
+    width = max(len(name) for name in rows)
+    for name, value in rows.items():
+        print(f"  {name:<{width}}  {value:>12,.1f} {unit}".rstrip())
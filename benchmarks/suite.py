@@ -0,0 +1,403 @@
+"""Reproducible benchmark suite for the records API and the record services.
+
+Generates a synthetic dataset from a seed, loads it through the API and measures
+throughput and p50/p95/p99 latency per endpoint, through the Flask test client
+and through a real local HTTP server. The API is measured with the record cache
+off, then on, so cache hits are reported apart from database reads. Every record
+service method is timed on its own. Results are written as JSON, pass an earlier
+result file to --compare to list regressions.
+
+Run with ``python -m benchmarks.suite [--records 1000] [--payload 512]
+[--depth 5] [--requests 2000] [--output results.json] [--compare old.json]``.
+"""
+import argparse
+import http.client
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from benchmarks.common import make_app, percentile, temporary_db
+from entity.record import Record
+from service.record.base import RecordService
+from service.record.inmemory import InMemoryRecordService
+from service.record.v1 import SqliteRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+# an endpoint is (name, method, path of request i, body of request i)
+Endpoint = tuple[str, str, Callable[[int], str], Callable[[int], Any] | None]
+# a driver sends (method, path, body) and returns the status code
+Driver = Callable[[str, str, Any], int]
+
+# regressions smaller than this are treated as noise by --compare
+DEFAULT_TOLERANCE = 0.1
+
+
+def make_payload(rng: random.Random, size: int) -> dict[str, str]:
+    """Build record data of about size bytes of JSON."""
+    data: dict[str, str] = {}
+    while sum(len(k) + len(v) + 6 for k, v in data.items()) < size:
+        data[f"field{len(data)}"] = "".join(
+            rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(8, 64))
+        )
+
+    return data
+
+
+def make_dataset(
+    records: int, payload: int, depth: int, seed: int = 0
+) -> list[tuple[str, list[dict[str, str]]]]:
+    """Build slugs with depth versions of changes each, the same for a seed."""
+    rng = random.Random(seed)
+    dataset = []
+    for i in range(records):
+        versions = [make_payload(rng, payload)]
+        for version in range(1, depth):
+            versions.append({"field0": f"version {version}", "edited": str(version)})
+        dataset.append((str(i), versions))
+
+    return dataset
+
+
+def measure(call: Callable[[int], object], n: int) -> dict[str, float]:
+    """Call fn n times, get throughput and latency percentiles."""
+    samples = []
+    start = time.perf_counter()
+    for i in range(n):
+        call_start = time.perf_counter()
+        call(i)
+        samples.append((time.perf_counter() - call_start) * 1e3)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "n": n,
+        "per_second": n / elapsed,
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+def endpoints(records: int, depth: int, seed: int) -> list[Endpoint]:
+    """Endpoints to measure, requests pick records from a seeded random sequence."""
+    rng = random.Random(seed)
+    slugs = [str(rng.randrange(records)) for _ in range(records * 10)]
+
+    def slug(i: int) -> str:
+        return slugs[i % len(slugs)]
+
+    return [
+        ("v1 GET /records/<id>", "GET", lambda i: f"/api/v1/records/{slug(i)}", None),
+        (
+            "v1 POST /records/<id>",
+            "POST",
+            lambda i: f"/api/v1/records/{slug(i)}",
+            lambda i: {"counter": str(i)},
+        ),
+        (
+            "v2 GET /records/<id>/latest",
+            "GET",
+            lambda i: f"/api/v2/records/{slug(i)}/latest",
+            None,
+        ),
+        (
+            "v2 GET /records/<id>/<version>",
+            "GET",
+            lambda i: f"/api/v2/records/{slug(i)}/{i % depth + 1}",
+            None,
+        ),
+        (
+            "v2 GET /records/<id>/versions",
+            "GET",
+            lambda i: f"/api/v2/records/{slug(i)}/versions",
+            None,
+        ),
+        (
+            "v2 POST /records/<id>/latest",
+            "POST",
+            lambda i: f"/api/v2/records/{slug(i)}/latest",
+            lambda i: {"counter": str(i)},
+        ),
+    ]
+
+
+def test_client_driver(app: Flask) -> Driver:
+    """Send requests through the Flask test client."""
+    client = app.test_client()
+
+    def send(method: str, path: str, body: Any) -> int:
+        return client.open(path, method=method, json=body).status_code
+
+    return send
+
+
+@contextmanager
+def server_driver(app: Flask) -> Iterator[Driver]:
+    """Serve app on a free local port and send requests over HTTP."""
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def send(method: str, path: str, body: Any) -> int:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        try:
+            if body is None:
+                conn.request(method, path)
+            else:
+                conn.request(
+                    method,
+                    path,
+                    json.dumps(body),
+                    {"Content-Type": "application/json"},
+                )
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    try:
+        yield send
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def load(send: Driver, dataset: list[tuple[str, list[dict[str, str]]]]) -> None:
+    """Write every version of the dataset through the API."""
+    for slug, versions in dataset:
+        send("POST", f"/api/v1/records/{slug}", versions[0])
+        for data in versions:
+            send("POST", f"/api/v2/records/{slug}/latest", data)
+
+
+def run_api(
+    send: Driver, records: int, depth: int, requests: int, seed: int
+) -> dict[str, dict[str, float]]:
+    """Measure every endpoint, failing on unexpected status codes."""
+    results = {}
+    for name, method, path, body in endpoints(records, depth, seed):
+
+        def call(i: int) -> None:
+            status = send(method, path(i), body(i) if body else None)
+            if status >= 400:
+                raise RuntimeError(f"{name} answered {status}")
+
+        results[name] = measure(call, requests)
+
+    return results
+
+
+def run_services(
+    db_name: str, records: int, payload: int, depth: int, n: int, seed: int
+) -> dict[str, dict[str, dict[str, float]]]:
+    """Time every record service method of every backend on its own dataset."""
+    dataset = make_dataset(records, payload, depth, seed)
+    results = {}
+    for name, backend in (
+        ("sqlite", SqliteRecordService),
+        ("sqlite-history", RecordRevisionHistoryService),
+        ("memory", InMemoryRecordService),
+    ):
+        service = backend()
+        if hasattr(service, "db_name"):
+            setattr(service, "db_name", db_name)
+        results[name] = run_service(service, dataset, n, depth, seed)
+
+    return results
+
+
+def run_service(
+    service: RecordService,
+    dataset: list[tuple[str, list[dict[str, str]]]],
+    n: int,
+    depth: int,
+    seed: int,
+) -> dict[str, dict[str, float]]:
+    """Time each method of service, skipping the ones it does not implement."""
+    prefix = f"{type(service).__name__}-"
+    for slug, versions in dataset:
+        service.create_record(Record(prefix + slug, dict(versions[0]), version=1))
+        for data in versions[1:]:
+            service.update_record(prefix + slug, data)
+
+    rng = random.Random(seed)
+    slugs = [prefix + rng.choice(dataset)[0] for _ in range(n)]
+    now = datetime.now()
+    calls: dict[str, Callable[[int], object]] = {
+        "get_record": lambda i: service.get_record(slugs[i]),
+        "get_record version": lambda i: service.get_record(
+            slugs[i], version=i % depth + 1
+        ),
+        "get_record_stamp": lambda i: service.get_record_stamp(slugs[i]),
+        "get_records_many 10": lambda i: service.get_records_many(
+            slugs[i : i + 10] or slugs[:10]
+        ),
+        "get_versions": lambda i: service.get_versions(slugs[i]),
+        "get_versions_page": lambda i: service.get_versions_page(slugs[i], limit=10),
+        "iter_history": lambda i: list(service.iter_history(slugs[i])),
+        "get_record_as_of": lambda i: service.get_record_as_of(slugs[i], now),
+        "update_record": lambda i: service.update_record(slugs[i], {"counter": str(i)}),
+        "upsert_record": lambda i: service.upsert_record(
+            f"{prefix}new-{i}", {"counter": str(i)}
+        ),
+        "create_record": lambda i: service.create_record(
+            Record(f"{prefix}created-{i}", {"counter": str(i)}, version=1)
+        ),
+        "bulk_upsert 100": lambda i: service.bulk_upsert(
+            [(slugs[(i + k) % n], {"bulk": str(i)}) for k in range(100)]
+        ),
+    }
+
+    results = {}
+    for method, call in calls.items():
+        try:
+            results[method] = measure(call, n)
+        except NotImplementedError:
+            continue
+
+    return results
+
+
+def environment() -> dict[str, str]:
+    """Describe where the results were measured."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def rows(
+    results: dict[str, Any], path: str = ""
+) -> Iterator[tuple[str, dict[str, float]]]:
+    """Flatten nested results into (path, measurement) pairs."""
+    for key, value in results.items():
+        if "per_second" in value:
+            yield path + key, value
+        elif isinstance(value, dict):
+            yield from rows(value, f"{path}{key} / ")
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Get the measurements that got slower than tolerance allows, and print all."""
+    before = dict(rows(baseline["results"]))
+    regressions = []
+    for path, after in rows(current["results"]):
+        if path not in before:
+            continue
+
+        change = after["per_second"] / before[path]["per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(path)
+            flag = "  REGRESSION"
+        print(
+            f"  {path:<60} {before[path]['per_second']:>10,.0f} -> "
+            f"{after['per_second']:>10,.0f}/s {change:>+7.1%}{flag}"
+        )
+
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the suite and print results, returns 1 if --compare finds regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--payload", type=int, default=512, help="bytes per record")
+    parser.add_argument("--depth", type=int, default=5, help="versions per record")
+    parser.add_argument("--requests", type=int, default=2000, help="per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-server", action="store_true", help="test client only")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    dataset = make_dataset(args.records, args.payload, args.depth, args.seed)
+    api: dict[str, Any] = {}
+    with temporary_db() as db_name:
+        load(test_client_driver(make_app(db_name, RECORD_CACHE=False)), dataset)
+        for cache in ("uncached", "cached"):
+            app = make_app(db_name, RECORD_CACHE=cache == "cached")
+            api[cache] = {
+                "test client": run_api(
+                    test_client_driver(app),
+                    args.records,
+                    args.depth,
+                    args.requests,
+                    args.seed,
+                )
+            }
+            if not args.no_server:
+                with server_driver(app) as send:
+                    api[cache]["server"] = run_api(
+                        send, args.records, args.depth, args.requests, args.seed
+                    )
+
+    with temporary_db() as db_name:
+        services = run_services(
+            db_name,
+            args.records,
+            args.payload,
+            args.depth,
+            min(args.requests, args.records),
+            args.seed,
+        )
+
+    result = {
+        "environment": environment(),
+        "parameters": vars(args),
+        "results": {"api": api, "services": services},
+    }
+    for path, measurement in rows(result["results"]):
+        print(
+            f"  {path:<60} {measurement['per_second']:>10,.0f}/s  "
+            f"p50 {measurement['p50_ms']:.2f}  p95 {measurement['p95_ms']:.2f}  "
+            f"p99 {measurement['p99_ms']:.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"compared to {baseline['environment']['commit']}")
+        for name in ("records", "payload", "depth", "requests", "seed"):
+            if baseline["parameters"].get(name) != result["parameters"][name]:
+                print(f"  warning: --{name} differs from the baseline run")
+        if compare(baseline, result, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import click
+from flask.cli import with_appcontext
+
+from api import v2
+from service.record.base import RecordService
+from service.record.cached import CachedRecordService
+from service.record.instrumented import InstrumentedRecordService
+from service.record.retention import (
+    RetentionPolicy,
+    parse_duration,
+    prune_history,
+    vacuum,
+)
+from service.record.sharded import ShardedRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+
+def history_services(service: RecordService) -> list[RecordRevisionHistoryService]:
+    """Get the sqlite history services behind service, one per shard."""
+    if isinstance(service, (CachedRecordService, InstrumentedRecordService)):
+        return history_services(service.service)
+    if isinstance(service, ShardedRecordService):
+        return [
+            found for shard in service.services for found in history_services(shard)
+        ]
+    if isinstance(service, RecordRevisionHistoryService):
+        return [service]
+
+    return []
+
+
+@click.command("prune-history")
+@click.option("--keep-last", type=int, help="Keep the newest N versions.")
+@click.option("--keep-within", help="Keep versions younger than e.g. 30d.")
+@click.option(
+    "--thin",
+    multiple=True,
+    help="AGE:EVERY, keep one version per EVERY once older than AGE, e.g. 1d:1h.",
+)
+@click.option(
+    "--batch-size", default=100, show_default=True, help="Records per transaction."
+)
+@click.option(
+    "--pause", default=0.05, show_default=True, help="Seconds between transactions."
+)
+@click.option("--vacuum/--no-vacuum", "run_vacuum", default=True, show_default=True)
+@click.option(
+    "--full-vacuum",
+    is_flag=True,
+    help="Convert files without incremental vacuum, blocks writers while it runs.",
+)
+@with_appcontext
+def prune_history_command(
+    keep_last: int | None,
+    keep_within: str | None,
+    thin: tuple[str, ...],
+    batch_size: int,
+    pause: float,
+    run_vacuum: bool,
+    full_vacuum: bool,
+) -> None:
+    """Delete v2 record history the retention policy drops and reclaim the space."""
+    try:
+        policy = RetentionPolicy(
+            keep_last,
+            parse_duration(keep_within) if keep_within else None,
+            [
+                (parse_duration(age), parse_duration(every))
+                for age, _, every in (tier.partition(":") for tier in thin)
+            ],
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+    if not policy:
+        raise click.UsageError("Pass --keep-last, --keep-within or --thin")
+
+    services = history_services(v2.api.service)
+    if not services:
+        raise click.UsageError("The v2 record backend keeps no history to prune")
+
+    for service in services:
+        stats = prune_history(service, policy, batch_size=batch_size, pause=pause)
+        click.echo(
+            f"{service.db_name}: pruned {stats['pruned']} versions of "
+            f"{stats['records']} records, {stats['pruned_bytes']:,} bytes of data, "
+            f"{stats['keyframes']} deltas compacted into keyframes"
+        )
+        if run_vacuum:
+            reclaimed = vacuum(service.db_name, pause=pause, full=full_vacuum)
+            click.echo(f"{service.db_name}: reclaimed {reclaimed:,} bytes")
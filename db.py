@@ -1,7 +1,26 @@
 import sqlite3
+from collections.abc import Iterator, Sequence
+from typing import Any, TypeVar
+
+T = TypeVar("T")
 
 dbname = "record-service.db"
 
+# stays well below SQLITE_MAX_VARIABLE_NUMBER on older sqlite builds
+max_parameters = 500
+
+# Storage engine settings applied to every pooled connection. WAL lets readers
+# run alongside the writer, NORMAL sync is durable across application crashes in
+# WAL mode, negative cache_size is in KiB.
+engine_pragmas: dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
 records_sql = """ CREATE TABLE IF NOT EXISTS records (
                id INTEGER PRIMARY KEY AUTOINCREMENT,
                slug TEXT NOT NULL UNIQUE,
@@ -30,10 +49,89 @@ revisions_sql = """CREATE TABLE IF NOT EXISTS history (
                 );"""
 
 
-def initialize_db() -> None:
-    """Create db tables."""
-    with sqlite3.connect(dbname) as conn:
+# Each entry upgrades the schema by one version, the applied version is kept in
+# PRAGMA user_version so existing database files are upgraded in place.
+migrations: list[list[str]] = [
+    [
+        """CREATE INDEX IF NOT EXISTS history_slug_version
+        ON history (records_slug, version)""",
+    ],
+    [
+        # delta revisions reference the full snapshot row they apply to
+        "ALTER TABLE history ADD COLUMN base_id INTEGER REFERENCES history(id)",
+    ],
+    [
+        # point in time lookups
+        """CREATE INDEX IF NOT EXISTS history_slug_timestamp
+        ON history (records_slug, timestamp)""",
+        """CREATE INDEX IF NOT EXISTS versioned_records_created_at
+        ON versioned_records (created_at)""",
+    ],
+    [
+        # change log of v2 writes, seq is never reused so feeds resume after it
+        """CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        slug TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        timestamp DATETIME
+        )""",
+        # existing records start the log with their latest version
+        """INSERT INTO changes (slug, version, timestamp)
+        SELECT slug, version, created_at FROM versioned_records
+        ORDER BY created_at, id""",
+    ],
+    [
+        # rows jsonpickle wrote before the JSON codec, only these are read with it
+        "ALTER TABLE records ADD COLUMN legacy INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE versioned_records ADD COLUMN legacy INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE history ADD COLUMN legacy INTEGER NOT NULL DEFAULT 0",
+        # jsonpickle only differs from JSON in its py/ tags, untagged rows read the
+        # same either way
+        """UPDATE records SET legacy = 1
+        WHERE typeof(data) = 'text' AND instr(data, '"py/') > 0""",
+        """UPDATE versioned_records SET legacy = 1
+        WHERE typeof(data) = 'text' AND instr(data, '"py/') > 0""",
+        """UPDATE history SET legacy = 1
+        WHERE typeof(data) = 'text' AND instr(data, '"py/') > 0""",
+    ],
+]
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """Apply pending schema migrations, each in its own transaction."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for version, statements in enumerate(migrations[current:], start=current + 1):
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def initialize_db(db_name: str = dbname) -> None:
+    """Create db tables and upgrade them to the latest schema version."""
+    with sqlite3.connect(db_name) as conn:
         cursor = conn.cursor()
+        # only takes effect on new files, retention.vacuum converts older ones
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         cursor.execute(records_sql)
         cursor.execute(versioned_records_sql)
         cursor.execute(revisions_sql)
+        migrate(conn)
+    conn.close()
+
+
+def chunks(items: Sequence[T], size: int = max_parameters) -> Iterator[Sequence[T]]:
+    """Split items into slices small enough to bind as query parameters."""
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def placeholders(count: int) -> str:
+    """Get a comma separated list of count parameter placeholders."""
+    return ", ".join("?" * count)
@@ -1,21 +1,95 @@
+from collections.abc import Iterable
 from datetime import datetime
 from typing import Any
 
 
+def _apply(data: dict[str, Any], changes: dict[str, Any]) -> None:
+    """Set truthy values of changes on data and delete keys of falsy ones."""
+    for key, value in changes.items():
+        if value:
+            data[key] = value
+        else:
+            data.pop(key, None)
+
+
 class Record:
     """Record class models record for storage."""
 
-    def __init__(self, slug: str, data: dict[str, str], **kwargs: Any) -> None:
+    __slots__ = ("slug", "data", "version", "timestamp")
+
+    def __init__(self, slug: str, data: dict[str, Any], **kwargs: Any) -> None:
         """Initialize an object of type record with optional values for v2 versioning."""
         self.slug = slug
         self.data = data
-        self.version = kwargs.get("version")
-        self.timestamp = kwargs.get("timestamp", datetime.now())
+        self.version: int | None = kwargs.get("version")
+        timestamp = kwargs.get("timestamp")
+        self.timestamp = datetime.now() if timestamp is None else timestamp
 
     def update_data(self, changes: dict[str, Any]) -> None:
         """Update data dict in place according to changes dict."""
-        for key, value in changes.items():
-            if value:
-                self.data[key] = value
-            else:
-                self.data.pop(key, None)
+        _apply(self.data, changes)
+
+    def with_changes(self, changes: dict[str, Any]) -> "Record":
+        """Get the next version of record with changes applied, leaving self as is.
+
+        Only the top level dict is copied, values are shared with self.
+        """
+        data = dict(self.data)
+        _apply(data, changes)
+        version = self.version + 1 if self.version else self.version
+
+        return Record(self.slug, data, version=version)
+
+    def copy(self) -> "Record":
+        """Get a copy whose data dict can be changed without affecting self."""
+        return Record(
+            self.slug, dict(self.data), version=self.version, timestamp=self.timestamp
+        )
+
+    def project(self, fields: Iterable[str]) -> "Record":
+        """Get a copy holding only the keys of data in fields, in data order."""
+        wanted = set(fields)
+        data = {k: v for k, v in self.data.items() if k in wanted}
+
+        return Record(self.slug, data, version=self.version, timestamp=self.timestamp)
+
+
+def _identical(a: Any, b: Any) -> bool:
+    """Compare values including types and key order, unlike plain equality."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return list(a) == list(b) and all(_identical(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(_identical, a, b))
+
+    return bool(a == b)
+
+
+def changes_between(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    """Get keys new adds or changes with their new values, and removed keys as None.
+
+    Falsy values of new are kept, so update_data only reproduces new without them.
+    """
+    changes = {
+        k: v for k, v in new.items() if k not in old or not _identical(old[k], v)
+    }
+    changes.update({k: None for k in old if k not in new})
+
+    return changes
+
+
+def diff_data(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any] | None:
+    """Get the changes dict that turns old into new when passed to update_data.
+
+    Returns None when update_data cannot reproduce new exactly, because new holds
+    falsy values (update_data treats them as deletions) or its key order differs.
+    """
+    changes = changes_between(old, new)
+    if not all(changes[k] for k in new if k in changes):
+        return None
+
+    if list(new) != [k for k in old if k in new] + [k for k in new if k not in old]:
+        return None
+
+    return changes
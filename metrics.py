@@ -0,0 +1,232 @@
+import bisect
+import functools
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# upper bounds of the latency histogram buckets, the last bucket is unbounded
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Counts of latencies in fixed millisecond buckets, not thread safe."""
+
+    def __init__(self) -> None:
+        """Create an empty histogram."""
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        """Count one latency."""
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def quantile(self, q: float) -> float:
+        """Get the upper bound of the bucket holding the q-th quantile (0-1)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float("inf")
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get count, mean, quantiles and bucket counts."""
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip((*BUCKETS_MS, "+Inf"), self.counts)
+            },
+        }
+
+
+class RequestStats:
+    """Time spent in the database, codecs and record services during one request."""
+
+    __slots__ = ("queries", "sql", "codec", "service", "codec_depth")
+
+    def __init__(self) -> None:
+        """Start with nothing spent."""
+        self.queries = 0
+        self.sql = 0.0
+        self.codec = 0.0
+        self.service = 0.0
+        # nested codec calls, e.g. a compressed codec calling the JSON codec
+        self.codec_depth = 0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Metrics:
+    """Process wide latency histograms per endpoint and per record service method."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self.endpoints: dict[str, Histogram] = {}
+        self.requests: dict[str, RequestStats] = {}
+        self.services: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def start_request(self) -> Token[RequestStats | None]:
+        """Collect stats of the calls made in the current context from now on.
+
+        Stats follow the context, so calls on other threads are only counted when
+        they run in a copy of it, see contextvars.copy_context.
+        """
+        return _current.set(RequestStats())
+
+    def finish_request(
+        self, endpoint: str, seconds: float, token: Token[RequestStats | None]
+    ) -> RequestStats:
+        """Stop collecting and record the latency and stats of a request to endpoint."""
+        stats = _current.get() or RequestStats()
+        _current.reset(token)
+        with self._lock:
+            self.endpoints.setdefault(endpoint, Histogram()).observe(seconds * 1e3)
+            totals = self.requests.setdefault(endpoint, RequestStats())
+            totals.queries += stats.queries
+            totals.sql += stats.sql
+            totals.codec += stats.codec
+            totals.service += stats.service
+
+        return stats
+
+    @contextmanager
+    def request(self, endpoint: str) -> Iterator[RequestStats]:
+        """Collect and record the stats of the calls made in the block."""
+        token = self.start_request()
+        start = time.perf_counter()
+        try:
+            yield _current.get() or RequestStats()
+        finally:
+            self.finish_request(endpoint, time.perf_counter() - start, token)
+
+    def observe_service(self, method: str, seconds: float) -> None:
+        """Record the latency of one record service call."""
+        stats = _current.get()
+        if stats is not None:
+            stats.service += seconds
+
+        with self._lock:
+            self.services.setdefault(method, Histogram()).observe(seconds * 1e3)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get latency histograms, and per request means of the time spent."""
+        with self._lock:
+            endpoints = {}
+            for endpoint, histogram in sorted(self.endpoints.items()):
+                totals = self.requests[endpoint]
+                count = histogram.count or 1
+                endpoints[endpoint] = {
+                    **histogram.snapshot(),
+                    "per_request": {
+                        "sql_queries": totals.queries / count,
+                        "sql_ms": totals.sql / count * 1e3,
+                        "codec_ms": totals.codec / count * 1e3,
+                        "service_ms": totals.service / count * 1e3,
+                    },
+                }
+
+            return {
+                "endpoints": endpoints,
+                "services": {
+                    method: histogram.snapshot()
+                    for method, histogram in sorted(self.services.items())
+                },
+            }
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.endpoints.clear()
+            self.requests.clear()
+            self.services.clear()
+
+
+metrics = Metrics()
+
+
+def timed_codec(method: Callable[..., T]) -> Callable[..., T]:
+    """Count the time of a codec method towards the current request."""
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        stats = _current.get()
+        if stats is None:
+            return method(*args, **kwargs)
+
+        stats.codec_depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.codec_depth -= 1
+            if not stats.codec_depth:
+                stats.codec += time.perf_counter() - start
+
+    return wrapper
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor counting its queries and their execution time towards the request.
+
+    Time is measured until the first row is ready, rows fetched later are not.
+    """
+
+    def execute(self, sql: str, parameters: Any = (), /) -> "InstrumentedCursor":
+        """Execute a query, timed."""
+        stats = _current.get()
+        if stats is None:
+            return super().execute(sql, parameters)
+
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            stats.queries += 1
+            stats.sql += time.perf_counter() - start
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> "InstrumentedCursor":
+        """Execute a query once per parameter set, timed as one query."""
+        stats = _current.get()
+        if stats is None:
+            return super().executemany(sql, seq_of_parameters)
+
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            stats.queries += 1
+            stats.sql += time.perf_counter() - start
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors count their queries, pass it as connect factory."""
+
+    def cursor(self, factory: Any = InstrumentedCursor) -> Any:
+        """Open an instrumented cursor."""
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = (), /) -> Any:
+        """Execute a query on a new instrumented cursor."""
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> Any:
+        """Execute a query once per parameter set on a new instrumented cursor."""
+        return self.cursor().executemany(sql, seq_of_parameters)
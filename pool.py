@@ -0,0 +1,212 @@
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from db import engine_pragmas
+from metrics import InstrumentedConnection
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection becomes available before the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived sqlite connections to a single database file.
+
+    A thread that already holds a connection gets the same connection back from
+    nested ``connection()`` calls, so a service method calling another service
+    method shares one connection and one transaction.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        pragmas: dict[str, Any] | None = None,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        """Create a pool, connections are opened lazily on first use."""
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(pragmas or {})
+        self.health_check_interval = health_check_interval
+        self.opened = 0
+        self.closed = False
+        self._idle: list[tuple[sqlite3.Connection, float]] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(
+        self, immediate: bool = False, shared: bool = True
+    ) -> Iterator[sqlite3.Connection]:
+        """Check out a connection, commit on success and roll back on error.
+
+        With immediate the transaction takes the database write lock up front, so
+        reads made inside it cannot go stale before the write. Nested checkouts join
+        the outer transaction and cannot upgrade it. Checkouts that are not shared
+        neither join nor get joined, use them for cursors held open by generators.
+        """
+        conn = getattr(self._local, "conn", None)
+        if shared and conn is not None:  # join the transaction of the outer checkout
+            yield conn
+            return
+
+        conn = self._checkout()
+        if shared:
+            self._local.conn = conn
+        healthy = True
+        try:
+            if immediate:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+        except BaseException:
+            healthy = self._rollback(conn)
+            raise
+        finally:
+            if getattr(self._local, "conn", None) is conn:
+                self._local.conn = None
+            self._checkin(conn, healthy)
+
+    def close(self) -> None:
+        """Close idle connections, busy connections are closed on check-in."""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+
+        for conn, _ in idle:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.timeout,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        with self._lock:
+            self.opened += 1
+
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhaustedError(f"No connection to {self.db_name} available")
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, last_used = self._idle.pop()
+
+                if self._is_healthy(conn, last_used):
+                    return conn
+                conn.close()
+
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: sqlite3.Connection, healthy: bool) -> None:
+        try:
+            with self._lock:
+                if healthy and not self.closed:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def _is_healthy(self, conn: sqlite3.Connection, last_used: float) -> bool:
+        """Ping connections that sat idle longer than the health check interval."""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+
+        return True
+
+    @staticmethod
+    def _rollback(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            return False
+
+        return True
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name: str) -> ConnectionPool:
+    """Get the shared pool for a database file, creating it on first use."""
+    pool = _pools.get(db_name)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = ConnectionPool(db_name, pragmas=engine_pragmas)
+
+    return pool
+
+
+def configure_pool(db_name: str, **options: Any) -> ConnectionPool:
+    """Replace the shared pool for a database file with one built from options."""
+    with _pools_lock:
+        old = _pools.get(db_name)
+        options.setdefault("pragmas", engine_pragmas)
+        pool = _pools[db_name] = ConnectionPool(db_name, **options)
+
+    if old is not None:
+        old.close()
+
+    return pool
+
+
+def close_pools() -> None:
+    """Close and forget all shared pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    """Get size, opened and idle connection counts of every shared pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    return {
+        pool.db_name: {
+            "size": pool.size,
+            "opened": pool.opened,
+            "idle": len(pool._idle),
+        }
+        for pool in pools
+    }
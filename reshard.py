@@ -0,0 +1,117 @@
+"""Move records from one shard layout to another, e.g. from one file to 8 shards.
+
+Run with ``python reshard.py DB_NAME FROM_SHARDS TO_SHARDS`` while the service is
+stopped. Source files are left in place, point RECORD_OPTIONS at the new shard
+count and delete them once the new layout is serving.
+"""
+import sqlite3
+import sys
+from collections.abc import Iterator
+
+import db
+from service.record.sharded import shard_files, shard_of
+
+TABLES = ("records", "versioned_records", "history")
+
+
+def rows(conn: sqlite3.Connection, table: str) -> Iterator[sqlite3.Row]:
+    """Stream the rows of table in insert order."""
+    return conn.execute(f"SELECT * FROM {table} ORDER BY id")
+
+
+def reshard(db_name: str, from_shards: int, to_shards: int) -> dict[str, int]:
+    """Copy every row into the shard its slug hashes to, returns rows per table.
+
+    Targets are written in one transaction each and committed together at the end,
+    history rows get new ids and delta rows are pointed at their moved keyframe.
+    Raises ValueError, writing nothing, if a delta row's keyframe is missing.
+    """
+    sources = shard_files(db_name, from_shards)
+    targets = shard_files(db_name, to_shards)
+    if set(sources) & set(targets):
+        raise ValueError("Source and target shard layouts are the same")
+
+    conns = []
+    for target in targets:
+        db.initialize_db(target)
+        conn = sqlite3.connect(target)
+        conns.append(conn)
+        for table in TABLES:
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise ValueError(f"{target} already holds {table}")
+
+    counts = dict.fromkeys(TABLES, 0)
+    try:
+        for source in sources:
+            with sqlite3.connect(source) as conn:
+                conn.row_factory = sqlite3.Row
+                for row in rows(conn, "records"):
+                    conns[shard_of(row["slug"], to_shards)].execute(
+                        """INSERT INTO records
+                        (slug, data, legacy, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?)""",
+                        (
+                            row["slug"],
+                            row["data"],
+                            row["legacy"],
+                            row["created_at"],
+                            row["updated_at"],
+                        ),
+                    )
+                    counts["records"] += 1
+
+                for row in rows(conn, "versioned_records"):
+                    conns[shard_of(row["slug"], to_shards)].execute(
+                        """INSERT INTO versioned_records
+                        (slug, data, legacy, version, created_at)
+                        VALUES (?, ?, ?, ?, ?)""",
+                        (
+                            row["slug"],
+                            row["data"],
+                            row["legacy"],
+                            row["version"],
+                            row["created_at"],
+                        ),
+                    )
+                    counts["versioned_records"] += 1
+
+                # keyframes come before their deltas in id order
+                moved_ids: dict[int, int] = {}
+                for row in rows(conn, "history"):
+                    if row["base_id"] is not None and row["base_id"] not in moved_ids:
+                        raise ValueError(
+                            f"{source} history row {row['id']} is a delta of missing"
+                            f" keyframe {row['base_id']}"
+                        )
+                    target = conns[shard_of(row["records_slug"], to_shards)]
+                    cursor = target.execute(
+                        """INSERT INTO history
+                        (records_slug, version, timestamp, data, legacy, base_id)
+                        VALUES (?, ?, ?, ?, ?, ?)""",
+                        (
+                            row["records_slug"],
+                            row["version"],
+                            row["timestamp"],
+                            row["data"],
+                            row["legacy"],
+                            moved_ids.get(row["base_id"]),
+                        ),
+                    )
+                    if row["base_id"] is None and cursor.lastrowid is not None:
+                        moved_ids[row["id"]] = cursor.lastrowid
+                    counts["history"] += 1
+            conn.close()
+
+        for conn in conns:
+            conn.commit()
+    finally:
+        for conn in conns:
+            conn.close()
+
+    return counts
+
+
+if __name__ == "__main__":
+    name, from_count, to_count = sys.argv[1:4]
+    for table, count in reshard(name, int(from_count), int(to_count)).items():
+        print(f"{table}: {count} rows")
@@ -0,0 +1,117 @@
+import asyncio
+import contextvars
+import functools
+import itertools
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, TypeVar
+
+from entity.record import Record
+from pool import DEFAULT_POOL_SIZE
+from service.record.base import RecordService
+
+T = TypeVar("T")
+
+# one executor thread per pooled connection, more would only wait on the pool
+DEFAULT_MAX_WORKERS = DEFAULT_POOL_SIZE
+STREAM_BATCH = 100
+
+
+class AsyncRecordService:
+    """Asyncio front for a blocking record service.
+
+    Every call runs on a dedicated DB executor so the event loop keeps serving other
+    requests while sqlite works. Streams are read from the executor in batches to
+    keep hops between the loop and the executor few.
+    """
+
+    def __init__(
+        self, service: RecordService, max_workers: int = DEFAULT_MAX_WORKERS
+    ) -> None:
+        """Wrap service, executor threads are started lazily on first call."""
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="db")
+
+    async def get_record(self, slug: str, **kwargs: Any) -> Record:
+        """Get record by unique slug."""
+        return await self._run(self.service.get_record, slug, **kwargs)
+
+    async def create_record(self, record: Record, **kwargs: Any) -> None:
+        """Create record from record data."""
+        await self._run(self.service.create_record, record, **kwargs)
+
+    async def update_record(
+        self, slug: str, data: dict[str, Any], **kwargs: Any
+    ) -> Record:
+        """Update record data according to data values."""
+        return await self._run(self.service.update_record, slug, data, **kwargs)
+
+    async def upsert_record(
+        self, slug: str, data: dict[str, Any], **kwargs: Any
+    ) -> Record:
+        """Create record or update it if it exists."""
+        return await self._run(self.service.upsert_record, slug, data, **kwargs)
+
+    async def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
+        """Get versions for slug."""
+        return await self._run(self.service.get_versions, slug, **kwargs)
+
+    async def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get up to limit versions after a version, and the cursor for the next page."""
+        return await self._run(self.service.get_versions_page, slug, after, limit)
+
+    async def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, Record | None]:
+        """Get records for many slugs, missing slugs map to None."""
+        return await self._run(self.service.get_records_many, slugs, **kwargs)
+
+    async def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many (slug, data) pairs, returns a result per pair."""
+        return await self._run(self.service.bulk_upsert, records, **kwargs)
+
+    async def get_record_as_of(self, slug: str, timestamp: datetime) -> Record:
+        """Get the version of record that was latest at timestamp."""
+        return await self._run(self.service.get_record_as_of, slug, timestamp)
+
+    def iter_history(self, slug: str) -> AsyncIterator[Record]:
+        """Stream every version of record in order, ending with the latest."""
+        return self._stream(functools.partial(self.service.iter_history, slug))
+
+    def iter_records_as_of(self, timestamp: datetime) -> AsyncIterator[Record]:
+        """Stream the latest version of every record as of timestamp."""
+        return self._stream(
+            functools.partial(self.service.iter_records_as_of, timestamp)
+        )
+
+    def close(self) -> None:
+        """Wait for running calls and stop the executor threads."""
+        self.executor.shutdown()
+
+    async def _run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        # run in a copy of the context so request metrics count the call
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(context.run, fn, *args, **kwargs)
+        )
+
+    async def _stream(
+        self, iterate: Callable[[], Iterator[Record]]
+    ) -> AsyncIterator[Record]:
+        records = await self._run(iterate)
+        try:
+            while batch := await self._run(
+                lambda: list(itertools.islice(records, STREAM_BATCH))
+            ):
+                for record in batch:
+                    yield record
+        finally:
+            close = getattr(records, "close", None)
+            if close is not None:
+                await self._run(close)
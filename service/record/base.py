@@ -1,7 +1,9 @@
-from typing import TYPE_CHECKING, Any
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any, NamedTuple
 
-if TYPE_CHECKING:
-    from entity.record import Record
+from entity.record import Record, changes_between
+from service.record.search import SearchResult, scan
 
 
 class RecordError(Exception):
@@ -16,13 +18,40 @@ class RecordAlreadyExistsError(RecordError):
     """Raised when record exists."""
 
 
+class StoredRecord(NamedTuple):
+    """A version of a record with its data as stored by the service codec."""
+
+    slug: str
+    version: int | None
+    timestamp: Any
+    value: str | bytes
+
+
+class Change(NamedTuple):
+    """A write of a record in the change log, seq grows with every write."""
+
+    seq: int
+    slug: str
+    version: int | None
+    timestamp: Any
+
+
 class RecordService:
     """A base class for record services."""
 
     def get_record(self, slug: str, **kwargs: Any) -> "Record":
-        """Get record by unique slug."""
+        """Get record by unique slug, fields=[...] limits data to those keys."""
         raise NotImplementedError
 
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get (version, timestamp) of record, backends answer it without the data."""
+        record = self.get_record(slug, **kwargs)
+        return record.version, record.timestamp
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record with its data as stored, None if the backend cannot."""
+        return None
+
     def create_record(self, record: "Record", **kwargs: Any) -> None:
         """Create record from record data."""
         raise NotImplementedError
@@ -31,6 +60,108 @@ class RecordService:
         """Update record data according to data values."""
         raise NotImplementedError
 
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get up to limit versions after a version, and the cursor for the next page."""
+        raise NotImplementedError
+
+    def get_changes(self, after: int = 0, limit: int = 100) -> list[Change]:
+        """Get up to limit changes with a seq above after, oldest first."""
+        raise NotImplementedError
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream every version of record in order, ending with the latest."""
+        raise NotImplementedError
+
+    def diff_versions(
+        self, slug: str, old: int | str, new: int | str = "latest"
+    ) -> dict[str, Any]:
+        """Get the changes dict turning version old of record into version new.
+
+        Keys added or changed map to their new values and removed keys to None, as
+        Record.update_data takes them. Reads both versions in full, backends
+        override this to read less.
+        """
+        return changes_between(
+            self.get_record(slug, version=old).data,
+            self.get_record(slug, version=new).data,
+        )
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        after: str | None = None,
+        limit: int = 100,
+        timestamp: datetime | None = None,
+    ) -> SearchResult:
+        """Get up to limit records after slug after whose data matches where.
+
+        where maps dotted data paths to values, records are the latest versions or
+        those at timestamp, in slug order. Reads every record, backends override
+        this to use indexes.
+        """
+        records = self.iter_records_as_of(timestamp or datetime.max)
+        return scan(records, where, after, limit)
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get the version of record that was latest at timestamp."""
+        raise NotImplementedError
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream the latest version of every record as of timestamp."""
+        raise NotImplementedError
+
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Create record or update it if it exists.
+
+        Falsy values are dropped on create and delete keys on update. Storage
+        backends override this to do it atomically.
+        """
+        try:
+            self.get_record(slug, **kwargs)
+        except RecordDoesNotExistError:
+            record = Record(slug, {k: v for k, v in data.items() if v}, **kwargs)
+            self.create_record(record, **kwargs)
+            return record
+
+        return self.update_record(slug, data, **kwargs)
+
     def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
         """Get versions for slug."""
         raise NotImplementedError
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get records for many slugs, missing slugs map to None."""
+        records: dict[str, Record | None] = {}
+        for slug in slugs:
+            try:
+                records[slug] = self.get_record(slug, **kwargs)
+            except RecordDoesNotExistError:
+                records[slug] = None
+
+        return records
+
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many (slug, data) pairs, returns a result per pair.
+
+        Falsy values are dropped on create and delete keys on update, like
+        upsert_record. Storage backends override this to write in one transaction.
+        """
+        results = []
+        for slug, data in records:
+            try:
+                self.get_record(slug, **kwargs)
+            except RecordDoesNotExistError:
+                status = "created"
+            else:
+                status = "updated"
+            record = self.upsert_record(slug, data, **kwargs)
+
+            results.append({"slug": slug, "status": status, "version": record.version})
+
+        return results
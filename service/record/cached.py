@@ -0,0 +1,295 @@
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any
+
+from entity.record import Record
+from service.record.base import (
+    Change,
+    RecordDoesNotExistError,
+    RecordService,
+    StoredRecord,
+)
+from service.record.search import SearchResult
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate memory held by a decoded JSON value."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(_sizeof(v) for v in value)
+
+    return size
+
+
+class CachedRecordService(RecordService):
+    """Read-through LRU cache in front of another record service.
+
+    Entries are keyed by slug and requested version and bounded both by count and by
+    approximate size. Writes through this service drop every cached version of the
+    slug. Entries are checked against the version and write time of the stored record
+    before they are served, so writes made by other instances and processes, and
+    numbered versions they prune, are seen at once.
+    """
+
+    def __init__(
+        self,
+        service: RecordService,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """Wrap service with an empty cache."""
+        self.service = service
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[Record, int]] = OrderedDict()
+        self._slug_keys: dict[str, set[tuple[str, str]]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_record(self, slug: str, **kwargs: Any) -> "Record":
+        """Get record from cache or load it from the wrapped service.
+
+        Only fields of a cached record are cut from it, on a miss they are loaded
+        from the wrapped service and not cached.
+        """
+        key = (slug, str(kwargs.get("version", "latest")))
+        fields = kwargs.get("fields")
+        stamp = self._stamp(key, **kwargs)
+        with self._lock:
+            cached = self._lookup(key, stamp)
+            if cached is not None:
+                return cached if fields is None else cached.project(fields)
+
+            generation = self._generation
+
+        if fields is not None:
+            return self.service.get_record(slug, **kwargs)
+
+        record = self.service.get_record(slug, **kwargs)
+        self._store(key, record, generation)
+
+        return self._copy(record)
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get cached records and load the rest with one wrapped service call.
+
+        Latest versions are always loaded, one call is cheaper than checking each.
+        Cached numbered versions are each checked against the wrapped service.
+        """
+        version = str(kwargs.get("version", "latest"))
+        records: dict[str, Record | None] = dict.fromkeys(slugs)
+        with self._lock:
+            generation = self._generation
+
+        if version != "latest":
+            for slug in records:
+                try:
+                    stamp = self._stamp((slug, version), **kwargs)
+                except RecordDoesNotExistError:
+                    continue
+                with self._lock:
+                    records[slug] = self._lookup((slug, version), stamp)
+
+        missing = [slug for slug, record in records.items() if record is None]
+        if missing:
+            loaded = self.service.get_records_many(missing, **kwargs)
+            for slug, record in loaded.items():
+                if record is not None:
+                    self._store((slug, version), record, generation)
+                    records[slug] = self._copy(record)
+
+        return records
+
+    def create_record(self, record: "Record", **kwargs: Any) -> None:
+        """Create record and invalidate cached versions of its slug."""
+        try:
+            self.service.create_record(record, **kwargs)
+        finally:
+            self.invalidate(record.slug)
+
+    def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Update record and invalidate cached versions of its slug."""
+        try:
+            return self.service.update_record(slug, data, **kwargs)
+        finally:
+            self.invalidate(slug)
+
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Upsert record and invalidate cached versions of its slug."""
+        try:
+            return self.service.upsert_record(slug, data, **kwargs)
+        finally:
+            self.invalidate(slug)
+
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Write records and invalidate cached versions of their slugs."""
+        try:
+            return self.service.bulk_upsert(records, **kwargs)
+        finally:
+            for slug in {slug for slug, _ in records}:
+                self.invalidate(slug)
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record as stored from the wrapped service, not cached."""
+        return self.service.get_record_stored(slug, **kwargs)
+
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get version and timestamp from the wrapped service, not cached."""
+        return self.service.get_record_stamp(slug, **kwargs)
+
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get a page of versions from the wrapped service, not cached."""
+        return self.service.get_versions_page(slug, after, limit)
+
+    def get_changes(self, after: int = 0, limit: int = 100) -> list[Change]:
+        """Get changes from the wrapped service, not cached."""
+        return self.service.get_changes(after, limit)
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream history from the wrapped service, not cached."""
+        return self.service.iter_history(slug)
+
+    def diff_versions(
+        self, slug: str, old: int | str, new: int | str = "latest"
+    ) -> dict[str, Any]:
+        """Diff versions of record in the wrapped service, not cached."""
+        return self.service.diff_versions(slug, old, new)
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        after: str | None = None,
+        limit: int = 100,
+        timestamp: datetime | None = None,
+    ) -> SearchResult:
+        """Search records in the wrapped service, not cached."""
+        return self.service.search_records(where, after, limit, timestamp)
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get record as of timestamp from the wrapped service, not cached."""
+        return self.service.get_record_as_of(slug, timestamp)
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream records as of timestamp from the wrapped service, not cached."""
+        return self.service.iter_records_as_of(timestamp)
+
+    def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
+        """Get versions from the wrapped service, version lists are not cached."""
+        return self.service.get_versions(slug, **kwargs)
+
+    def invalidate(self, slug: str) -> None:
+        """Drop every cached version of slug."""
+        with self._lock:
+            self._generation += 1
+            for key in self._slug_keys.pop(slug, ()):
+                self._drop(key)
+
+    def clear(self) -> None:
+        """Drop all entries, counters are kept."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._slug_keys.clear()
+            self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get cache counters."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _store(self, key: tuple[str, str], record: "Record", generation: int) -> None:
+        size = _sizeof(record.data)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # a write invalidated entries while the record was loaded
+            if self._generation != generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (self._copy(record), size)
+            self._slug_keys.setdefault(key[0], set()).add(key)
+            self.size += size
+
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                slug_keys = self._slug_keys[oldest[0]]
+                slug_keys.discard(oldest)
+                if not slug_keys:
+                    del self._slug_keys[oldest[0]]
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _stamp(self, key: tuple[str, str], **kwargs: Any) -> tuple[Any, str] | None:
+        """Get the stamp a cached entry must match, None when key is not cached.
+
+        Only asks the wrapped service when an entry is cached, a pruned version
+        drops the cached versions of its slug.
+        """
+        if key not in self._entries:
+            return None
+
+        try:
+            version, timestamp = self.service.get_record_stamp(key[0], **kwargs)
+        except RecordDoesNotExistError:
+            self.invalidate(key[0])
+            raise
+
+        return version, str(timestamp)
+
+    def _lookup(
+        self, key: tuple[str, str], stamp: tuple[Any, str] | None = None
+    ) -> "Record | None":
+        """Get a copy of a current entry and count the hit or miss, needs the lock.
+
+        With stamp, entries of another version or write time are dropped.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and stamp is not None:
+            record = entry[0]
+            if (record.version, str(record.timestamp)) != stamp:
+                self._slug_keys[key[0]].discard(key)
+                self._drop(key)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return self._copy(entry[0])
+
+    def _drop(self, key: tuple[str, str]) -> None:
+        _, size = self._entries.pop(key)
+        self.size -= size
+
+    @staticmethod
+    def _copy(record: "Record") -> "Record":
+        """Shallow copy so callers cannot mutate cached data."""
+        return record.copy()
@@ -0,0 +1,273 @@
+import json
+import struct
+import zlib
+from datetime import datetime
+from typing import TYPE_CHECKING, Any
+
+import jsonpickle
+
+from db import placeholders
+from metrics import timed_codec
+
+if TYPE_CHECKING:
+    from entity.record import Record
+    from service.record.base import Change
+
+
+class Codec:
+    """A base class for record data codecs."""
+
+    def encode(self, data: Any) -> str:
+        """Serialize data for storage or a response body."""
+        raise NotImplementedError
+
+    def decode(self, text: str) -> Any:
+        """Deserialize stored data."""
+        raise NotImplementedError
+
+    @timed_codec
+    def dump(self, data: Any) -> str | bytes:
+        """Serialize data for the data column, text unless a codec compresses it."""
+        return self.encode(data)
+
+    @timed_codec
+    def load(self, value: str | bytes, legacy: bool = False) -> Any:
+        """Deserialize a data column value written by dump.
+
+        legacy rows were written by jsonpickle before the JSON codec, as flagged by
+        their legacy column, other rows are never read with jsonpickle.
+        """
+        text = value if isinstance(value, str) else value.decode()
+        if legacy:
+            return jsonpickle.decode(text)
+
+        return self.decode(text)
+
+    def fields_sql(self, column: str, count: int) -> str | None:
+        """SQL encoding the top level keys of column that are among count ? params.
+
+        Lets SQLite cut fields out of stored data so the rest is never decoded, the
+        expression is NULL for values it cannot read. None if the codec has no SQL.
+        """
+        return None
+
+
+class JsonCodec(Codec):
+    """Plain JSON codec, legacy jsonpickle rows are read by load."""
+
+    @timed_codec
+    def encode(self, data: Any) -> str:
+        """Serialize data as compact JSON."""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    @timed_codec
+    def decode(self, text: str) -> Any:
+        """Deserialize JSON."""
+        return json.loads(text)
+
+    def fields_sql(self, column: str, count: int) -> str | None:
+        """Extract fields with the JSON functions, values are kept as stored."""
+        # json_each reports booleans as 1 and 0, keep them JSON booleans. Numbers it
+        # reads as floats, integers beyond 64 bits included, json_group_object cuts
+        # to 15 digits: json_extract with the path twice returns the JSON text
+        # [value,value] instead, the middle is the value as stored. Keys that path
+        # cannot address, e.g. with quotes, leave the data to the codec.
+        return f"""(
+                SELECT CASE WHEN coalesce(max(raw = '[null,null]'), 0) = 0
+                THEN json_group_object(key, CASE
+                    WHEN raw IS NOT NULL
+                    THEN json(substr(raw, 2, (length(raw) - 3) / 2))
+                    WHEN type = 'true' THEN json('true')
+                    WHEN type = 'false' THEN json('false')
+                    ELSE value END) END
+                FROM (
+                    SELECT key, type, value, CASE WHEN typeof(value) = 'real'
+                        THEN json_extract({column}, fullkey, fullkey) END AS raw
+                    FROM json_each({column}) WHERE key IN ({placeholders(count)})
+                )
+            )"""
+
+
+class JsonPickleCodec(Codec):
+    """Codec the services used originally, kept for compatibility."""
+
+    @timed_codec
+    def encode(self, data: Any) -> str:
+        """Serialize data with jsonpickle."""
+        return jsonpickle.encode(data)
+
+    @timed_codec
+    def decode(self, text: str) -> Any:
+        """Deserialize jsonpickle data."""
+        return jsonpickle.decode(text)
+
+
+# zlib header without a preset dictionary, and its FDICT flag
+ZLIB_HEADER = b"\x78\x9c"
+FDICT = 0x20
+# empty final block zlib emits on Z_FINISH right after a sync flush
+EMPTY_FINAL_BLOCK = b"\x03\x00"
+
+
+class CompressedCodec(Codec):
+    """Stores large values as zlib compressed blobs, smaller ones as text.
+
+    Values from threshold bytes on are compressed, those below zdict_max with the
+    preset dictionary zdict if one is given. Blobs are a zlib stream ending in a
+    sync flush and an empty final block, followed by the uncompressed length, so
+    dictionary-free blobs can be spliced into a deflate response body unchanged.
+    Response bodies are encoded by the wrapped codec.
+    """
+
+    def __init__(
+        self,
+        codec: Codec | None = None,
+        threshold: int = 1024,
+        level: int = 6,
+        zdict: bytes | None = None,
+        zdict_max: int = 16 * 1024,
+    ) -> None:
+        """Wrap codec, plain JSON by default."""
+        self.codec = codec or JsonCodec()
+        self.threshold = threshold
+        self.level = level
+        self.zdict = zdict
+        self.zdict_max = zdict_max
+
+    @timed_codec
+    def encode(self, data: Any) -> str:
+        """Serialize data with the wrapped codec."""
+        return self.codec.encode(data)
+
+    @timed_codec
+    def decode(self, text: str) -> Any:
+        """Deserialize text with the wrapped codec."""
+        return self.codec.decode(text)
+
+    def fields_sql(self, column: str, count: int) -> str | None:
+        """Extract fields of values stored as text, compressed blobs are NULL."""
+        expression = self.codec.fields_sql(column, count)
+        if expression is None:
+            return None
+
+        return f"CASE WHEN typeof({column}) = 'text' THEN {expression} END"
+
+    @timed_codec
+    def dump(self, data: Any) -> str | bytes:
+        """Serialize data, compressing it from threshold bytes on."""
+        text = self.codec.encode(data)
+        raw = text.encode()
+        if len(raw) < self.threshold:
+            return text
+
+        if self.zdict is not None and len(raw) < self.zdict_max:
+            compressor = zlib.compressobj(self.level, zdict=self.zdict)
+        else:
+            compressor = zlib.compressobj(self.level)
+        blob = (
+            compressor.compress(raw)
+            + compressor.flush(zlib.Z_SYNC_FLUSH)
+            + compressor.flush(zlib.Z_FINISH)
+        )
+
+        return blob + struct.pack(">I", len(raw))
+
+    @timed_codec
+    def load(self, value: str | bytes, legacy: bool = False) -> Any:
+        """Deserialize text or a compressed blob, legacy rows are never compressed."""
+        if isinstance(value, str):
+            return self.codec.load(value, legacy)
+
+        return self.codec.decode(self.inflate(value))
+
+    @timed_codec
+    def inflate(self, blob: bytes) -> str:
+        """Get the text of a compressed blob."""
+        if blob[1] & FDICT:
+            decompressor = zlib.decompressobj(zdict=self.zdict or b"")
+        else:
+            decompressor = zlib.decompressobj()
+
+        return decompressor.decompress(blob).decode()
+
+    @staticmethod
+    def train(samples: list[Any], size: int = 32 * 1024) -> bytes:
+        """Build a preset dictionary from typical values, common parts last.
+
+        zlib only looks back 32 KiB and finds the end of the dictionary cheapest.
+        """
+        encoded = [json.dumps(sample, separators=(",", ":")) for sample in samples]
+        return "".join(encoded).encode()[-size:]
+
+
+def _stored_block(data: bytes, final: bool) -> bytes:
+    """Uncompressed deflate block, starts and ends on a byte boundary."""
+    length = struct.pack("<H", len(data))
+    nlength = struct.pack("<H", len(data) ^ 0xFFFF)
+
+    return bytes([int(final)]) + length + nlength + data
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """Adler-32 of two byte strings from their checksums, as zlib computes it."""
+    base = 65521
+    remainder = length2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % base
+    sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - remainder) % base
+
+    return sum1 | (sum2 << 16)
+
+
+def deflate_splice(head: bytes, blob: bytes, tail: bytes) -> bytes | None:
+    """Get a zlib stream of head + the blob's text + tail, without recompressing.
+
+    Returns None for blobs that need a preset dictionary, HTTP clients cannot
+    inflate those. head and tail must fit in one stored block each.
+    """
+    stream, length = blob[:-4], struct.unpack(">I", blob[-4:])[0]
+    if stream[1] & FDICT or stream[-6:-4] != EMPTY_FINAL_BLOCK:
+        return None
+    if max(len(head), len(tail)) > 0xFFFF:
+        return None
+
+    adler = zlib.adler32(head)
+    adler = _adler32_combine(adler, struct.unpack(">I", stream[-4:])[0], length)
+    adler = _adler32_combine(adler, zlib.adler32(tail), len(tail))
+
+    return (
+        ZLIB_HEADER
+        + _stored_block(head, final=False)
+        + stream[2:-6]
+        + _stored_block(tail, final=True)
+        + struct.pack(">I", adler)
+    )
+
+
+def change_dict(change: "Change") -> dict[str, Any]:
+    """Response schema for a change: seq, slug, version and timestamp."""
+    timestamp = change.timestamp
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat(sep=" ")
+
+    return {
+        "seq": change.seq,
+        "slug": change.slug,
+        "version": change.version,
+        "timestamp": timestamp,
+    }
+
+
+def record_dict(record: "Record") -> dict[str, Any]:
+    """Response schema for a record: slug, version, timestamp and data."""
+    timestamp = record.timestamp
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat(sep=" ")
+
+    return {
+        "slug": record.slug,
+        "version": record.version,
+        "timestamp": timestamp,
+        "data": record.data,
+    }
@@ -1,39 +1,301 @@
-from typing import TYPE_CHECKING, Any
+import bisect
+import os
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+from typing import Any
 
+from entity.record import Record
 from service.record.base import (
+    Change,
     RecordAlreadyExistsError,
     RecordDoesNotExistError,
     RecordService,
 )
+from service.record.codec import Codec, JsonCodec, record_dict
 
-if TYPE_CHECKING:
-    from entity.record import Record
 
-RECORD_LEDGER: dict[Any, Any] = {}
+def _as_datetime(timestamp: datetime | str) -> datetime:
+    """Timestamps read back from sqlite are strings, keep them all as datetimes."""
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp)
+
+    return timestamp
+
+
+def _version(record: Record) -> int:
+    """Version number of a stored record, the key its history is bisected by."""
+    return record.version or 0
 
 
 class InMemoryRecordService(RecordService):
-    """Record service implementation for in-memory storage."""
+    """Versioned record service kept in process memory.
+
+    Every slug has an array of its versions, oldest first and looked up by number;
+    histories imported after pruning have gaps. Stored records are never changed:
+    updates append the next version built with Record.with_changes and callers
+    always get copies. State belongs to the instance and can be saved to and loaded
+    from a snapshot file.
+    """
+
+    codec: Codec = JsonCodec()
+
+    def __init__(self) -> None:
+        """Create an empty service."""
+        self._history: dict[str, list[Record]] = {}
+        # change n has seq n + 1
+        self._changes: list[Change] = []
+        self._lock = threading.RLock()
 
     def get_record(self, slug: str, **kwargs: Any) -> "Record":
-        """Get in-memory record."""
+        """Get record by slug + version, defaults to latest, with only fields if given."""
+        record = self._get(slug, kwargs.get("version", "latest"))
+        fields = kwargs.get("fields")
+
+        return record.copy() if fields is None else record.project(fields)
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get many slugs at one version, defaults to latest, missing map to None."""
+        version = kwargs.get("version", "latest")
+        records: dict[str, Record | None] = {}
+        for slug in slugs:
+            try:
+                records[slug] = self._get(slug, version).copy()
+            except RecordDoesNotExistError:
+                records[slug] = None
+
+        return records
+
+    def create_record(self, record: "Record", **kwargs: Any) -> None:
+        """Create new record as version 1."""
+        with self._lock:
+            if record.slug in self._history:
+                raise RecordAlreadyExistsError
+
+            self._history[record.slug] = [
+                Record(
+                    record.slug,
+                    dict(record.data),
+                    version=1,
+                    timestamp=_as_datetime(record.timestamp),
+                )
+            ]
+            self._log(self._history[record.slug][0])
+
+    def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Add the next version of record, unless changes leave its data as is."""
+        with self._lock:
+            versions = self._versions(slug)
+            latest = versions[-1]
+            record = latest.with_changes(data)
+            if record.data == latest.data:
+                return latest.copy()
+
+            versions.append(record)
+            self._log(record)
+
+        return record.copy()
+
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Create record or add its next version, atomically."""
+        with self._lock:
+            if slug in self._history:
+                return self.update_record(slug, data)
+
+            record = Record(slug, {k: v for k, v in data.items() if v}, version=1)
+            self.create_record(record)
+
+        return record
+
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many records at once, one new version per changed slug."""
+        with self._lock:
+            latest = {
+                slug: self._history[slug][-1]
+                for slug, _ in records
+                if slug in self._history
+            }
+            current: dict[str, Record] = {}
+            statuses = []
+            for slug, data in records:
+                record = current.get(slug)
+                if record is None and slug not in latest:
+                    revised_data = {k: v for k, v in data.items() if v}
+                    current[slug] = Record(slug, revised_data, version=1)
+                    statuses.append("created")
+                    continue
+
+                if record is None:
+                    record = current[slug] = latest[slug].copy()
+                before = dict(record.data)
+                record.update_data(data)
+                statuses.append("unchanged" if record.data == before else "updated")
+
+            now = datetime.now()
+            for slug, record in current.items():
+                if slug not in latest:
+                    record.timestamp = now
+                    self._history[slug] = [record]
+                    self._log(record)
+                elif record.data != latest[slug].data:
+                    record.version = (latest[slug].version or 0) + 1
+                    record.timestamp = now
+                    self._history[slug].append(record)
+                    self._log(record)
+
+        return [
+            {"slug": slug, "status": status, "version": current[slug].version}
+            for (slug, _), status in zip(records, statuses)
+        ]
+
+    def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
+        """Get version numbers for slug."""
+        return [_version(record) for record in self._versions(slug)]
+
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get up to limit versions after a version, and the cursor for the next page."""
+        if slug not in self._history and after is not None:
+            return [], None
+
+        history = self._versions(slug)
+        start = bisect.bisect_right(history, after or 0, key=_version)
+        versions = [_version(record) for record in history[start : start + limit + 1]]
+        next_after = versions[limit - 1] if len(versions) > limit else None
+
+        return versions[:limit], next_after
+
+    def get_changes(self, after: int = 0, limit: int = 100) -> list[Change]:
+        """Get up to limit changes with a seq above after, oldest first."""
+        start = max(after, 0)
+        return self._changes[start : start + limit]
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream every version of record in order, ending with the latest."""
+        for record in list(self._history.get(slug, ())):
+            yield record.copy()
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get the version of record that was latest at timestamp."""
+        record = self._as_of(self._versions(slug), timestamp)
+        if record is None:
+            raise RecordDoesNotExistError
+
+        return record.copy()
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream the latest version of every record as of timestamp."""
+        for versions in list(self._history.values()):
+            record = self._as_of(versions, timestamp)
+            if record is not None:
+                yield record.copy()
+
+    def import_records(self, service: RecordService) -> int:
+        """Copy the full history of every record in service, returns the count.
+
+        Use it to warm an instance serving as a hot tier in front of sqlite.
+        """
+        count = 0
+        for latest in service.iter_records_as_of(datetime.max):
+            versions = [
+                Record(
+                    record.slug,
+                    record.data,
+                    version=record.version,
+                    timestamp=_as_datetime(record.timestamp),
+                )
+                for record in service.iter_history(latest.slug)
+            ]
+            with self._lock:
+                self._history[latest.slug] = versions
+            count += 1
+
+        with self._lock:
+            self._rebuild_changes()
+
+        return count
+
+    def save(self, path: str) -> None:
+        """Write every version of every record to a snapshot file, one per line.
+
+        The file is written next to path and moved over it once complete, so a
+        crash while saving leaves the previous snapshot in place.
+        """
+        with self._lock:
+            histories = list(self._history.values())
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for versions in histories:
+                for record in versions:
+                    f.write(self.codec.encode(record_dict(record)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """Replace all records with the ones in a snapshot file."""
+        history: dict[str, list[Record]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                row = self.codec.decode(line)
+                history.setdefault(row["slug"], []).append(
+                    Record(
+                        row["slug"],
+                        row["data"],
+                        version=row["version"],
+                        timestamp=_as_datetime(row["timestamp"]),
+                    )
+                )
+
+        with self._lock:
+            self._history = history
+            self._rebuild_changes()
+
+    def _log(self, record: "Record") -> None:
+        self._changes.append(
+            Change(
+                len(self._changes) + 1, record.slug, record.version, record.timestamp
+            )
+        )
+
+    def _rebuild_changes(self) -> None:
+        """Log every stored version in write order, the log is not saved."""
+        self._changes = []
+        versions = (record for history in self._history.values() for record in history)
+        for record in sorted(versions, key=lambda record: record.timestamp):
+            self._log(record)
+
+    def _versions(self, slug: str) -> list["Record"]:
         try:
-            record = RECORD_LEDGER[slug]
+            return self._history[slug]
         except KeyError as e:
             raise RecordDoesNotExistError from e
 
-        return record
+    def _get(self, slug: str, version: Any) -> "Record":
+        versions = self._versions(slug)
+        if version == "latest":
+            return versions[-1]
 
-    def create_record(self, record: "Record", **kwargs: Any) -> None:
-        """Create in-memory record."""
-        if record.slug in RECORD_LEDGER:
-            raise RecordAlreadyExistsError
-        else:
-            RECORD_LEDGER[record.slug] = record
+        try:
+            number = int(version)
+        except ValueError as e:
+            raise RecordDoesNotExistError from e
+        index = bisect.bisect_left(versions, number, key=_version)
+        if index == len(versions) or versions[index].version != number:
+            raise RecordDoesNotExistError
 
-    def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
-        """Update in-memory record."""
-        entry = RECORD_LEDGER[slug]
-        entry.update_data(data)
+        return versions[index]
+
+    @staticmethod
+    def _as_of(versions: list["Record"], timestamp: datetime) -> "Record | None":
+        index = bisect.bisect_right(
+            versions, timestamp, key=lambda record: record.timestamp
+        )
 
-        return entry
+        return versions[index - 1] if index else None
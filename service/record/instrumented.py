@@ -0,0 +1,157 @@
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from typing import Any, TypeVar
+
+from entity.record import Record
+from metrics import Metrics, metrics
+from service.record.base import Change, RecordService, StoredRecord
+from service.record.search import SearchResult
+
+T = TypeVar("T")
+
+
+class InstrumentedRecordService(RecordService):
+    """Records the latency of every call to another record service in metrics.
+
+    Streams are timed while they are consumed, excluding the time the caller
+    spends between records.
+    """
+
+    def __init__(self, service: RecordService, registry: Metrics = metrics) -> None:
+        """Wrap service, latencies go to the process wide registry by default."""
+        self.service = service
+        self.registry = registry
+
+    def get_record(self, slug: str, **kwargs: Any) -> "Record":
+        """Get record by unique slug."""
+        return self._timed("get_record", self.service.get_record, slug, **kwargs)
+
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get (version, timestamp) of record."""
+        return self._timed(
+            "get_record_stamp", self.service.get_record_stamp, slug, **kwargs
+        )
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record with its data as stored."""
+        return self._timed(
+            "get_record_stored", self.service.get_record_stored, slug, **kwargs
+        )
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get records for many slugs, missing slugs map to None."""
+        return self._timed(
+            "get_records_many", self.service.get_records_many, slugs, **kwargs
+        )
+
+    def create_record(self, record: "Record", **kwargs: Any) -> None:
+        """Create record from record data."""
+        self._timed("create_record", self.service.create_record, record, **kwargs)
+
+    def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Update record data according to data values."""
+        return self._timed(
+            "update_record", self.service.update_record, slug, data, **kwargs
+        )
+
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Create record or update it if it exists."""
+        return self._timed(
+            "upsert_record", self.service.upsert_record, slug, data, **kwargs
+        )
+
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many (slug, data) pairs, returns a result per pair."""
+        return self._timed("bulk_upsert", self.service.bulk_upsert, records, **kwargs)
+
+    def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
+        """Get versions for slug."""
+        return self._timed("get_versions", self.service.get_versions, slug, **kwargs)
+
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get up to limit versions after a version, and the cursor for the next page."""
+        return self._timed(
+            "get_versions_page", self.service.get_versions_page, slug, after, limit
+        )
+
+    def get_changes(self, after: int = 0, limit: int = 100) -> list[Change]:
+        """Get up to limit changes with a seq above after, oldest first."""
+        return self._timed("get_changes", self.service.get_changes, after, limit)
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream every version of record in order, ending with the latest."""
+        return self._timed_stream(
+            "iter_history", lambda: self.service.iter_history(slug)
+        )
+
+    def diff_versions(
+        self, slug: str, old: int | str, new: int | str = "latest"
+    ) -> dict[str, Any]:
+        """Get the changes dict turning version old of record into version new."""
+        return self._timed("diff_versions", self.service.diff_versions, slug, old, new)
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        after: str | None = None,
+        limit: int = 100,
+        timestamp: datetime | None = None,
+    ) -> SearchResult:
+        """Get up to limit records after slug after whose data matches where."""
+        return self._timed(
+            "search_records",
+            self.service.search_records,
+            where,
+            after,
+            limit,
+            timestamp,
+        )
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get the version of record that was latest at timestamp."""
+        return self._timed(
+            "get_record_as_of", self.service.get_record_as_of, slug, timestamp
+        )
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream the latest version of every record as of timestamp."""
+        return self._timed_stream(
+            "iter_records_as_of", lambda: self.service.iter_records_as_of(timestamp)
+        )
+
+    def _timed(self, method: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.registry.observe_service(method, time.perf_counter() - start)
+
+    def _timed_stream(
+        self, method: str, iterate: Callable[[], Iterator["Record"]]
+    ) -> Iterator["Record"]:
+        start = time.perf_counter()
+        records = iterate()
+        spent = time.perf_counter() - start
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    record = next(records)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - start
+
+                yield record
+        finally:
+            close = getattr(records, "close", None)
+            if close is not None:
+                close()
+            self.registry.observe_service(method, spent)
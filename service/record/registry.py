@@ -0,0 +1,39 @@
+from typing import Any
+
+from service.record.base import RecordService
+from service.record.inmemory import InMemoryRecordService
+from service.record.sharded import ShardedRecordService
+from service.record.v1 import SqliteRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+# backend name -> record service class, options are set as instance attributes
+BACKENDS: dict[str, type[RecordService]] = {
+    "sqlite": SqliteRecordService,
+    "sqlite-history": RecordRevisionHistoryService,
+    "memory": InMemoryRecordService,
+    "sharded": ShardedRecordService,
+}
+
+
+def register_backend(name: str, backend: type[RecordService]) -> None:
+    """Make a record service class selectable by name."""
+    BACKENDS[name] = backend
+
+
+def create_service(name: str, **options: Any) -> RecordService:
+    """Create the record service registered as name and override its options.
+
+    Options name attributes of the service, e.g. db_name or storage_mode.
+    """
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown record backend {name!r}") from None
+
+    service = backend()
+    for option, value in options.items():
+        if not hasattr(service, option):
+            raise ValueError(f"Record backend {name!r} has no option {option!r}")
+        setattr(service, option, value)
+
+    return service
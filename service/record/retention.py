@@ -0,0 +1,239 @@
+import re
+import time
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+from db import chunks, placeholders
+from entity.record import Record, diff_data
+from pool import get_pool
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor, Row
+
+DURATION_UNITS = {
+    "s": "seconds",
+    "m": "minutes",
+    "h": "hours",
+    "d": "days",
+    "w": "weeks",
+}
+
+
+def parse_duration(text: str) -> timedelta:
+    """Parse a duration such as 90m, 12h or 30d."""
+    match = re.fullmatch(r"(\d+)([smhdw])", text.strip())
+    if match is None:
+        raise ValueError(f"Invalid duration {text!r}, use e.g. 90m, 12h or 30d")
+
+    return timedelta(**{DURATION_UNITS[match[2]]: int(match[1])})
+
+
+def _as_datetime(timestamp: datetime | str | None) -> datetime | None:
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp)
+
+    return timestamp
+
+
+class RetentionPolicy:
+    """Decides which versions of a record to keep, a version any rule keeps stays.
+
+    keep_last keeps the newest versions, keep_within the versions younger than a
+    duration and every (age, every) tier of thin keeps the newest version per every
+    long period among versions older than age, e.g. hourly after a day and daily
+    after a month. Periods are aligned to the epoch, so repeated runs agree. The
+    latest version is always kept, a policy without rules keeps everything.
+    """
+
+    def __init__(
+        self,
+        keep_last: int | None = None,
+        keep_within: timedelta | None = None,
+        thin: Iterable[tuple[timedelta, timedelta]] = (),
+    ) -> None:
+        """Create a policy from its rules."""
+        self.keep_last = keep_last
+        self.keep_within = keep_within
+        self.thin = sorted(thin)
+
+    def __bool__(self) -> bool:
+        return (
+            self.keep_last is not None or self.keep_within is not None or any(self.thin)
+        )
+
+    def keep(
+        self, versions: list[tuple[int, datetime | None]], now: datetime
+    ) -> set[int]:
+        """Get the versions to keep out of (version, timestamp) pairs, oldest first."""
+        if not self or not versions:
+            return {version for version, _ in versions}
+
+        kept = {versions[-1][0]}
+        if self.keep_last is not None and self.keep_last > 0:
+            kept.update(version for version, _ in versions[-self.keep_last :])
+
+        buckets: dict[tuple[int, int], int] = {}
+        for version, timestamp in versions:
+            # versions without a timestamp cannot be aged, keep them
+            if timestamp is None:
+                kept.add(version)
+                continue
+
+            age = now - timestamp
+            if self.keep_within is not None and age <= self.keep_within:
+                kept.add(version)
+
+            tier = None
+            for i, (older_than, every) in enumerate(self.thin):
+                if age >= older_than:
+                    tier = i, int(timestamp.timestamp() // every.total_seconds())
+            if tier is not None:
+                # versions come oldest first, the last one seen per period wins
+                buckets[tier] = version
+
+        kept.update(buckets.values())
+        return kept
+
+
+def prune_history(
+    service: RecordRevisionHistoryService,
+    policy: RetentionPolicy,
+    now: datetime | None = None,
+    batch_size: int = 100,
+    pause: float = 0.0,
+) -> dict[str, int]:
+    """Delete the history versions policy drops, returns counts of what changed.
+
+    Records are pruned batch_size slugs per write transaction, sleeping pause seconds
+    between transactions so live writers get the write lock in between. Delta
+    revisions whose keyframe is pruned are compacted: the first one becomes a
+    keyframe and the others are stored as deltas against it.
+    """
+    now = now or datetime.now()
+    stats = {"records": 0, "pruned": 0, "pruned_bytes": 0, "keyframes": 0}
+    after = ""
+    while True:
+        with service.pool.connection(immediate=True) as conn:
+            cursor = conn.cursor()
+            slugs = [
+                row["records_slug"]
+                for row in cursor.execute(
+                    """SELECT DISTINCT records_slug FROM history WHERE records_slug > ?
+                    ORDER BY records_slug LIMIT ?""",
+                    (after, batch_size),
+                )
+            ]
+            for slug in slugs:
+                pruned, pruned_bytes, keyframes = _prune_record(
+                    service, cursor, slug, policy, now
+                )
+                stats["records"] += bool(pruned)
+                stats["pruned"] += pruned
+                stats["pruned_bytes"] += pruned_bytes
+                stats["keyframes"] += keyframes
+
+        if len(slugs) < batch_size:
+            return stats
+
+        after = slugs[-1]
+        time.sleep(pause)
+
+
+def _prune_record(
+    service: RecordRevisionHistoryService,
+    cursor: "Cursor",
+    slug: str,
+    policy: RetentionPolicy,
+    now: datetime,
+) -> tuple[int, int, int]:
+    rows = cursor.execute(
+        """SELECT id, version, timestamp, data, legacy, base_id FROM history
+        WHERE records_slug = ? ORDER BY version""",
+        (slug,),
+    ).fetchall()
+    latest = cursor.execute(
+        "SELECT version, created_at FROM versioned_records WHERE slug = ?", (slug,)
+    ).fetchone()
+
+    versions = [(row["version"], _as_datetime(row["timestamp"])) for row in rows]
+    if latest is not None:
+        versions.append((latest["version"], _as_datetime(latest["created_at"])))
+    kept = policy.keep(versions, now)
+    pruned = {row["id"]: row for row in rows if row["version"] not in kept}
+    if not pruned:
+        return 0, 0, 0
+
+    keyframes = 0
+    # keyframe id of pruned delta bases -> (new keyframe id, its data)
+    rebased: dict[int, tuple[int, dict[str, Any]]] = {}
+    for row in rows:
+        if row["id"] in pruned or row["base_id"] not in pruned:
+            continue
+
+        base = pruned[row["base_id"]]
+        record = Record(slug, service.codec.load(base["data"], base["legacy"]))
+        record.update_data(service.codec.load(row["data"], row["legacy"]))
+        data = record.data
+
+        keyframe = rebased.get(row["base_id"])
+        update: tuple[Any, ...]
+        delta = None if keyframe is None else diff_data(keyframe[1], data)
+        if keyframe is None or delta is None:
+            rebased.setdefault(row["base_id"], (row["id"], data))
+            keyframes += 1
+            update = (service.codec.dump(data), None, row["id"])
+        else:
+            update = (service.codec.dump(delta), keyframe[0], row["id"])
+        cursor.execute(
+            "UPDATE history SET data = ?, legacy = 0, base_id = ? WHERE id = ?", update
+        )
+
+    for chunk in chunks(list(pruned)):
+        cursor.execute(
+            f"DELETE FROM history WHERE id IN ({placeholders(len(chunk))})", chunk
+        )
+
+    return len(pruned), sum(_size(row) for row in pruned.values()), keyframes
+
+
+def _size(row: "Row") -> int:
+    data = row["data"]
+    return len(data) if isinstance(data, bytes) else len(data.encode())
+
+
+def vacuum(
+    db_name: str, pages: int = 1000, pause: float = 0.0, full: bool = False
+) -> int:
+    """Give free pages of the database file back to the file system, returns bytes.
+
+    Pages are freed pages at a time with incremental vacuum, which needs
+    auto_vacuum = INCREMENTAL. Files created before that setting are only
+    converted, by a full VACUUM that blocks writers while it runs, when full is set.
+    """
+    pool = get_pool(db_name)
+    with pool.connection() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    if incremental:
+        while True:
+            with pool.connection() as conn:
+                if not conn.execute("PRAGMA freelist_count").fetchone()[0]:
+                    break
+                conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            time.sleep(pause)
+    elif full:
+        with pool.connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+    else:
+        return 0
+
+    with pool.connection() as conn:
+        after = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    return (before - after) * page_size
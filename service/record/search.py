@@ -0,0 +1,99 @@
+import re
+import zlib
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+from entity.record import Record
+
+# names of the expression indexes on data paths start with this
+INDEX_PREFIX = "data_path_"
+
+_MISSING = object()
+
+
+class SearchResult(NamedTuple):
+    """A page of records matching a search, and how the backend found them.
+
+    indexes names the database indexes the search used, scanned is set when it had
+    to read every record, or every compressed one.
+    """
+
+    records: list[Record]
+    next_after: str | None
+    indexes: list[str]
+    scanned: bool
+
+
+def parse_path(path: str) -> list[str]:
+    """Split a dotted data path such as address.city into its keys."""
+    keys = path.split(".")
+    if not all(keys) or any('"' in key for key in keys):
+        raise ValueError(f"Invalid data path {path!r}")
+
+    return keys
+
+
+def path_sql(path: str) -> str:
+    """SQL for the value at path in the data column, as the indexes are built.
+
+    Compressed blobs are not JSON to SQLite and have no value.
+    """
+    json_path = "$" + "".join(f'."{key}"' for key in parse_path(path))
+    literal = json_path.replace("'", "''")
+
+    return f"json_extract(CASE WHEN typeof(data) = 'text' THEN data END, '{literal}')"
+
+
+def index_name(path: str) -> str:
+    """Name of the expression index on path, the hash keeps a.b and a_b apart."""
+    readable = re.sub(r"[^0-9A-Za-z]", "_", path)
+
+    return f"{INDEX_PREFIX}{readable}_{zlib.crc32(path.encode()):08x}"
+
+
+def read_plan(details: Iterable[str]) -> tuple[list[str], bool]:
+    """Get the indexes an EXPLAIN QUERY PLAN uses and whether it scans a table."""
+    indexes: list[str] = []
+    scanned = False
+    for detail in details:
+        indexes += re.findall(r"USING (?:COVERING )?INDEX (\w+)", detail)
+        scanned = scanned or detail.startswith("SCAN")
+
+    return indexes, scanned
+
+
+def matches(data: dict[str, Any], where: dict[str, Any]) -> bool:
+    """Whether data has every path of where set to its value."""
+    for path, expected in where.items():
+        value: Any = data
+        for key in parse_path(path):
+            value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+        if value is _MISSING or value != expected:
+            return False
+
+    return True
+
+
+def scan(
+    records: Iterable[Record], where: dict[str, Any], after: str | None, limit: int
+) -> SearchResult:
+    """Search records by reading every one, returns them in slug order."""
+    found = sorted(
+        (
+            record
+            for record in records
+            if (after is None or record.slug > after) and matches(record.data, where)
+        ),
+        key=lambda record: record.slug,
+    )
+
+    return page(found, limit, [], scanned=True)
+
+
+def page(
+    found: list[Record], limit: int, indexes: list[str], scanned: bool
+) -> SearchResult:
+    """Cut up to limit records sorted by slug, found holds at least one more if any."""
+    next_after = found[limit - 1].slug if len(found) > limit else None
+
+    return SearchResult(found[:limit], next_after, indexes, scanned)
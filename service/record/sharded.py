@@ -0,0 +1,237 @@
+import contextvars
+import functools
+import itertools
+import os
+import zlib
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, TypeVar
+
+import db
+from db import dbname
+from entity.record import Record
+from service.record.base import RecordService, StoredRecord
+from service.record.search import SearchResult
+from service.record.v2 import RecordRevisionHistoryService
+
+T = TypeVar("T")
+
+
+def shard_of(slug: str, count: int) -> int:
+    """Get the shard index of slug, stable across processes and restarts."""
+    return zlib.crc32(slug.encode()) % count
+
+
+def shard_files(db_name: str, count: int) -> list[str]:
+    """Get the database files of count shards, one shard is db_name itself.
+
+    The count is part of the file name, so resharding writes to new files.
+    """
+    if count == 1:
+        return [db_name]
+
+    root, ext = os.path.splitext(db_name)
+    return [f"{root}.{index}-of-{count}{ext}" for index in range(count)]
+
+
+class ShardedRecordService(RecordService):
+    """Spreads records over several sqlite files by a stable hash of their slug.
+
+    Every shard is a complete database with its own tables, pool and write lock,
+    served by its own backend service instance. Calls for one slug go to its shard,
+    calls for many slugs are split by shard and run on all shards in parallel.
+    Options are read when the shards are first used.
+    """
+
+    db_name: str = dbname
+    shards: int = 4
+    backend: type[RecordService] = RecordRevisionHistoryService
+    # attributes set on every shard service, e.g. {"storage_mode": "delta"}
+    shard_options: dict[str, Any] = {}
+
+    @functools.cached_property
+    def services(self) -> list[RecordService]:
+        """Backend service of each shard, creating the shard files on first use."""
+        services = []
+        for shard_name in shard_files(self.db_name, self.shards):
+            db.initialize_db(shard_name)
+            service = self.backend()
+            setattr(service, "db_name", shard_name)
+            for option, value in self.shard_options.items():
+                setattr(service, option, value)
+            services.append(service)
+
+        return services
+
+    @functools.cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        """Threads fanning multi-slug calls out to the shards."""
+        return ThreadPoolExecutor(self.shards, thread_name_prefix="shard")
+
+    def shard(self, slug: str) -> RecordService:
+        """Get the service of the shard holding slug."""
+        return self.services[shard_of(slug, self.shards)]
+
+    def get_record(self, slug: str, **kwargs: Any) -> "Record":
+        """Get record from its shard."""
+        return self.shard(slug).get_record(slug, **kwargs)
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record as stored from its shard."""
+        return self.shard(slug).get_record_stored(slug, **kwargs)
+
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get version and timestamp of record from its shard."""
+        return self.shard(slug).get_record_stamp(slug, **kwargs)
+
+    def create_record(self, record: "Record", **kwargs: Any) -> None:
+        """Create record in its shard."""
+        self.shard(record.slug).create_record(record, **kwargs)
+
+    def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Update record in its shard."""
+        return self.shard(slug).update_record(slug, data, **kwargs)
+
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Upsert record in its shard."""
+        return self.shard(slug).upsert_record(slug, data, **kwargs)
+
+    def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
+        """Get versions from the shard of slug."""
+        return self.shard(slug).get_versions(slug, **kwargs)
+
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get a page of versions from the shard of slug."""
+        return self.shard(slug).get_versions_page(slug, after, limit)
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream history from the shard of slug."""
+        return self.shard(slug).iter_history(slug)
+
+    def diff_versions(
+        self, slug: str, old: int | str, new: int | str = "latest"
+    ) -> dict[str, Any]:
+        """Diff versions of record in its shard."""
+        return self.shard(slug).diff_versions(slug, old, new)
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get record as of timestamp from its shard."""
+        return self.shard(slug).get_record_as_of(slug, timestamp)
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream records as of timestamp from one shard after another."""
+        return itertools.chain.from_iterable(
+            service.iter_records_as_of(timestamp) for service in self.services
+        )
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        after: str | None = None,
+        limit: int = 100,
+        timestamp: datetime | None = None,
+    ) -> SearchResult:
+        """Search all shards in parallel and merge their pages by slug."""
+        futures = [
+            self.executor.submit(
+                contextvars.copy_context().run,
+                service.search_records,
+                where,
+                after,
+                limit,
+                timestamp,
+            )
+            for service in self.services
+        ]
+        results = [future.result() for future in futures]
+        # shards with more matches have none below their last slug left, so the
+        # page must end at the lowest of those
+        ends = [result.next_after for result in results if result.next_after]
+        end = min(ends) if ends else None
+        found = sorted(
+            (
+                record
+                for result in results
+                for record in result.records
+                if end is None or record.slug <= end
+            ),
+            key=lambda record: record.slug,
+        )
+        more = len(found) > limit or end is not None
+        found = found[:limit]
+
+        return SearchResult(
+            found,
+            found[-1].slug if more else None,
+            sorted({index for result in results for index in result.indexes}),
+            any(result.scanned for result in results),
+        )
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get records from all shards in parallel, missing slugs map to None."""
+        records: dict[str, Record | None] = dict.fromkeys(slugs)
+        for found in self._fan_out(
+            list(records),
+            lambda service, shard_slugs: service.get_records_many(
+                shard_slugs, **kwargs
+            ),
+        ):
+            records.update(found)
+
+        return records
+
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Write records to all shards in parallel, one transaction per shard.
+
+        Shards commit independently, so a failing shard does not roll back others.
+        """
+        by_shard: dict[int, list[int]] = {}
+        for i, (slug, _) in enumerate(records):
+            by_shard.setdefault(shard_of(slug, self.shards), []).append(i)
+
+        futures = {
+            shard: self.executor.submit(
+                contextvars.copy_context().run,
+                self.services[shard].bulk_upsert,
+                [records[i] for i in indexes],
+                **kwargs,
+            )
+            for shard, indexes in by_shard.items()
+        }
+        results: list[dict[str, Any]] = [{} for _ in records]
+        for shard, future in futures.items():
+            for i, result in zip(by_shard[shard], future.result()):
+                results[i] = result
+
+        return results
+
+    def close(self) -> None:
+        """Stop the fan-out threads."""
+        if "executor" in self.__dict__:
+            self.executor.shutdown()
+
+    def _fan_out(
+        self, slugs: list[str], call: Callable[[RecordService, list[str]], T]
+    ) -> list[T]:
+        by_shard: dict[int, list[str]] = {}
+        for slug in slugs:
+            by_shard.setdefault(shard_of(slug, self.shards), []).append(slug)
+
+        if len(by_shard) == 1:
+            [(shard, shard_slugs)] = by_shard.items()
+            return [call(self.services[shard], shard_slugs)]
+
+        futures = [
+            self.executor.submit(
+                contextvars.copy_context().run, call, self.services[shard], shard_slugs
+            )
+            for shard, shard_slugs in by_shard.items()
+        ]
+        return [future.result() for future in futures]
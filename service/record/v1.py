@@ -1,62 +1,255 @@
-import sqlite3
 from datetime import datetime
 from typing import Any
 
-import jsonpickle
-
-from db import dbname
+from db import chunks, dbname, placeholders
 from entity.record import Record
-from service.record.base import RecordDoesNotExistError, RecordService
+from pool import ConnectionPool, get_pool
+from service.record.base import RecordDoesNotExistError, RecordService, StoredRecord
+from service.record.codec import Codec, JsonCodec
+from writer import WriteQueue, get_write_queue, queued
 
 
 class SqliteRecordService(RecordService):
     """Record service impplementation for Sqlite3."""
 
     db_name: str = dbname
+    codec: Codec = JsonCodec()
+    # run writes on one writer thread that group-commits them
+    single_writer: bool = False
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """Connection pool for the configured database file."""
+        return get_pool(self.db_name)
+
+    @property
+    def write_queue(self) -> WriteQueue | None:
+        """Shared single-writer queue for the database file, if enabled."""
+        return get_write_queue(self.db_name) if self.single_writer else None
 
     def get_record(self, slug: str, **kwargs: Any) -> "Record":
-        """Get record by slug or raises error if record does not exist."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        """Get record by slug or raises error if record does not exist.
+
+        With fields, only those keys of data are returned, extracted by SQLite when
+        the codec allows it.
+        """
+        fields = kwargs.get("fields")
+        if fields is not None:
+            projected = self._get_projected(slug, fields)
+            if projected is not None:
+                return projected
+
+            return self.get_record(slug).project(fields)
+
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             record = cursor.execute(
                 "SELECT * FROM records WHERE slug = ?", (slug,)
             ).fetchone()
 
         try:
-            data = jsonpickle.decode(record["data"])
-            record_obj = Record(record["slug"], data)
+            data = self.codec.load(record["data"], record["legacy"])
+            record_obj = Record(
+                record["slug"],
+                data,
+                timestamp=record["updated_at"] or record["created_at"],
+            )
         except TypeError as e:
             raise RecordDoesNotExistError from e
 
         return record_obj
 
+    def _get_projected(self, slug: str, fields: list[str]) -> "Record | None":
+        """Get record with fields extracted by SQLite, None if the data needs decoding.
+
+        Compressed and legacy rows are left to the codec.
+        """
+        expression = self.codec.fields_sql("data", len(fields))
+        if expression is None:
+            return None
+
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f"""SELECT slug, created_at, updated_at,
+                CASE WHEN legacy = 0 THEN {expression} END AS fields
+                FROM records WHERE slug = ?""",
+                (*fields, slug),
+            ).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+        if row["fields"] is None:
+            return None
+
+        return Record(
+            row["slug"],
+            self.codec.decode(row["fields"]),
+            timestamp=row["updated_at"] or row["created_at"],
+        )
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record with its data column as stored, None for legacy rows."""
+        with self.pool.connection() as conn:
+            query = """SELECT slug, data, legacy, created_at, updated_at FROM records
+                    WHERE slug = ?"""
+            row = conn.execute(query, (slug,)).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+        if row["legacy"]:
+            return None
+
+        return StoredRecord(
+            row["slug"], None, row["updated_at"] or row["created_at"], row["data"]
+        )
+
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get when record was last written without reading its data."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT created_at, updated_at FROM records WHERE slug = ?", (slug,)
+            ).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+
+        return None, row["updated_at"] or row["created_at"]
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get records for many slugs, missing slugs map to None."""
+        records: dict[str, Record | None] = dict.fromkeys(slugs)
+        unique_slugs = list(records)
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for chunk in chunks(unique_slugs):
+                query = f"""SELECT slug, data, legacy, created_at, updated_at
+                        FROM records WHERE slug IN ({placeholders(len(chunk))})"""
+                for row in cursor.execute(query, chunk):
+                    records[row["slug"]] = Record(
+                        row["slug"],
+                        self.codec.load(row["data"], row["legacy"]),
+                        timestamp=row["updated_at"] or row["created_at"],
+                    )
+
+        return records
+
+    @queued
     def create_record(self, record: "Record", **kwargs: Any) -> None:
         """Create record with data, key is ignored and auto-incremented."""
-        pickled_data = jsonpickle.encode(record.data)
+        encoded_data = self.codec.dump(record.data)
 
-        with sqlite3.connect(self.db_name) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO records (slug, data, created_at) VALUES (?, ?, ?)",
-                (record.slug, pickled_data, record.timestamp),
+                (record.slug, encoded_data, record.timestamp),
             )
 
+    @queued
     def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
         """Update record with changes to the data dict."""
-        record = self.get_record(slug)
-        record.update_data(data)
-        pickled_data = jsonpickle.encode(record.data)
+        with self.pool.connection(immediate=True) as conn:
+            record = self.get_record(slug)
+            record.update_data(data)
+            encoded_data = self.codec.dump(record.data)
 
-        with sqlite3.connect(self.db_name) as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE records SET data = ?, updated_at = ? WHERE slug = ?",
+                """UPDATE records SET data = ?, legacy = 0, updated_at = ?
+                WHERE slug = ?""",
                 (
-                    pickled_data,
+                    encoded_data,
                     datetime.now(),
                     slug,
                 ),
             )
 
         return record
+
+    @queued
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Create or update record with one statement in a write transaction."""
+        with self.pool.connection(immediate=True) as conn:
+            cursor = conn.cursor()
+            row = cursor.execute(
+                "SELECT data, legacy FROM records WHERE slug = ?", (slug,)
+            ).fetchone()
+
+            if row is None:
+                record = Record(slug, {k: v for k, v in data.items() if v})
+            else:
+                record = Record(slug, self.codec.load(row["data"], row["legacy"]))
+                record.update_data(data)
+
+            cursor.execute(
+                """INSERT INTO records (slug, data, created_at) VALUES (?, ?, ?)
+                ON CONFLICT(slug) DO UPDATE
+                SET data = excluded.data, legacy = 0,
+                updated_at = excluded.created_at""",
+                (slug, self.codec.dump(record.data), record.timestamp),
+            )
+
+        return record
+
+    @queued
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many records in a single transaction.
+
+        Records left as they are by their changes are not written.
+        """
+        slugs = list(dict.fromkeys(slug for slug, _ in records))
+        now = datetime.now()
+
+        with self.pool.connection(immediate=True) as conn:
+            cursor = conn.cursor()
+            current: dict[str, Record] = {}
+            for chunk in chunks(slugs):
+                query = f"""SELECT slug, data, legacy FROM records
+                        WHERE slug IN ({placeholders(len(chunk))})"""
+                for row in cursor.execute(query, chunk):
+                    current[row["slug"]] = Record(
+                        row["slug"], self.codec.load(row["data"], row["legacy"])
+                    )
+
+            stored = {slug: dict(record.data) for slug, record in current.items()}
+            created: set[str] = set()
+            statuses = []
+            for slug, data in records:
+                if slug in current:
+                    before = dict(current[slug].data)
+                    current[slug].update_data(data)
+                    changed = current[slug].data != before
+                    statuses.append("updated" if changed else "unchanged")
+                else:
+                    revised_data = {k: v for k, v in data.items() if v}
+                    current[slug] = Record(slug, revised_data, timestamp=now)
+                    created.add(slug)
+                    statuses.append("created")
+
+            cursor.executemany(
+                "INSERT INTO records (slug, data, created_at) VALUES (?, ?, ?)",
+                [
+                    (slug, self.codec.dump(current[slug].data), now)
+                    for slug in slugs
+                    if slug in created
+                ],
+            )
+            cursor.executemany(
+                """UPDATE records SET data = ?, legacy = 0, updated_at = ?
+                WHERE slug = ?""",
+                [
+                    (self.codec.dump(current[slug].data), now, slug)
+                    for slug in slugs
+                    if slug in stored and current[slug].data != stored[slug]
+                ],
+            )
+
+        return [
+            {"slug": slug, "status": status, "version": None}
+            for (slug, _), status in zip(records, statuses)
+        ]
@@ -1,33 +1,168 @@
 import sqlite3
+from collections.abc import Iterator
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import jsonpickle
+from db import chunks, dbname, placeholders
+from entity.record import Record, changes_between, diff_data
+from pool import ConnectionPool, get_pool
+from service.record.base import (
+    Change,
+    RecordAlreadyExistsError,
+    RecordDoesNotExistError,
+    RecordService,
+    StoredRecord,
+)
+from service.record.codec import Codec, CompressedCodec, JsonCodec
+from service.record.search import (
+    INDEX_PREFIX,
+    SearchResult,
+    index_name,
+    matches,
+    page,
+    path_sql,
+    read_plan,
+)
+from writer import WriteQueue, get_write_queue, queued
 
-from db import dbname
-from entity.record import Record
-from service.record.base import RecordDoesNotExistError, RecordService
+if TYPE_CHECKING:
+    from sqlite3 import Cursor, Row
 
 
 class RecordRevisionHistoryService(RecordService):
     """Stores records in database with versioning."""
 
     db_name: str = dbname
+    codec: Codec = JsonCodec()
+    # run writes on one writer thread that group-commits them
+    single_writer: bool = False
+    # "snapshot" stores every revision in full, "delta" stores changes against the
+    # last full snapshot and takes a new one every keyframe_interval versions
+    storage_mode: str = "snapshot"
+    keyframe_interval: int = 10
+
+    insert_change_query = (
+        "INSERT INTO changes (slug, version, timestamp) VALUES (?, ?, ?)"
+    )
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """Connection pool for the configured database file."""
+        return get_pool(self.db_name)
+
+    @property
+    def write_queue(self) -> WriteQueue | None:
+        """Shared single-writer queue for the database file, if enabled."""
+        return get_write_queue(self.db_name) if self.single_writer else None
 
     def get_record(self, slug: str, **kwargs: Any) -> "Record":
-        """Get record by slug + version, defaults to latest."""
+        """Get record by slug + version, defaults to latest, with only fields if given."""
         version = kwargs.get("version", "latest")
+        fields = kwargs.get("fields")
+        if fields is not None:
+            projected = self._get_projected(slug, version, fields)
+            if projected is not None:
+                return projected
+
         if version == "latest":
             record = self._get_latest(slug)
         else:
             record = self._get_version(slug, version)
 
-        return record
+        return record if fields is None else record.project(fields)
+
+    def _get_projected(
+        self, slug: str, version: str, fields: list[str]
+    ) -> "Record | None":
+        """Get record with fields extracted by SQLite, None if the data needs decoding.
+
+        Compressed, delta and legacy rows are left to the codec.
+        """
+        expression = self.codec.fields_sql("data", len(fields))
+        if expression is None:
+            return None
+
+        with self.pool.connection() as conn:
+            if version == "latest":
+                query = f"""SELECT slug, version, created_at,
+                        CASE WHEN legacy = 0 THEN {expression} END AS fields
+                        FROM versioned_records WHERE slug = ?"""
+                row = conn.execute(query, (*fields, slug)).fetchone()
+            else:
+                query = f"""SELECT slug, version, created_at,
+                        CASE WHEN legacy = 0 THEN {expression} END AS fields
+                        FROM versioned_records WHERE slug = ? AND version = ?
+                        UNION ALL
+                        SELECT records_slug, version, timestamp,
+                        CASE WHEN base_id IS NULL AND legacy = 0 THEN {expression} END
+                        FROM history WHERE records_slug = ? AND version = ?
+                        LIMIT 1"""
+                params = (*fields, slug, version, *fields, slug, version)
+                row = conn.execute(query, params).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+        if row["fields"] is None:
+            return None
+
+        return Record(
+            row["slug"],
+            self.codec.decode(row["fields"]),
+            version=row["version"],
+            timestamp=row["created_at"],
+        )
+
+    def get_record_stamp(self, slug: str, **kwargs: Any) -> tuple[int | None, Any]:
+        """Get version and write time of record by slug + version without its data."""
+        version = kwargs.get("version", "latest")
+        with self.pool.connection() as conn:
+            if version == "latest":
+                query = (
+                    "SELECT version, created_at FROM versioned_records WHERE slug = ?"
+                )
+                row = conn.execute(query, (slug,)).fetchone()
+            else:
+                query = """SELECT version, created_at FROM versioned_records
+                        WHERE slug = ? AND version = ?
+                        UNION ALL
+                        SELECT version, timestamp FROM history
+                        WHERE records_slug = ? AND version = ?
+                        LIMIT 1"""
+                row = conn.execute(query, (slug, version, slug, version)).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+
+        return row["version"], row["created_at"]
+
+    def get_record_stored(self, slug: str, **kwargs: Any) -> StoredRecord | None:
+        """Get record by slug + version as stored, None for delta and legacy rows."""
+        version = kwargs.get("version", "latest")
+        with self.pool.connection() as conn:
+            if version == "latest":
+                query = """SELECT slug, version, created_at, data, legacy,
+                        NULL AS base_id FROM versioned_records WHERE slug = ?"""
+                row = conn.execute(query, (slug,)).fetchone()
+            else:
+                query = """SELECT slug, version, created_at, data, legacy,
+                        NULL AS base_id
+                        FROM versioned_records WHERE slug = ? AND version = ?
+                        UNION ALL
+                        SELECT records_slug, version, timestamp, data, legacy, base_id
+                        FROM history WHERE records_slug = ? AND version = ?
+                        LIMIT 1"""
+                row = conn.execute(query, (slug, version, slug, version)).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+        if row["base_id"] is not None or row["legacy"]:
+            return None
+
+        return StoredRecord(row["slug"], row["version"], row["created_at"], row["data"])
 
     def _get_latest(self, slug: str) -> "Record":
         """Get record from versioned records table."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             query = "SELECT * FROM versioned_records WHERE slug = ?"
 
@@ -38,15 +173,14 @@ class RecordRevisionHistoryService(RecordService):
 
         return Record(
             record["slug"],
-            jsonpickle.decode(record["data"]),
+            self.codec.load(record["data"], record["legacy"]),
             version=record["version"],
             timestamp=record["created_at"],
         )
 
     def _get_version(self, record_slug: str, version: str) -> "Record":
         """Get record of version from history table."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             record_query = (
                 "SELECT * FROM versioned_records WHERE slug = ? AND version = ?"
@@ -61,7 +195,8 @@ class RecordRevisionHistoryService(RecordService):
             ).fetchone()
 
             if not record:
-                query = """SELECT records_slug as slug, version, timestamp as created_at, data
+                query = """SELECT records_slug as slug, version, timestamp as created_at,
+                        data, legacy, base_id
                         FROM history WHERE records_slug = ? AND version = ?"""
 
                 record = cursor.execute(
@@ -72,100 +207,543 @@ class RecordRevisionHistoryService(RecordService):
                     ),
                 ).fetchone()
 
-        if not record:
-            raise RecordDoesNotExistError
+            if not record:
+                raise RecordDoesNotExistError
 
-        return Record(
-            record["slug"],
-            jsonpickle.decode(record["data"]),
-            version=record["version"],
-            timestamp=record["created_at"],
+            return self._decode_revision(cursor, record)
+
+    def _decode_revision(self, cursor: "Cursor", row: "Row") -> "Record":
+        """Build record from a row, applying delta revisions to their keyframe."""
+        base_id = row["base_id"] if "base_id" in row.keys() else None
+        if base_id is None:
+            data = self.codec.load(row["data"], row["legacy"])
+        else:
+            keyframe = cursor.execute(
+                "SELECT data, legacy FROM history WHERE id = ?", (base_id,)
+            ).fetchone()
+            data = self.codec.load(keyframe["data"], keyframe["legacy"])
+
+        record = Record(
+            row["slug"],
+            data,
+            version=row["version"],
+            timestamp=row["created_at"],
         )
+        if base_id is not None:
+            record.update_data(self.codec.load(row["data"], row["legacy"]))
 
+        return record
+
+    def get_records_many(
+        self, slugs: list[str], **kwargs: Any
+    ) -> dict[str, "Record | None"]:
+        """Get many slugs at one version, defaults to latest, missing map to None."""
+        version = kwargs.get("version", "latest")
+        records: dict[str, Record | None] = dict.fromkeys(slugs)
+        unique_slugs = list(records)
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            for chunk in chunks(unique_slugs):
+                query = f"""SELECT * FROM versioned_records
+                        WHERE slug IN ({placeholders(len(chunk))})"""
+                params: list[Any] = list(chunk)
+                if version != "latest":
+                    query += " AND version = ?"
+                    params.append(version)
+
+                for row in cursor.execute(query, params).fetchall():
+                    records[row["slug"]] = self._decode_revision(cursor, row)
+
+            if version == "latest":
+                return records
+
+            missing = [slug for slug in unique_slugs if records[slug] is None]
+
+            for chunk in chunks(missing):
+                query = f"""SELECT records_slug as slug, version, timestamp as created_at,
+                        data, legacy, base_id
+                        FROM history
+                        WHERE records_slug IN ({placeholders(len(chunk))}) AND version = ?"""
+                for row in cursor.execute(query, [*chunk, version]).fetchall():
+                    records[row["slug"]] = self._decode_revision(cursor, row)
+
+        return records
+
+    @queued
     def create_record(self, record: "Record", **kwargs: Any) -> None:
         """Create new record becomes latest with new version."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
             query = """INSERT INTO versioned_records
                     (slug, data, version, created_at)
                     VALUES (?, ? , ?, ?)
                     """
 
-            cursor.execute(
-                query,
-                (
-                    record.slug,
-                    jsonpickle.encode(record.data),
-                    1,
-                    record.timestamp,
-                ),
-            )
+            try:
+                cursor.execute(
+                    query,
+                    (
+                        record.slug,
+                        self.codec.dump(record.data),
+                        1,
+                        record.timestamp,
+                    ),
+                )
+            except sqlite3.IntegrityError as e:
+                raise RecordAlreadyExistsError from e
+            cursor.execute(self.insert_change_query, (record.slug, 1, record.timestamp))
 
+    @queued
     def update_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
-        """Update record creates new record if version latest, else add new revision."""
-        record = self.get_record(slug, **kwargs)
+        """Add the next version of record made from its latest, unless data is as is."""
+        with self.pool.connection(immediate=True) as conn:
+            latest = self._get_latest(slug)
+            record = latest.with_changes(data)
 
-        if record.data == data:
-            return record
+            if record.data == latest.data:
+                return latest
 
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
 
             # insert old_record into revision
             insert_revision_query = """INSERT INTO history
-                        (records_slug, version, timestamp, data)
-                        VALUES (?, ?, ?, ?)
+                        (records_slug, version, timestamp, data, base_id)
+                        VALUES (?, ?, ?, ?, ?)
                         """
-            cursor.execute(
-                insert_revision_query,
-                (
-                    record.slug,
-                    record.version,
-                    record.timestamp,
-                    jsonpickle.encode(record.data),
-                ),
-            )
+            cursor.execute(insert_revision_query, self._revision_row(cursor, latest))
 
-            record.update_data(data)
-            # update record
-            if record.version:
-                record.version += 1
-
-            record.timestamp = datetime.now()
             update_record_query = """UPDATE versioned_records
-                                SET data = ?, version = ?, created_at = ?
+                                SET data = ?, legacy = 0, version = ?, created_at = ?
                                 WHERE slug = ?
                                 """
             cursor.execute(
                 update_record_query,
                 (
-                    jsonpickle.encode(record.data),
+                    self.codec.dump(record.data),
                     record.version,
                     record.timestamp,
                     record.slug,
                 ),
             )
+            cursor.execute(
+                self.insert_change_query,
+                (record.slug, record.version, record.timestamp),
+            )
 
         return record
 
+    @queued
+    def upsert_record(self, slug: str, data: dict[str, Any], **kwargs: Any) -> "Record":
+        """Create record or read, bump and write its version in one write transaction."""
+        with self.pool.connection(immediate=True):
+            try:
+                return self.update_record(slug, data, **kwargs)
+            except RecordDoesNotExistError:
+                record = Record(slug, {k: v for k, v in data.items() if v}, version=1)
+                self.create_record(record)
+                return record
+
+    @queued
+    def bulk_upsert(
+        self, records: list[tuple[str, dict[str, Any]]], **kwargs: Any
+    ) -> list[dict[str, Any]]:
+        """Create or update many records in one transaction, one revision per slug."""
+        slugs = list(dict.fromkeys(slug for slug, _ in records))
+        now = datetime.now()
+
+        with self.pool.connection(immediate=True) as conn:
+            cursor = conn.cursor()
+            latest: dict[str, Record] = {}
+            for chunk in chunks(slugs):
+                query = f"""SELECT * FROM versioned_records
+                        WHERE slug IN ({placeholders(len(chunk))})"""
+                for row in cursor.execute(query, chunk):
+                    latest[row["slug"]] = Record(
+                        row["slug"],
+                        self.codec.load(row["data"], row["legacy"]),
+                        version=row["version"],
+                        timestamp=row["created_at"],
+                    )
+
+            current = {
+                slug: Record(slug, dict(record.data), version=record.version)
+                for slug, record in latest.items()
+            }
+            statuses = []
+            for slug, data in records:
+                record = current.get(slug)
+                if record is None:
+                    revised_data = {k: v for k, v in data.items() if v}
+                    current[slug] = Record(slug, revised_data, version=1)
+                    statuses.append("created")
+                else:
+                    before = dict(record.data)
+                    record.update_data(data)
+                    statuses.append("unchanged" if record.data == before else "updated")
+
+            changed = [
+                slug
+                for slug in slugs
+                if slug in latest and current[slug].data != latest[slug].data
+            ]
+            for slug in changed:
+                current[slug].version = (latest[slug].version or 0) + 1
+
+            cursor.executemany(
+                """INSERT INTO versioned_records (slug, data, version, created_at)
+                VALUES (?, ?, ?, ?)""",
+                [
+                    (slug, self.codec.dump(current[slug].data), 1, now)
+                    for slug in slugs
+                    if slug not in latest
+                ],
+            )
+            cursor.executemany(
+                """INSERT INTO history (records_slug, version, timestamp, data, base_id)
+                VALUES (?, ?, ?, ?, ?)""",
+                [self._revision_row(cursor, latest[slug]) for slug in changed],
+            )
+            cursor.executemany(
+                """UPDATE versioned_records
+                SET data = ?, legacy = 0, version = ?, created_at = ?
+                WHERE slug = ?""",
+                [
+                    (
+                        self.codec.dump(current[slug].data),
+                        current[slug].version,
+                        now,
+                        slug,
+                    )
+                    for slug in changed
+                ],
+            )
+            cursor.executemany(
+                self.insert_change_query,
+                [
+                    (slug, current[slug].version, now)
+                    for slug in slugs
+                    if slug not in latest or slug in changed
+                ],
+            )
+
+        return [
+            {"slug": slug, "status": status, "version": current[slug].version}
+            for (slug, _), status in zip(records, statuses)
+        ]
+
+    def _revision_row(self, cursor: "Cursor", record: "Record") -> tuple[Any, ...]:
+        """History row for record, a delta against its keyframe in delta mode."""
+        if self.storage_mode == "delta":
+            keyframe_query = """SELECT id, version, data, legacy FROM history
+                            WHERE records_slug = ? AND version < ? AND base_id IS NULL
+                            ORDER BY version DESC LIMIT 1"""
+            keyframe = cursor.execute(
+                keyframe_query, (record.slug, record.version)
+            ).fetchone()
+
+            if (
+                keyframe
+                and record.version - keyframe["version"] < self.keyframe_interval
+            ):
+                data = self.codec.load(keyframe["data"], keyframe["legacy"])
+                changes = diff_data(data, record.data)
+                if changes is not None:
+                    return (
+                        record.slug,
+                        record.version,
+                        record.timestamp,
+                        self.codec.dump(changes),
+                        keyframe["id"],
+                    )
+
+        return (
+            record.slug,
+            record.version,
+            record.timestamp,
+            self.codec.dump(record.data),
+            None,
+        )
+
     def get_versions(self, slug: str, **kwargs: Any) -> list[int]:
         """Get version numbers for slug."""
-        with sqlite3.connect(self.db_name) as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.connection() as conn:
             cursor = conn.cursor()
 
             current_version_query = """SELECT version FROM versioned_records
                                     WHERE slug = ?"""
             historical_versions_query = """SELECT version FROM history
-                                        WHERE records_slug = ?"""
+                                        WHERE records_slug = ? ORDER BY version"""
 
             current_version = cursor.execute(current_version_query, (slug,)).fetchone()
             historical_versions = cursor.execute(
                 historical_versions_query, (slug,)
             ).fetchall()
 
+        if not current_version:
+            raise RecordDoesNotExistError
+
         historical_versions.append(current_version)
 
         return [row["version"] for row in historical_versions]
+
+    def get_versions_page(
+        self, slug: str, after: int | None = None, limit: int = 100
+    ) -> tuple[list[int], int | None]:
+        """Get up to limit versions after a version, and the cursor for the next page."""
+        with self.pool.connection() as conn:
+            query = """SELECT version FROM history WHERE records_slug = ? AND version > ?
+                    UNION
+                    SELECT version FROM versioned_records WHERE slug = ? AND version > ?
+                    ORDER BY version LIMIT ?"""
+            after_version = after if after is not None else 0
+            rows = conn.execute(
+                query, (slug, after_version, slug, after_version, limit + 1)
+            ).fetchall()
+
+            if not rows and after is None:
+                raise RecordDoesNotExistError
+
+        versions = [row["version"] for row in rows[:limit]]
+        next_after = versions[-1] if len(rows) > limit else None
+
+        return versions, next_after
+
+    def get_changes(self, after: int = 0, limit: int = 100) -> list[Change]:
+        """Get up to limit changes with a seq above after, oldest first."""
+        with self.pool.connection() as conn:
+            query = """SELECT seq, slug, version, timestamp FROM changes
+                    WHERE seq > ? ORDER BY seq LIMIT ?"""
+            rows = conn.execute(query, (after, limit)).fetchall()
+
+        return [Change(*row) for row in rows]
+
+    def diff_versions(
+        self, slug: str, old: int | str, new: int | str = "latest"
+    ) -> dict[str, Any]:
+        """Get the changes dict turning version old of record into version new.
+
+        Revisions on the same keyframe differ at most in the keys their deltas
+        touch, so only their deltas and the keyframe values of those keys are read.
+        Other pairs of versions are read in full.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            old_row = self._delta_row(cursor, slug, old)
+            new_row = self._delta_row(cursor, slug, new)
+            keyframe_id = old_row["keyframe_id"]
+            if keyframe_id is None or keyframe_id != new_row["keyframe_id"]:
+                return changes_between(
+                    self.get_record(slug, version=old).data,
+                    self.get_record(slug, version=new).data,
+                )
+
+            deltas = [
+                {} if row["delta"] is None else self.codec.load(row["delta"])
+                for row in (old_row, new_row)
+            ]
+            keys = list(dict.fromkeys([*deltas[0], *deltas[1]]))
+            if not keys:
+                return {}
+
+            base = self._keyframe_fields(cursor, keyframe_id, keys)
+
+        before, after = Record(slug, dict(base)), Record(slug, dict(base))
+        before.update_data(deltas[0])
+        after.update_data(deltas[1])
+
+        return changes_between(before.data, after.data)
+
+    @staticmethod
+    def _delta_row(cursor: "Cursor", slug: str, version: int | str) -> "Row":
+        """Get the keyframe a version is stored on and its delta, without its data.
+
+        The latest version is stored in full outside history and has no keyframe.
+        """
+        if version == "latest":
+            query = """SELECT NULL AS keyframe_id, NULL AS delta
+                    FROM versioned_records WHERE slug = ?"""
+            row = cursor.execute(query, (slug,)).fetchone()
+        else:
+            query = """SELECT NULL AS keyframe_id, NULL AS delta
+                    FROM versioned_records WHERE slug = ? AND version = ?
+                    UNION ALL
+                    SELECT coalesce(base_id, id), CASE WHEN base_id IS NOT NULL
+                    THEN data END
+                    FROM history WHERE records_slug = ? AND version = ?
+                    LIMIT 1"""
+            row = cursor.execute(query, (slug, version, slug, version)).fetchone()
+
+        if row is None:
+            raise RecordDoesNotExistError
+
+        return row
+
+    def _keyframe_fields(
+        self, cursor: "Cursor", keyframe_id: int, keys: list[str]
+    ) -> dict[str, Any]:
+        """Get the values of keys in a keyframe, extracted by SQLite if possible."""
+        expression = self.codec.fields_sql("data", len(keys))
+        if expression is not None:
+            row = cursor.execute(
+                f"""SELECT CASE WHEN legacy = 0 THEN {expression} END AS fields
+                FROM history WHERE id = ?""",
+                (*keys, keyframe_id),
+            ).fetchone()
+            if row["fields"] is not None:
+                return dict(self.codec.decode(row["fields"]))
+
+        row = cursor.execute(
+            "SELECT data, legacy FROM history WHERE id = ?", (keyframe_id,)
+        ).fetchone()
+        data = self.codec.load(row["data"], row["legacy"])
+
+        return {key: data[key] for key in keys if key in data}
+
+    def search_records(
+        self,
+        where: dict[str, Any],
+        after: str | None = None,
+        limit: int = 100,
+        timestamp: datetime | None = None,
+    ) -> SearchResult:
+        """Search latest versions in SQL, using the indexes of create_indexes.
+
+        Compressed rows and other points in time are decoded and matched one by one.
+        """
+        if timestamp is not None:
+            return super().search_records(where, after, limit, timestamp)
+
+        conditions = [f"{path_sql(path)} = ?" for path in where]
+        params: list[Any] = list(where.values())
+        if after is not None:
+            conditions.append("slug > ?")
+            params.append(after)
+        query = f"""SELECT * FROM versioned_records WHERE {" AND ".join(conditions) or 1}
+                ORDER BY slug LIMIT ?"""
+        params.append(limit + 1)
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            plan = cursor.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+            indexes, scanned = read_plan(row["detail"] for row in plan)
+            found = [
+                self._decode_revision(cursor, row)
+                for row in cursor.execute(query, params).fetchall()
+            ]
+
+            if isinstance(self.codec, CompressedCodec):
+                # SQLite cannot read compressed rows, so they have no indexed values
+                scanned = True
+                blob_query = """SELECT * FROM versioned_records
+                        WHERE typeof(data) = 'blob' AND slug > ? ORDER BY slug"""
+                blob_matches = 0
+                for row in cursor.execute(blob_query, (after or "",)).fetchall():
+                    record = self._decode_revision(cursor, row)
+                    if matches(record.data, where):
+                        found.append(record)
+                        blob_matches += 1
+                        if blob_matches > limit:
+                            break
+                found.sort(key=lambda record: record.slug)
+
+        return page(found, limit, indexes, scanned)
+
+    def create_indexes(self, paths: list[str]) -> None:
+        """Index the latest data at each of paths for search_records, drop the rest.
+
+        Building an index reads every record once, writes keep it current after.
+        """
+        wanted = {index_name(path): path for path in paths}
+        with self.pool.connection() as conn:
+            query = """SELECT name FROM sqlite_master
+                    WHERE type = 'index' AND tbl_name = 'versioned_records'
+                    AND name GLOB ?"""
+            existing = {
+                row["name"] for row in conn.execute(query, (f"{INDEX_PREFIX}*",))
+            }
+            for name in existing - wanted.keys():
+                conn.execute(f"DROP INDEX {name}")
+            for name, path in wanted.items():
+                if name not in existing:
+                    conn.execute(
+                        f"CREATE INDEX {name} ON versioned_records ({path_sql(path)})"
+                    )
+
+    def iter_history(self, slug: str) -> Iterator["Record"]:
+        """Stream every version of record in order, ending with the latest."""
+        with self.pool.connection(shared=False) as conn:
+            cursor = conn.cursor()
+            query = """SELECT id, records_slug as slug, version, timestamp as created_at,
+                    data, legacy, base_id
+                    FROM history WHERE records_slug = ? ORDER BY version"""
+
+            # deltas follow their keyframe, so keep the last one instead of looking
+            # it up again for every delta
+            keyframe_id, keyframe = None, {}
+            for row in conn.execute(query, (slug,)):
+                if row["base_id"] is None:
+                    keyframe_id = row["id"]
+                    keyframe = self.codec.load(row["data"], row["legacy"])
+                elif row["base_id"] != keyframe_id:
+                    yield self._decode_revision(cursor, row)
+                    continue
+
+                record = Record(
+                    row["slug"],
+                    dict(keyframe),
+                    version=row["version"],
+                    timestamp=row["created_at"],
+                )
+                if row["base_id"] is not None:
+                    record.update_data(self.codec.load(row["data"], row["legacy"]))
+                yield record
+
+            latest = cursor.execute(
+                "SELECT * FROM versioned_records WHERE slug = ?", (slug,)
+            ).fetchone()
+            if latest:
+                yield self._decode_revision(cursor, latest)
+
+    def get_record_as_of(self, slug: str, timestamp: datetime) -> "Record":
+        """Get the version of record that was latest at timestamp."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            latest = cursor.execute(
+                "SELECT * FROM versioned_records WHERE slug = ?", (slug,)
+            ).fetchone()
+            if not latest:
+                raise RecordDoesNotExistError
+            if latest["created_at"] <= str(timestamp):
+                return self._decode_revision(cursor, latest)
+
+            revision = self._revision_as_of(cursor, slug, timestamp)
+            if not revision:
+                raise RecordDoesNotExistError
+
+            return self._decode_revision(cursor, revision)
+
+    def iter_records_as_of(self, timestamp: datetime) -> Iterator["Record"]:
+        """Stream the latest version of every record as of timestamp."""
+        with self.pool.connection(shared=False) as conn:
+            cursor = conn.cursor()
+            current_query = "SELECT * FROM versioned_records WHERE created_at <= ?"
+            for row in conn.execute(current_query, (timestamp,)):
+                yield self._decode_revision(cursor, row)
+
+            newer_query = "SELECT slug FROM versioned_records WHERE created_at > ?"
+            for row in conn.execute(newer_query, (timestamp,)):
+                revision = self._revision_as_of(cursor, row["slug"], timestamp)
+                if revision:
+                    yield self._decode_revision(cursor, revision)
+
+    @staticmethod
+    def _revision_as_of(
+        cursor: "Cursor", slug: str, timestamp: datetime
+    ) -> "Row | None":
+        query = """SELECT records_slug as slug, version, timestamp as created_at,
+                data, legacy, base_id
+                FROM history WHERE records_slug = ? AND timestamp <= ?
+                ORDER BY timestamp DESC, version DESC LIMIT 1"""
+
+        return cursor.execute(query, (slug, timestamp)).fetchone()
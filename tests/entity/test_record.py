@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from entity.record import Record, changes_between
+
+
+def test_with_changes_leaves_record_unchanged() -> None:
+    nested = {"city": "Oslo"}
+    record = Record("1", {"name": "Anna", "address": nested, "age": "30"}, version=2)
+
+    revised = record.with_changes({"name": "Bo", "age": None})
+
+    assert record.data == {"name": "Anna", "address": nested, "age": "30"}
+    assert record.version == 2
+    assert revised.data == {"name": "Bo", "address": nested}
+    assert revised.data["address"] is nested
+    assert revised.version == 3
+
+
+def test_with_changes_keeps_unversioned() -> None:
+    assert Record("1", {}).with_changes({"name": "Anna"}).version is None
+
+
+def test_copy_does_not_share_data() -> None:
+    record = Record("1", {"name": "Anna"}, version=1)
+
+    copy = record.copy()
+    copy.update_data({"name": "Bo"})
+
+    assert record.data == {"name": "Anna"}
+    assert (copy.version, copy.timestamp) == (record.version, record.timestamp)
+
+
+def test_given_timestamp_is_kept() -> None:
+    timestamp = datetime(2023, 3, 1, 12, 30)
+
+    assert Record("1", {}, timestamp=timestamp).timestamp is timestamp
+
+
+def test_record_has_no_instance_dict() -> None:
+    with pytest.raises(AttributeError):
+        Record("1", {}).extra = True  # type: ignore[attr-defined]
+
+
+def test_changes_between() -> None:
+    old = {"name": "Anna", "age": 3, "tags": ["a"]}
+    new = {"name": "Anna", "age": 3.0, "tags": ["a", "b"], "city": "Oslo"}
+
+    changes = changes_between(old, new)
+    record = Record("1", dict(old))
+    record.update_data(changes)
+
+    assert changes == {"age": 3.0, "tags": ["a", "b"], "city": "Oslo"}
+    assert changes_between(new, old) == {"age": 3, "tags": ["a"], "city": None}
+    assert record.data == new
@@ -4,7 +4,8 @@ from typing import Generator
 
 import pytest
 
-from db import records_sql, revisions_sql, versioned_records_sql
+from db import migrate, records_sql, revisions_sql, versioned_records_sql
+from pool import close_pools
 
 
 @pytest.fixture
@@ -16,8 +17,14 @@ def dbname() -> Generator[str, None, None]:
 @pytest.fixture
 def conn(dbname: str) -> Generator[sqlite3.Connection, None, None]:
     """Yield db connection and cleanup db after test run."""
-    yield sqlite3.connect(dbname)
+    conn = sqlite3.connect(dbname)
+    yield conn
+    conn.close()
+    close_pools()
     pathlib.Path.unlink(dbname)
+    # write-ahead log files outlive the db while a closed connection is finalized
+    for suffix in ("-wal", "-shm"):
+        pathlib.Path(dbname + suffix).unlink(missing_ok=True)
 
 
 @pytest.fixture
@@ -29,4 +36,5 @@ def cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
         cursor.execute(records_sql)
         cursor.execute(versioned_records_sql)
         cursor.execute(revisions_sql)
+        migrate(c)
         yield cursor
@@ -0,0 +1,52 @@
+import asyncio
+from typing import TYPE_CHECKING, Generator
+
+import pytest
+
+from entity.record import Record
+from service.record.aio import AsyncRecordService
+from service.record.base import RecordDoesNotExistError
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+
+@pytest.fixture
+def service(dbname: str) -> Generator[AsyncRecordService, None, None]:
+    inner = RecordRevisionHistoryService()
+    inner.db_name = dbname
+    service = AsyncRecordService(inner, max_workers=4)
+    yield service
+    service.close()
+
+
+def test_concurrent_calls(cursor: "Cursor", service: AsyncRecordService) -> None:
+    async def run() -> list[Record]:
+        await service.create_record(Record("1", {"name": "Anna"}))
+        await asyncio.gather(
+            *(service.upsert_record(str(n), {"n": str(n)}) for n in range(2, 20))
+        )
+        return await asyncio.gather(*(service.get_record(str(n)) for n in range(1, 20)))
+
+    records = asyncio.run(run())
+
+    assert [record.slug for record in records] == [str(n) for n in range(1, 20)]
+    assert records[0].data == {"name": "Anna"}
+
+
+def test_errors_are_raised_to_caller(
+    cursor: "Cursor", service: AsyncRecordService
+) -> None:
+    with pytest.raises(RecordDoesNotExistError):
+        asyncio.run(service.get_record("1"))
+
+
+def test_iter_history(cursor: "Cursor", service: AsyncRecordService) -> None:
+    async def run() -> list[int | None]:
+        await service.create_record(Record("1", {"n": "0"}))
+        for n in range(1, 250):
+            await service.update_record("1", {"n": str(n)})
+        return [record.version async for record in service.iter_history("1")]
+
+    assert asyncio.run(run()) == list(range(1, 251))
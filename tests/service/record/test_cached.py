@@ -0,0 +1,158 @@
+from typing import TYPE_CHECKING, Generator
+
+import pytest
+
+from entity.record import Record
+from service.record.base import RecordDoesNotExistError
+from service.record.cached import CachedRecordService
+from service.record.retention import RetentionPolicy, prune_history
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+
+@pytest.fixture
+def service(dbname: str) -> Generator[CachedRecordService, None, None]:
+    inner = RecordRevisionHistoryService()
+    inner.db_name = dbname
+    yield CachedRecordService(inner, max_entries=3)
+
+
+def test_get_record_hits_cache(cursor: "Cursor", service: CachedRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    first = service.get_record("1")
+    cursor.execute("DELETE FROM versioned_records")
+    second = service.get_record("1")
+
+    assert first.data == second.data == {"name": "Anna"}
+    assert service.stats()["hits"] == 1
+    assert service.stats()["misses"] == 1
+
+
+def test_cached_data_is_not_shared(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    service.get_record("1").data["name"] = "changed"
+
+    assert service.get_record("1").data == {"name": "Anna"}
+
+
+def test_fields_are_cut_from_cached_record(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna", "species": "human"}))
+
+    assert service.get_record("1", fields=["name"]).data == {"name": "Anna"}
+    assert service.stats()["entries"] == 0
+
+    service.get_record("1")
+    cursor.execute("DELETE FROM versioned_records")
+
+    assert service.get_record("1", fields=["species"]).data == {"species": "human"}
+
+
+def test_update_invalidates_slug(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.get_record("1")
+    service.get_record("1", version=1)
+
+    service.update_record("1", {"species": "human"})
+
+    assert service.get_record("1").data == {"name": "Anna", "species": "human"}
+    assert service.get_record("1", version=1).data == {"name": "Anna"}
+    assert service.stats()["hits"] == 0
+
+
+def test_misses_are_not_cached(cursor: "Cursor", service: CachedRecordService) -> None:
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record("1")
+
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    assert service.get_record("1").data == {"name": "Anna"}
+
+
+def test_evicts_least_recently_used(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    for slug in "1234":
+        service.create_record(Record(slug, {"name": slug}))
+        service.get_record(slug)
+
+    assert service.stats()["entries"] == 3
+    assert service.stats()["evictions"] == 1
+
+    service.get_record("1")
+
+    assert service.stats()["misses"] == 5
+
+
+def test_evicts_by_size(cursor: "Cursor", service: CachedRecordService) -> None:
+    service.create_record(Record("1", {"name": "x" * 1000}))
+    service.create_record(Record("2", {"name": "y" * 1000}))
+    service.max_bytes = 2000
+
+    service.get_record("1")
+    service.get_record("2")
+
+    assert service.stats()["entries"] == 1
+    assert service.stats()["bytes"] <= 2000
+
+
+def test_get_records_many_loads_only_misses(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.create_record(Record("2", {"name": "Bo"}))
+    service.get_record("1", version=1)
+
+    records = service.get_records_many(["1", "2", "3"], version=1)
+
+    assert records["1"] is not None and records["1"].data == {"name": "Anna"}
+    assert records["2"] is not None and records["2"].data == {"name": "Bo"}
+    assert records["3"] is None
+    assert service.stats()["hits"] == 1
+    assert service.stats()["entries"] == 2
+
+
+def test_latest_sees_writes_of_other_instances(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    other = CachedRecordService(service.service)
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.get_record("1")
+    other.get_record("1")
+
+    service.update_record("1", {"name": "Bo"})
+
+    assert other.get_record("1").data == {"name": "Bo"}
+    many = other.get_records_many(["1"])
+    assert many["1"] is not None and many["1"].data == {"name": "Bo"}
+    assert other.get_record("1").version == 2
+    assert other.stats()["hits"] == 1
+
+
+def test_pruned_versions_are_not_served(
+    cursor: "Cursor", service: CachedRecordService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.create_record(Record("2", {"name": "Bo"}))
+    service.update_record("1", {"name": "Cy"})
+    service.get_record("1", version=1)
+    service.get_record("2", version=1)
+
+    assert isinstance(service.service, RecordRevisionHistoryService)
+    prune_history(service.service, RetentionPolicy(keep_last=1))
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record("1", version=1)
+    many = service.get_records_many(["1", "2"], version=1)
+    assert many["1"] is None
+    assert many["2"] is not None and many["2"].data == {"name": "Bo"}
+    assert service.stats()["hits"] == 1
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+import zlib
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import jsonpickle
+
+from entity.record import Record
+from service.record.codec import (
+    CompressedCodec,
+    JsonCodec,
+    deflate_splice,
+    record_dict,
+)
+from service.record.v1 import SqliteRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+
+def test_json_codec_round_trip() -> None:
+    codec = JsonCodec()
+    data = {"name": "Anna", "tags": ["a", "b"], "nested": {"n": 1}}
+
+    assert codec.decode(codec.encode(data)) == data
+
+
+def test_json_codec_reads_jsonpickle_only_for_legacy_rows() -> None:
+    data = {"when": datetime(2023, 3, 1, 12, 30), "name": "Anna"}
+    tagged = {"x": {"py/reduce": [{"py/function": "os.getpid"}, {"py/tuple": []}]}}
+
+    assert JsonCodec().load(jsonpickle.encode(data), legacy=True) == data
+    assert JsonCodec().load(json.dumps(tagged)) == tagged
+    assert CompressedCodec(threshold=10).load(json.dumps(tagged)) == tagged
+
+
+def test_service_reads_legacy_rows(cursor: "Cursor", dbname: str) -> None:
+    cursor.execute(
+        "INSERT INTO records (slug, data, legacy) VALUES (?, ?, 1)",
+        ("1", jsonpickle.encode({"when": datetime(2023, 3, 1)})),
+    )
+    cursor.connection.commit()
+    service = SqliteRecordService()
+    service.db_name = dbname
+
+    assert service.get_record("1").data == {"when": datetime(2023, 3, 1)}
+
+
+def test_fields_sql() -> None:
+    codec = CompressedCodec(threshold=500)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, data)")
+    data = {"name": "Anna", "admin": False, "tags": ["a"], "n": {"m": 1.5}}
+    numbers = {"big": 2**64, "sum": 0.1 + 0.2, '"q"': 1.5}
+    values = [
+        codec.dump({**data, **numbers}),
+        codec.dump({**data, "text": "lorem ipsum " * 100}),
+    ]
+    conn.executemany("INSERT INTO t (data) VALUES (?)", [(v,) for v in values])
+    fields = ["admin", "n", "tags", "big", "sum", "missing"]
+
+    projected = [
+        row[0]
+        for row in conn.execute(
+            f"SELECT {codec.fields_sql('data', len(fields))} FROM t ORDER BY id",
+            fields,
+        )
+    ]
+
+    assert codec.decode(projected[0]) == {
+        "admin": False,
+        "tags": ["a"],
+        "n": {"m": 1.5},
+        "big": 2**64,
+        "sum": 0.1 + 0.2,
+    }
+    # compressed values are left to the codec
+    assert projected[1:] == [None]
+    # so are keys the JSON path syntax cannot address
+    assert conn.execute(
+        f"SELECT {codec.fields_sql('data', 1)} FROM t WHERE id = 1", ['"q"']
+    ).fetchone() == (None,)
+
+
+def test_record_dict() -> None:
+    record = Record("1", {"name": "Anna"}, version=2, timestamp=datetime(2023, 3, 1))
+
+    assert record_dict(record) == {
+        "slug": "1",
+        "version": 2,
+        "timestamp": "2023-03-01 00:00:00",
+        "data": {"name": "Anna"},
+    }
+
+
+def test_compressed_codec_threshold() -> None:
+    codec = CompressedCodec(threshold=100)
+    small = {"name": "Anna"}
+    large = {"text": "lorem ipsum " * 100}
+
+    assert isinstance(codec.dump(small), str)
+    assert isinstance(codec.dump(large), bytes)
+    assert len(codec.dump(large)) < len(codec.encode(large))
+    assert codec.load(codec.dump(small)) == small
+    assert codec.load(codec.dump(large)) == large
+
+
+def test_compressed_codec_zdict() -> None:
+    samples = [{"name": f"record {n}", "species": "human"} for n in range(50)]
+    zdict = CompressedCodec.train(samples)
+    plain = CompressedCodec(threshold=10)
+    trained = CompressedCodec(threshold=10, zdict=zdict)
+    data = {"name": "record 51", "species": "human"}
+
+    assert len(trained.dump(data)) < len(plain.dump(data))
+    assert trained.load(trained.dump(data)) == data
+
+
+def test_deflate_splice() -> None:
+    codec = CompressedCodec(threshold=10)
+    data = {"text": "lorem ipsum " * 1000, "n": list(range(100))}
+    blob = codec.dump(data)
+    assert isinstance(blob, bytes)
+
+    body = deflate_splice(b'{"data":', blob, b"}")
+
+    assert body is not None
+    assert zlib.decompress(body) == b'{"data":' + codec.encode(data).encode() + b"}"
+
+
+def test_deflate_splice_needs_plain_blob() -> None:
+    codec = CompressedCodec(threshold=10, zdict=b"lorem ipsum")
+    blob = codec.dump({"text": "lorem ipsum"})
+    assert isinstance(blob, bytes)
+
+    assert deflate_splice(b"", blob, b"") is None
+
+
+def test_services_store_compressed(cursor: "Cursor", dbname: str) -> None:
+    service = RecordRevisionHistoryService()
+    service.db_name = dbname
+    service.codec = CompressedCodec(threshold=100)
+    data = {"text": "lorem ipsum " * 100}
+
+    service.create_record(Record("1", data))
+    service.update_record("1", {"n": "1"})
+
+    stored = cursor.execute("SELECT data FROM versioned_records").fetchone()[0]
+    assert isinstance(stored, bytes)
+    assert service.get_record("1", version=1).data == data
+    assert service.get_record("1").data == {**data, "n": "1"}
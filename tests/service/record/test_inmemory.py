@@ -0,0 +1,189 @@
+import pathlib
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+import pytest
+
+from entity.record import Record
+from service.record.base import (
+    RecordAlreadyExistsError,
+    RecordDoesNotExistError,
+    RecordService,
+)
+from service.record.inmemory import InMemoryRecordService
+from service.record.retention import RetentionPolicy, prune_history
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+
+@pytest.fixture
+def service() -> InMemoryRecordService:
+    return InMemoryRecordService()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def versioned(request: pytest.FixtureRequest) -> RecordService:
+    """Versioned service of each backend the in-memory one must agree with."""
+    if request.param == "memory":
+        return InMemoryRecordService()
+    request.getfixturevalue("cursor")
+    sqlite = RecordRevisionHistoryService()
+    sqlite.db_name = request.getfixturevalue("dbname")
+    return sqlite
+
+
+def test_callers_do_not_share_stored_data(service: InMemoryRecordService) -> None:
+    record = Record("1", {"name": "Anna"})
+    service.create_record(record)
+
+    record.data["name"] = "changed"
+    service.get_record("1").data["name"] = "changed"
+
+    assert service.get_record("1").data == {"name": "Anna"}
+
+
+def test_update_does_not_change_earlier_reads(service: InMemoryRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    before = service.get_record("1")
+
+    after = service.update_record("1", {"species": "human"})
+
+    assert before.data == {"name": "Anna"}
+    assert after.data == {"name": "Anna", "species": "human"}
+
+
+def test_instances_do_not_share_state(service: InMemoryRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    with pytest.raises(RecordDoesNotExistError):
+        InMemoryRecordService().get_record("1")
+
+
+def test_versions(versioned: RecordService) -> None:
+    versioned.create_record(Record("1", {"name": "Anna"}))
+    versioned.update_record("1", {"species": "human"})
+    versioned.update_record("1", {"species": "human"})
+    versioned.update_record("1", {"name": None})
+
+    assert versioned.get_versions("1") == [1, 2, 3]
+    assert versioned.get_record("1").data == {"species": "human"}
+    assert versioned.get_record("1", version="2").data == {
+        "name": "Anna",
+        "species": "human",
+    }
+    assert versioned.get_versions_page("1", after=1, limit=1) == ([2], 2)
+    assert versioned.get_versions_page("1", after=2, limit=1) == ([3], None)
+    assert [record.version for record in versioned.iter_history("1")] == [1, 2, 3]
+    assert [
+        (change.seq, change.slug, change.version) for change in versioned.get_changes()
+    ] == [(1, "1", 1), (2, "1", 2), (3, "1", 3)]
+
+    with pytest.raises(RecordDoesNotExistError):
+        versioned.get_record("1", version="4")
+
+
+def test_create_existing_raises(versioned: RecordService) -> None:
+    versioned.create_record(Record("1", {"name": "Anna"}))
+
+    with pytest.raises(RecordAlreadyExistsError):
+        versioned.create_record(Record("1", {"name": "Bo"}))
+
+    assert versioned.get_record("1").data == {"name": "Anna"}
+    assert [change.version for change in versioned.get_changes()] == [1]
+
+
+def test_bulk_upsert(service: InMemoryRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    results = service.bulk_upsert(
+        [("1", {"name": "Anna"}), ("2", {"name": "Bo"}), ("2", {"age": "3"})]
+    )
+
+    assert [result["status"] for result in results] == [
+        "unchanged",
+        "created",
+        "updated",
+    ]
+    assert service.get_versions("1") == [1]
+    assert service.get_record("2").data == {"name": "Bo", "age": "3"}
+    assert service.get_record("2").version == 1
+
+
+def test_as_of(service: InMemoryRecordService) -> None:
+    start = datetime(2023, 3, 1)
+    service.create_record(Record("1", {"name": "Anna"}, timestamp=start))
+    service.update_record("1", {"name": "Bo"})
+
+    assert service.get_record_as_of("1", start).data == {"name": "Anna"}
+    assert service.get_record_as_of("1", datetime.now()).data == {"name": "Bo"}
+    assert list(service.iter_records_as_of(start - timedelta(days=1))) == []
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record_as_of("1", start - timedelta(days=1))
+
+
+def test_save_and_load(tmp_path: pathlib.Path, service: InMemoryRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.update_record("1", {"species": "human"})
+    service.save(str(tmp_path / "records.ndjson"))
+
+    restored = InMemoryRecordService()
+    restored.load(str(tmp_path / "records.ndjson"))
+
+    assert restored.get_versions("1") == [1, 2]
+    assert restored.get_record("1", version=1).data == {"name": "Anna"}
+    assert restored.get_record("1").timestamp == service.get_record("1").timestamp
+
+
+def test_import_records(
+    cursor: "Cursor", dbname: str, service: InMemoryRecordService
+) -> None:
+    sqlite = RecordRevisionHistoryService()
+    sqlite.db_name = dbname
+    sqlite.create_record(Record("1", {"name": "Anna"}))
+    sqlite.update_record("1", {"species": "human"})
+    sqlite.create_record(Record("2", {"name": "Bo"}))
+
+    assert service.import_records(sqlite) == 2
+    assert service.get_versions("1") == [1, 2]
+    assert service.get_record("1").data == sqlite.get_record("1").data
+    assert service.get_record("2", version=1).data == {"name": "Bo"}
+
+
+def test_import_pruned_history(
+    cursor: "Cursor", dbname: str, service: InMemoryRecordService
+) -> None:
+    sqlite = RecordRevisionHistoryService()
+    sqlite.db_name = dbname
+    sqlite.create_record(Record("1", {"n": 1}))
+    for n in range(2, 7):
+        sqlite.update_record("1", {"n": n})
+    prune_history(sqlite, RetentionPolicy(keep_last=3))
+
+    service.import_records(sqlite)
+
+    assert service.get_versions("1") == [4, 5, 6]
+    assert service.get_record("1", version=4).data == {"n": 4}
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record("1", version=1)
+    assert service.get_versions_page("1", limit=2) == ([4, 5], 5)
+    assert service.get_versions_page("1", after=5) == ([6], None)
+
+
+def test_changes(tmp_path: pathlib.Path, service: InMemoryRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.update_record("1", {"name": "Anna"})
+    service.bulk_upsert([("1", {"age": "3"}), ("2", {"name": "Bo"})])
+
+    changes = [
+        (change.seq, change.slug, change.version) for change in service.get_changes()
+    ]
+    service.save(str(tmp_path / "records.ndjson"))
+    restored = InMemoryRecordService()
+    restored.load(str(tmp_path / "records.ndjson"))
+
+    assert changes == [(1, "1", 1), (2, "1", 2), (3, "2", 1)]
+    assert service.get_changes(after=2) == service.get_changes()[2:]
+    assert [change.seq for change in restored.get_changes()] == [1, 2, 3]
@@ -1,3 +1,4 @@
+import threading
 from typing import TYPE_CHECKING, Generator
 
 import jsonpickle
@@ -57,3 +58,64 @@ def test_update_record(cursor: "Cursor", service: SqliteRecordService) -> None:
 def test_update_record_throws(cursor: "Cursor", service: SqliteRecordService) -> None:
     with pytest.raises(RecordDoesNotExistError):
         service.update_record("1", {"test": "data"})
+
+
+def test_bulk_upsert(cursor: "Cursor", service: SqliteRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna", "species": "human"}))
+
+    results = service.bulk_upsert(
+        [
+            ("1", {"species": None}),
+            ("2", {"name": "Bo", "species": None}),
+            ("2", {"language": "english"}),
+            ("1", {"name": "Anna"}),
+        ]
+    )
+    unchanged = service.bulk_upsert([("1", {"name": "Anna", "species": None})])
+
+    assert [result["status"] for result in results] == [
+        "updated",
+        "created",
+        "updated",
+        "unchanged",
+    ]
+    assert unchanged == [{"slug": "1", "status": "unchanged", "version": None}]
+    assert service.get_record("1").data == {"name": "Anna"}
+    assert service.get_record("2").data == {"name": "Bo", "language": "english"}
+
+
+def test_get_records_many(cursor: "Cursor", service: SqliteRecordService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.create_record(Record("2", {"name": "Bo"}))
+
+    records = service.get_records_many(["2", "missing", "1"])
+
+    assert list(records) == ["2", "missing", "1"]
+    assert records["1"] is not None and records["1"].data == {"name": "Anna"}
+    assert records["2"] is not None and records["2"].data == {"name": "Bo"}
+    assert records["missing"] is None
+
+
+def test_upsert_record(cursor: "Cursor", service: SqliteRecordService) -> None:
+    service.upsert_record("1", {"name": "Anna", "species": None})
+    service.upsert_record("1", {"name": None, "species": "human"})
+
+    assert service.get_record("1").data == {"species": "human"}
+
+
+def test_concurrent_upserts_keep_every_write(
+    cursor: "Cursor", service: SqliteRecordService
+) -> None:
+    threads, writes = 8, 10
+
+    def write(thread: int) -> None:
+        for n in range(writes):
+            service.upsert_record("1", {f"{thread}-{n}": "written"})
+
+    workers = [threading.Thread(target=write, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(service.get_record("1").data) == threads * writes
@@ -1,10 +1,13 @@
-from typing import TYPE_CHECKING, Generator
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Generator
 
 import jsonpickle
 import pytest
 
-from entity.record import Record
+from entity.record import Record, changes_between
 from service.record.base import RecordDoesNotExistError
+from service.record.codec import CompressedCodec
 from service.record.v2 import RecordRevisionHistoryService
 
 if TYPE_CHECKING:
@@ -155,3 +158,327 @@ def test_get_versions(cursor: "Cursor", service: RecordRevisionHistoryService) -
     versions = service.get_versions(record.slug)
 
     assert versions == [1, 2]
+
+
+def query_plans(
+    service: RecordRevisionHistoryService, call: Callable[[], object]
+) -> list[str]:
+    """Run call and return the query plan of every SELECT it executed."""
+    statements: list[str] = []
+    with service.pool.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        call()
+        conn.set_trace_callback(None)
+
+        return [
+            row["detail"]
+            for statement in statements
+            if statement.lstrip().upper().startswith("SELECT")
+            for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")
+        ]
+
+
+def test_version_queries_use_index(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    record = Record("1", {"name": "Anna"})
+    service.create_record(record)
+    service.update_record(record.slug, {"species": "human"})
+
+    plans = query_plans(service, lambda: service.get_record("1", version=1))
+    plans += query_plans(service, lambda: service.get_versions("1"))
+
+    assert plans
+    assert all("USING" in plan and "INDEX" in plan for plan in plans)
+    assert any("history_slug_version" in plan for plan in plans)
+
+
+def test_delta_mode_reads_identical_versions(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    delta_service = RecordRevisionHistoryService()
+    delta_service.db_name = service.db_name
+    delta_service.storage_mode = "delta"
+    delta_service.keyframe_interval = 3
+    changes: list[dict[str, Any]] = [
+        {"species": "human"},
+        {"name": "AnnaBNana", "languages": ["en", "es"]},
+        {"species": None},
+        {"species": "cat", "age": 3},
+        {"languages": None, "age": 4},
+        {"name": None},
+    ]
+    for svc, slug in ((service, "snapshot"), (delta_service, "delta")):
+        svc.create_record(Record(slug, {"name": "Anna"}))
+        for change in changes:
+            svc.update_record(slug, change)
+
+    for version in range(1, len(changes) + 2):
+        expected = service.get_record("snapshot", version=version)
+        actual = delta_service.get_record("delta", version=version)
+
+        assert jsonpickle.encode(actual.data) == jsonpickle.encode(expected.data)
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "delta"])
+def test_get_record_fields(
+    cursor: "Cursor", service: RecordRevisionHistoryService, storage_mode: str
+) -> None:
+    service.storage_mode = storage_mode
+    service.create_record(Record("1", {"name": "Anna", "species": "human", "age": 3}))
+    service.update_record("1", {"age": 4, "languages": ["en"]})
+    service.update_record("1", {"species": None})
+
+    for version in ("latest", 1, 2):
+        record = service.get_record("1", version=version)
+        projected = service.get_record(
+            "1", version=version, fields=["languages", "species", "missing"]
+        )
+
+        assert projected.version == record.version
+        assert projected.timestamp == record.timestamp
+        assert projected.data == {
+            k: v for k, v in record.data.items() if k in ("languages", "species")
+        }
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record("1", version=4, fields=["name"])
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "delta", "compressed delta"])
+def test_diff_versions(
+    cursor: "Cursor", service: RecordRevisionHistoryService, storage_mode: str
+) -> None:
+    service.storage_mode = storage_mode.split()[-1]
+    service.keyframe_interval = 3
+    if storage_mode == "compressed delta":
+        service.codec = CompressedCodec(threshold=50)
+    service.create_record(Record("1", {"name": "Anna", "bio": "lorem ipsum " * 5}))
+    for change in (
+        {"species": "human"},
+        {"name": "Bo", "languages": ["en"]},
+        {"species": None},
+        {"age": 3},
+        {"languages": ["en", "es"], "bio": None},
+    ):
+        service.update_record("1", change)
+
+    for old in range(1, 7):
+        for new in [*range(1, 7), "latest"]:
+            old_data = service.get_record("1", version=old).data
+            new_data = service.get_record("1", version=new).data
+
+            changes = service.diff_versions("1", old, new)
+            record = Record("1", dict(old_data))
+            record.update_data(changes)
+
+            assert changes == changes_between(old_data, new_data)
+            assert record.data == new_data
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.diff_versions("1", 1, 7)
+
+
+def test_delta_mode_takes_keyframes(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.storage_mode = "delta"
+    service.keyframe_interval = 3
+    service.create_record(Record("1", {"count": 1, "name": "Anna"}))
+    for count in range(2, 9):
+        service.update_record("1", {"count": count})
+
+    rows = cursor.execute(
+        "SELECT version, base_id FROM history WHERE records_slug = ? ORDER BY version",
+        ("1",),
+    ).fetchall()
+
+    assert [row["version"] for row in rows if row["base_id"] is None] == [1, 4, 7]
+
+
+def test_bulk_upsert(cursor: "Cursor", service: RecordRevisionHistoryService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.create_record(Record("2", {"name": "Bo"}))
+
+    results = service.bulk_upsert(
+        [
+            ("1", {"species": "human"}),
+            ("1", {"language": "english"}),
+            ("2", {"name": "Bo"}),
+            ("3", {"name": "Cy", "species": None}),
+        ]
+    )
+
+    assert results == [
+        {"slug": "1", "status": "updated", "version": 2},
+        {"slug": "1", "status": "updated", "version": 2},
+        {"slug": "2", "status": "unchanged", "version": 1},
+        {"slug": "3", "status": "created", "version": 1},
+    ]
+    assert service.get_versions("1") == [1, 2]
+    assert service.get_record("1", version=1).data == {"name": "Anna"}
+    assert service.get_record("1").data == {
+        "name": "Anna",
+        "species": "human",
+        "language": "english",
+    }
+    assert service.get_versions("2") == [1]
+    assert service.get_record("3").data == {"name": "Cy"}
+
+
+def test_get_records_many(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.create_record(Record("2", {"name": "Bo"}))
+    service.update_record("1", {"species": "human"})
+
+    latest = service.get_records_many(["1", "2", "3"])
+    first = service.get_records_many(["1", "2", "3"], version=1)
+    second = service.get_records_many(["1", "2"], version=2)
+
+    assert latest["1"] is not None and latest["1"].version == 2
+    assert latest["2"] is not None and latest["2"].version == 1
+    assert latest["3"] is None
+    assert first["1"] is not None and first["1"].data == {"name": "Anna"}
+    assert first["2"] is not None and first["2"].data == {"name": "Bo"}
+    assert first["3"] is None
+    assert second["1"] is not None and second["1"].data["species"] == "human"
+    assert second["2"] is None
+
+
+def test_upsert_record(cursor: "Cursor", service: RecordRevisionHistoryService) -> None:
+    created = service.upsert_record("1", {"name": "Anna", "species": None})
+    updated = service.upsert_record("1", {"name": None, "species": "human"})
+
+    assert created.version == 1
+    assert created.data == {"name": "Anna"}
+    assert updated.version == 2
+    assert service.get_record("1").data == {"species": "human"}
+
+
+def test_unchanged_update_keeps_version(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.update_record("1", {"species": "human"})
+
+    repeated = service.update_record("1", {"species": "human"})
+    upserted = service.upsert_record("1", {"name": "Anna", "language": None})
+    bulk = service.bulk_upsert([("1", {"species": "human"})])
+
+    assert repeated.version == upserted.version == 2
+    assert bulk == [{"slug": "1", "status": "unchanged", "version": 2}]
+    assert service.get_versions("1") == [1, 2]
+    assert [change.version for change in service.get_changes()] == [1, 2]
+
+
+def test_concurrent_upserts_keep_every_version(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    threads, writes = 8, 10
+
+    def write(thread: int) -> None:
+        for n in range(writes):
+            service.upsert_record("1", {f"{thread}-{n}": "written"})
+
+    workers = [threading.Thread(target=write, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    record = service.get_record("1")
+
+    assert record.version == threads * writes
+    assert len(record.data) == threads * writes
+    assert service.get_versions("1") == list(range(1, threads * writes + 1))
+
+
+def test_get_record_as_of(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}, timestamp=datetime(2020, 1, 1)))
+    service.update_record("1", {"species": "human"})
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_record_as_of("1", datetime(2019, 1, 1))
+
+    assert service.get_record_as_of("1", datetime(2021, 1, 1)).version == 1
+    assert service.get_record_as_of("1", datetime.now()).version == 2
+
+
+def test_iter_records_as_of(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_record(Record("1", {"name": "Anna"}, timestamp=datetime(2020, 1, 1)))
+    service.create_record(Record("2", {"name": "Bo"}, timestamp=datetime(2021, 1, 1)))
+    service.update_record("1", {"species": "human"})
+
+    def versions_at(timestamp: datetime) -> dict[str, int | None]:
+        records = service.iter_records_as_of(timestamp)
+        return {record.slug: record.version for record in records}
+
+    assert versions_at(datetime(2019, 1, 1)) == {}
+    assert versions_at(datetime(2020, 6, 1)) == {"1": 1}
+    assert versions_at(datetime(2022, 1, 1)) == {"1": 1, "2": 1}
+    assert versions_at(datetime.now()) == {"1": 2, "2": 1}
+
+
+def test_get_versions_raises(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_versions("1")
+
+
+def test_get_versions_page(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_record(Record("1", {"count": "1"}))
+    for count in range(2, 6):
+        service.update_record("1", {"count": str(count)})
+
+    first, after = service.get_versions_page("1", limit=2)
+    second, after_second = service.get_versions_page("1", after, limit=2)
+    last, end = service.get_versions_page("1", after_second, limit=2)
+
+    assert (first, after) == ([1, 2], 2)
+    assert (second, after_second) == ([3, 4], 4)
+    assert (last, end) == ([5], None)
+
+    with pytest.raises(RecordDoesNotExistError):
+        service.get_versions_page("2")
+
+
+def test_iter_history(cursor: "Cursor", service: RecordRevisionHistoryService) -> None:
+    service.storage_mode = "delta"
+    service.keyframe_interval = 2
+    service.create_record(Record("1", {"count": "1"}))
+    for count in range(2, 6):
+        service.update_record("1", {"count": str(count)})
+
+    history = list(service.iter_history("1"))
+
+    assert [record.version for record in history] == [1, 2, 3, 4, 5]
+    assert [record.data["count"] for record in history] == ["1", "2", "3", "4", "5"]
+    assert list(service.iter_history("2")) == []
+
+
+def test_changes(cursor: "Cursor", service: RecordRevisionHistoryService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.update_record("1", {"name": "Anna"})
+    service.update_record("1", {"species": "human"})
+    service.bulk_upsert([("1", {"age": "3"}), ("2", {"name": "Bo"}), ("3", {})])
+
+    changes = service.get_changes()
+
+    assert [(change.seq, change.slug, change.version) for change in changes] == [
+        (1, "1", 1),
+        (2, "1", 2),
+        (3, "1", 3),
+        (4, "2", 1),
+        (5, "3", 1),
+    ]
+    assert service.get_changes(after=3, limit=1)[0].slug == "2"
+    assert service.get_changes(after=5) == []
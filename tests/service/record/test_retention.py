@@ -0,0 +1,123 @@
+import pathlib
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+import pytest
+
+import db
+from entity.record import Record
+from pool import close_pools
+from service.record.retention import (
+    RetentionPolicy,
+    parse_duration,
+    prune_history,
+    vacuum,
+)
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+NOW = datetime(2023, 3, 31, 12)
+
+
+def test_parse_duration() -> None:
+    assert parse_duration("90m") == timedelta(minutes=90)
+    assert parse_duration("30d") == timedelta(days=30)
+
+    with pytest.raises(ValueError):
+        parse_duration("1 year")
+
+
+def test_policy_keep_last_and_within() -> None:
+    versions = [(v, NOW - timedelta(days=10 - v)) for v in range(1, 11)]
+
+    assert RetentionPolicy().keep(versions, NOW) == set(range(1, 11))
+    assert RetentionPolicy(keep_last=3).keep(versions, NOW) == {8, 9, 10}
+    assert RetentionPolicy(keep_within=timedelta(days=2)).keep(versions, NOW) == {
+        8,
+        9,
+        10,
+    }
+    assert RetentionPolicy(keep_last=0).keep(versions, NOW) == {10}
+
+
+def test_policy_thin() -> None:
+    # a version every 20 minutes over the last two days
+    versions = [(v, NOW - timedelta(minutes=20 * (144 - v))) for v in range(1, 145)]
+    policy = RetentionPolicy(
+        keep_within=timedelta(hours=1),
+        thin=[
+            (timedelta(hours=1), timedelta(hours=1)),
+            (timedelta(days=1), timedelta(days=1)),
+        ],
+    )
+
+    kept = policy.keep(versions, NOW)
+
+    recent = {v for v, timestamp in versions if NOW - timestamp <= timedelta(hours=1)}
+    hourly = {
+        v
+        for v, timestamp in versions
+        if timedelta(hours=1) <= NOW - timestamp < timedelta(days=1)
+        and timestamp.minute == 40
+    }
+    assert recent | hourly <= kept
+    # one version for the day before yesterday, one for yesterday
+    assert len(kept - recent - hourly) == 2
+
+
+@pytest.fixture
+def service(dbname: str) -> RecordRevisionHistoryService:
+    service = RecordRevisionHistoryService()
+    service.db_name = dbname
+    return service
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "delta"])
+def test_prune_history(
+    cursor: "Cursor", service: RecordRevisionHistoryService, storage_mode: str
+) -> None:
+    service.storage_mode = storage_mode
+    service.keyframe_interval = 4
+    for slug in ("1", "2"):
+        service.create_record(Record(slug, {"name": "Anna"}))
+        for n in range(1, 10):
+            service.update_record(slug, {"n": str(n), f"key{n % 3}": str(n)})
+    expected = {
+        version: service.get_record("1", version=version).data
+        for version in range(7, 11)
+    }
+
+    stats = prune_history(service, RetentionPolicy(keep_last=4), batch_size=1)
+
+    assert stats["records"] == 2
+    assert stats["pruned"] == 12
+    # version 7 of each record is rebuilt as a keyframe for version 8
+    assert stats["keyframes"] == (2 if storage_mode == "delta" else 0)
+    assert service.get_versions("1") == [7, 8, 9, 10]
+    assert {
+        record.version: record.data for record in service.iter_history("1")
+    } == expected
+    for version in range(7, 10):
+        assert service.get_record("1", version=version).data == expected[version]
+    assert prune_history(service, RetentionPolicy(keep_last=4))["pruned"] == 0
+
+
+def test_vacuum_reclaims_pruned_pages(tmp_path: pathlib.Path) -> None:
+    db_name = str(tmp_path / "records.db")
+    db.initialize_db(db_name)
+    service = RecordRevisionHistoryService()
+    service.db_name = db_name
+    try:
+        service.create_record(Record("1", {"n": "0"}))
+        for n in range(1, 200):
+            service.update_record("1", {"n": str(n), "padding": "x" * 4000})
+
+        prune_history(service, RetentionPolicy(keep_last=1))
+
+        assert vacuum(db_name) > 100 * 4000
+        assert vacuum(db_name) == 0
+        assert service.get_record("1").data["n"] == "199"
+    finally:
+        close_pools()
@@ -0,0 +1,150 @@
+import pathlib
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+from entity.record import Record
+from pool import close_pools
+from service.record.base import RecordService
+from service.record.codec import CompressedCodec
+from service.record.inmemory import InMemoryRecordService
+from service.record.search import index_name, matches, parse_path
+from service.record.sharded import ShardedRecordService
+from service.record.v2 import RecordRevisionHistoryService
+
+if TYPE_CHECKING:
+    from sqlite3 import Cursor
+
+
+@pytest.fixture
+def service(dbname: str) -> RecordRevisionHistoryService:
+    service = RecordRevisionHistoryService()
+    service.db_name = dbname
+    return service
+
+
+def people(service: RecordService, count: int = 30) -> None:
+    for n in range(count):
+        service.create_record(
+            Record(
+                f"{n:02}",
+                {
+                    "name": f"person {n}",
+                    "age": n % 3,
+                    "address": {"city": "Oslo" if n % 2 else "Rome"},
+                },
+            )
+        )
+
+
+def search_all(
+    service: RecordService, where: dict[str, object], limit: int = 4
+) -> list[str]:
+    slugs: list[str] = []
+    after = None
+    while True:
+        result = service.search_records(where, after, limit)
+        slugs += [record.slug for record in result.records]
+        if result.next_after is None:
+            return slugs
+        after = result.next_after
+
+
+def test_matches() -> None:
+    data = {"name": "Anna", "address": {"city": "Oslo"}, "admin": True}
+
+    assert matches(data, {"name": "Anna", "address.city": "Oslo"})
+    assert matches(data, {"admin": True})
+    assert not matches(data, {"address.city": "Rome"})
+    assert not matches(data, {"name.first": "Anna"})
+    with pytest.raises(ValueError):
+        parse_path('address."city"')
+
+
+def test_search_uses_declared_index(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    people(service)
+    service.update_record("01", {"address": {"city": "Rome"}})
+    expected = [f"{n:02}" for n in range(3, 30, 2) if n % 3 == 0]
+
+    unindexed = service.search_records({"address.city": "Oslo", "age": 0})
+    service.create_indexes(["address.city"])
+    indexed = service.search_records({"address.city": "Oslo", "age": 0})
+
+    assert [record.slug for record in unindexed.records] == expected
+    assert unindexed.scanned
+    assert [record.slug for record in indexed.records] == expected
+    assert indexed.indexes == [index_name("address.city")]
+    assert not indexed.scanned
+    assert search_all(service, {"address.city": "Oslo", "age": 0}, limit=2) == expected
+
+
+def test_create_indexes_drops_undeclared(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.create_indexes(["name", "age"])
+    service.create_indexes(["age"])
+
+    names = [
+        row["name"]
+        for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name GLOB 'data_path_*'"
+        )
+    ]
+    assert names == [index_name("age")]
+
+
+def test_search_finds_compressed_records(
+    cursor: "Cursor", service: RecordRevisionHistoryService
+) -> None:
+    service.codec = CompressedCodec(threshold=100)
+    service.create_indexes(["age"])
+    people(service)
+    service.update_record("04", {"bio": "lorem ipsum " * 20})
+
+    result = service.search_records({"age": 1})
+
+    assert [record.slug for record in result.records] == [
+        f"{n:02}" for n in range(30) if n % 3 == 1
+    ]
+    assert result.scanned
+    assert search_all(service, {"age": 1}) == [
+        f"{n:02}" for n in range(30) if n % 3 == 1
+    ]
+
+
+def test_search_as_of(cursor: "Cursor", service: RecordRevisionHistoryService) -> None:
+    people(service, 4)
+    timestamp = datetime.now()
+    service.update_record("02", {"age": 1})
+
+    assert search_all(service, {"age": 1}) == ["01", "02"]
+    assert [
+        record.slug
+        for record in service.search_records({"age": 1}, timestamp=timestamp).records
+    ] == ["01"]
+
+
+def test_search_in_memory() -> None:
+    service = InMemoryRecordService()
+    people(service)
+
+    assert search_all(service, {"address.city": "Rome", "age": 2}) == [
+        f"{n:02}" for n in range(0, 30, 2) if n % 3 == 2
+    ]
+
+
+def test_search_sharded(tmp_path: pathlib.Path) -> None:
+    service = ShardedRecordService()
+    service.db_name = str(tmp_path / "sharded.db")
+    try:
+        people(service, 60)
+
+        assert search_all(service, {"age": 2}, limit=3) == [
+            f"{n:02}" for n in range(60) if n % 3 == 2
+        ]
+    finally:
+        service.close()
+        close_pools()
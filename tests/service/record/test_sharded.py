@@ -0,0 +1,119 @@
+import pathlib
+import sqlite3
+from typing import Generator
+
+import pytest
+
+import db
+from entity.record import Record
+from pool import close_pools
+from reshard import reshard
+from service.record.sharded import ShardedRecordService, shard_files, shard_of
+from service.record.v2 import RecordRevisionHistoryService
+
+
+@pytest.fixture
+def service(tmp_path: pathlib.Path) -> Generator[ShardedRecordService, None, None]:
+    service = ShardedRecordService()
+    service.db_name = str(tmp_path / "sharded.db")
+    yield service
+    service.close()
+    close_pools()
+
+
+def count(db_name: str, table: str) -> int:
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_slugs_are_routed_by_hash(service: ShardedRecordService) -> None:
+    for n in range(40):
+        service.upsert_record(str(n), {"n": str(n)})
+
+    files = shard_files(service.db_name, service.shards)
+    assert sum(count(name, "versioned_records") for name in files) == 40
+    for n in range(40):
+        assert count(files[shard_of(str(n), 4)], "versioned_records") > 0
+        assert service.get_record(str(n)).data == {"n": str(n)}
+
+
+def test_many_slugs_fan_out(service: ShardedRecordService) -> None:
+    results = service.bulk_upsert([(str(n), {"n": str(n)}) for n in range(20)])
+    results += service.bulk_upsert([("3", {"n": "three"}), ("20", {"n": "20"})])
+
+    assert [result["slug"] for result in results] == [
+        *(str(n) for n in range(20)),
+        "3",
+        "20",
+    ]
+    assert [result["status"] for result in results[-2:]] == ["updated", "created"]
+
+    records = service.get_records_many(["3", "missing", "20"])
+
+    assert records["3"] is not None and records["3"].data == {"n": "three"}
+    assert records["missing"] is None
+    assert list(records) == ["3", "missing", "20"]
+
+
+def test_shard_options(service: ShardedRecordService) -> None:
+    service.shard_options = {"storage_mode": "delta"}
+
+    shard = service.shard("1")
+
+    assert isinstance(shard, RecordRevisionHistoryService)
+    assert shard.storage_mode == "delta"
+
+
+def test_reshard(tmp_path: pathlib.Path) -> None:
+    db_name = str(tmp_path / "records.db")
+    db.initialize_db(db_name)
+    single = RecordRevisionHistoryService()
+    single.db_name = db_name
+    single.storage_mode = "delta"
+    for n in range(10):
+        single.create_record(Record(str(n), {"name": f"record {n}", "n": "0"}))
+        for edit in range(1, 4):
+            single.update_record(str(n), {"n": str(edit)})
+    close_pools()
+
+    counts = reshard(db_name, 1, 3)
+
+    sharded = ShardedRecordService()
+    sharded.db_name = db_name
+    sharded.shards = 3
+    try:
+        assert counts == {"records": 0, "versioned_records": 10, "history": 30}
+        for n in range(10):
+            assert sharded.get_versions(str(n)) == [1, 2, 3, 4]
+            assert (
+                sharded.get_record(str(n), version=2).data
+                == single.get_record(str(n), version=2).data
+            )
+    finally:
+        sharded.close()
+        close_pools()
+
+    with pytest.raises(ValueError):
+        reshard(db_name, 1, 3)
+
+
+def test_reshard_rejects_delta_without_keyframe(tmp_path: pathlib.Path) -> None:
+    db_name = str(tmp_path / "records.db")
+    db.initialize_db(db_name)
+    with sqlite3.connect(db_name) as conn:
+        conn.execute(
+            """INSERT INTO history (records_slug, version, timestamp, data, base_id)
+            VALUES ('1', 2, '2023-03-01 12:00:00', '{"n":"2"}', 42)"""
+        )
+    conn.close()
+
+    with pytest.raises(ValueError):
+        reshard(db_name, 1, 2)
+
+    for shard in shard_files(db_name, 2):
+        with sqlite3.connect(shard) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM history").fetchone() == (0,)
+        conn.close()
@@ -0,0 +1,396 @@
+import json
+import pathlib
+import pstats
+import threading
+import time
+import zlib
+from typing import Generator
+
+import pytest
+from flask import Flask
+
+from api import v2
+from app import create_app
+from commands import history_services
+from pool import close_pools, get_pool
+from service.record.inmemory import InMemoryRecordService
+from service.record.registry import create_service
+from service.record.sharded import shard_files
+from service.record.v2 import RecordRevisionHistoryService
+
+
+@pytest.fixture(params=["sqlite-history", "memory"])
+def app(
+    request: pytest.FixtureRequest, tmp_path: pathlib.Path
+) -> Generator[Flask, None, None]:
+    yield create_app(
+        {
+            "RECORD_DB": str(tmp_path / "app.db"),
+            "RECORD_BACKEND_V2": request.param,
+        }
+    )
+    close_pools()
+
+
+def test_post_and_get_record(app: Flask) -> None:
+    client = app.test_client()
+
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+    client.post("/api/v2/records/1/latest", json={"species": "human"})
+
+    assert client.get("/api/v2/records/1/1").json["data"] == {"name": "Anna"}
+    assert client.get("/api/v2/records/1/latest").json["data"] == {
+        "name": "Anna",
+        "species": "human",
+    }
+    assert client.get("/api/v2/records/1/versions").json == {"versions": [1, 2]}
+    assert client.get("/api/v2/records/2/latest").status_code == 404
+
+
+def test_backend_from_environment(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    monkeypatch.setenv("FLASK_RECORD_BACKEND_V2", "memory")
+    monkeypatch.setenv("FLASK_RECORD_CACHE", "false")
+    monkeypatch.setenv("FLASK_METRICS", "false")
+    create_app({"RECORD_DB": str(tmp_path / "app.db")})
+    close_pools()
+
+    assert isinstance(v2.api.service, InMemoryRecordService)
+
+
+def test_service_options(tmp_path: pathlib.Path) -> None:
+    create_app(
+        {
+            "RECORD_DB": str(tmp_path / "app.db"),
+            "RECORD_OPTIONS_V2": {"storage_mode": "delta"},
+            "RECORD_CACHE": False,
+            "METRICS": False,
+        }
+    )
+    close_pools()
+
+    assert isinstance(v2.api.service, RecordRevisionHistoryService)
+    assert v2.api.service.storage_mode == "delta"
+    assert v2.api.service.db_name == str(tmp_path / "app.db")
+
+
+def test_pool_and_schema_apply_to_shards(tmp_path: pathlib.Path) -> None:
+    create_app(
+        {
+            "RECORD_DB": str(tmp_path / "app.db"),
+            "RECORD_BACKEND_V1": "memory",
+            "RECORD_BACKEND_V2": "sharded",
+            "RECORD_OPTIONS_V2": {"shards": 2},
+            "RECORD_POOL": {"size": 3},
+        }
+    )
+    try:
+        shards = shard_files(str(tmp_path / "app.db"), 2)
+
+        assert [get_pool(shard).size for shard in shards] == [3, 3]
+        assert sorted(path.name for path in tmp_path.glob("*.db")) == [
+            "app.0-of-2.db",
+            "app.1-of-2.db",
+        ]
+    finally:
+        close_pools()
+
+
+def test_unknown_backend_or_option() -> None:
+    with pytest.raises(ValueError):
+        create_service("missing")
+    with pytest.raises(ValueError):
+        create_service("memory", db_name="records.db")
+
+
+def test_conditional_get(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+
+    latest = client.get("/api/v2/records/1/latest")
+    cached = client.get(
+        "/api/v2/records/1/latest", headers={"If-None-Match": latest.headers["ETag"]}
+    )
+    client.post("/api/v2/records/1/latest", json={"species": "human"})
+    changed = client.get(
+        "/api/v2/records/1/latest", headers={"If-None-Match": latest.headers["ETag"]}
+    )
+
+    assert latest.headers["Cache-Control"] == "public, no-cache"
+    assert "Last-Modified" in latest.headers
+    assert cached.status_code == 304
+    assert cached.data == b""
+    assert changed.status_code == 200
+    assert changed.json["version"] == 2
+    assert changed.headers["ETag"] != latest.headers["ETag"]
+
+
+def test_numbered_version_is_immutable(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+    client.post("/api/v2/records/1/latest", json={"species": "human"})
+
+    first = client.get("/api/v2/records/1/1")
+    cached = client.get(
+        "/api/v2/records/1/1",
+        headers={"If-Modified-Since": first.headers["Last-Modified"]},
+    )
+
+    assert "immutable" in first.headers["Cache-Control"]
+    assert "max-age=31536000" in first.headers["Cache-Control"]
+    assert cached.status_code == 304
+    assert (
+        client.get(
+            "/api/v2/records/1/9", headers={"If-None-Match": '"stale"'}
+        ).status_code
+        == 404
+    )
+
+
+def test_post_to_numbered_version_adds_latest(app: Flask) -> None:
+    client = app.test_client()
+    for n in range(3):
+        client.post("/api/v2/records/1/latest", json={"n": n + 1})
+
+    client.post("/api/v2/records/1/1", json={"name": "Anna"})
+
+    assert client.get("/api/v2/records/1/versions").json == {"versions": [1, 2, 3, 4]}
+    assert client.get("/api/v2/records/1/3").json["data"] == {"n": 3}
+    assert client.get("/api/v2/records/1/latest").json["data"] == {
+        "n": 3,
+        "name": "Anna",
+    }
+
+
+def test_conditional_get_v1(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v1/records/1", json={"name": "Anna"})
+
+    etag = client.get("/api/v1/records/1").headers["ETag"]
+    cached = client.get("/api/v1/records/1", headers={"If-None-Match": etag})
+    client.post("/api/v1/records/1", json={"name": "Bo"})
+    changed = client.get("/api/v1/records/1", headers={"If-None-Match": etag})
+
+    assert cached.status_code == 304
+    assert changed.json["data"] == {"name": "Bo"}
+
+
+def test_py_tagged_data_is_plain_json(app: Flask) -> None:
+    client = app.test_client()
+    data = {
+        "x": {"py/reduce": [{"py/function": "os.getpid"}, {"py/tuple": []}]},
+        "n": {"py/set": [1, 2]},
+    }
+    client.post("/api/v1/records/1", json=data)
+    client.post("/api/v2/records/1/latest", json=data)
+    client.post("/api/v2/records/1/latest", json={"age": 3})
+
+    assert client.get("/api/v1/records/1").json["data"] == data
+    assert client.get("/api/v2/records/1/1").json["data"] == data
+    assert client.get("/api/v2/records/1/latest?fields=n").json["data"] == {
+        "n": data["n"]
+    }
+
+
+def test_get_record_fields(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v1/records/1", json={"name": "Anna", "species": "human"})
+    client.post("/api/v2/records/1/latest", json={"name": "Anna", "species": "human"})
+    client.post("/api/v2/records/1/latest", json={"age": 3})
+
+    assert client.get("/api/v1/records/1?fields=species").json["data"] == {
+        "species": "human"
+    }
+    assert client.get("/api/v2/records/1/latest?fields=name,age").json["data"] == {
+        "name": "Anna",
+        "age": 3,
+    }
+    assert client.get("/api/v2/records/1/1?fields=age&fields=species").json["data"] == {
+        "species": "human"
+    }
+    assert client.get("/api/v2/async/records/1/1?fields=name").json["data"] == {
+        "name": "Anna"
+    }
+
+
+def test_diff(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna", "age": 3})
+    client.post("/api/v2/records/1/latest", json={"age": 4, "city": "Oslo"})
+    client.post("/api/v2/records/1/latest", json={"name": None})
+
+    assert client.get("/api/v2/records/1/diff?from=1").json == {
+        "changes": {"age": 4, "city": "Oslo", "name": None}
+    }
+    assert client.get("/api/v2/records/1/diff?from=3&to=2").json == {
+        "changes": {"name": "Anna"}
+    }
+    assert client.get("/api/v2/records/1/diff?from=1&to=9").status_code == 404
+    assert client.get("/api/v2/records/1/diff?to=2").status_code == 400
+
+
+def test_search(tmp_path: pathlib.Path) -> None:
+    app = create_app(
+        {"RECORD_DB": str(tmp_path / "app.db"), "RECORD_INDEXES": ["address.city"]}
+    )
+    client = app.test_client()
+    for slug, city, age in (("1", "Oslo", 3), ("2", "Rome", 3), ("3", "Oslo", 4)):
+        client.post(
+            f"/api/v2/records/{slug}/latest",
+            json={"address": {"city": city}, "age": age},
+        )
+
+    found = client.get("/api/v2/search?where=address.city=Oslo&limit=1").json
+    rest = client.get(
+        f"/api/v2/search?where=address.city=Oslo&cursor={found['next_cursor']}"
+    ).json
+    by_age = client.get("/api/v2/search?where=age=3").json
+
+    assert [r["slug"] for r in found["results"] + rest["results"]] == ["1", "3"]
+    assert found["indexes"] and not found["scanned"]
+    assert rest["next_cursor"] is None
+    assert [r["slug"] for r in by_age["results"]] == ["1", "2"]
+    assert client.get("/api/v2/search?where=age").status_code == 400
+    overflow = client.get(f"/api/v2/search?where=age={2**70}")
+    assert overflow.status_code == 400
+    assert client.get(f"/api/v2/search?where=age={2**63 - 1}").json["results"] == []
+    close_pools()
+
+
+@pytest.mark.parametrize("storage_mode", ["snapshot", "delta"])
+def test_compressed_passthrough(tmp_path: pathlib.Path, storage_mode: str) -> None:
+    app = create_app(
+        {
+            "RECORD_DB": str(tmp_path / "app.db"),
+            "RECORD_COMPRESSION": {"threshold": 100},
+            "RECORD_OPTIONS_V2": {"storage_mode": storage_mode},
+        }
+    )
+    client = app.test_client()
+    data = {"text": "lorem ipsum " * 100}
+    client.post("/api/v2/records/1/latest", json=data)
+    client.post("/api/v2/records/1/latest", json={"n": "1"})
+    client.post("/api/v2/records/1/latest", json={"n": "2"})
+
+    for path in ("/api/v2/records/1/latest", "/api/v2/records/1/1"):
+        plain = client.get(path)
+        deflated = client.get(path, headers={"Accept-Encoding": "deflate"})
+
+        assert plain.json["data"]["text"] == data["text"]
+        assert plain.headers["Vary"] == "Accept-Encoding"
+        assert deflated.headers["Content-Encoding"] == "deflate"
+        assert zlib.decompress(deflated.data) == plain.data
+        assert deflated.headers["ETag"] == f"W/{plain.headers['ETag']}"
+        assert (
+            client.get(
+                path,
+                headers={
+                    "Accept-Encoding": "deflate",
+                    "If-None-Match": deflated.headers["ETag"],
+                },
+            ).status_code
+            == 304
+        )
+
+    projected = client.get("/api/v2/records/1/latest?fields=n")
+    assert projected.json["data"] == {"n": "2"}
+    assert projected.content_encoding is None
+
+    # delta revisions are decoded and encoded as before
+    revision = client.get("/api/v2/records/1/2", headers={"Accept-Encoding": "deflate"})
+    assert revision.content_encoding == (
+        "deflate" if storage_mode == "snapshot" else None
+    )
+    close_pools()
+
+
+def test_prune_history_command(app: Flask) -> None:
+    client = app.test_client()
+    for n in range(5):
+        client.post("/api/v2/records/1/latest", json={"n": str(n)})
+
+    result = app.test_cli_runner().invoke(args=["prune-history", "--keep-last", "2"])
+
+    if not history_services(v2.api.service):
+        assert "keeps no history" in result.output
+    else:
+        assert "pruned 3 versions of 1 records" in result.output
+        assert "reclaimed" in result.output
+        assert client.get("/api/v2/records/1/versions").json == {"versions": [4, 5]}
+
+
+def test_metrics(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+    client.get("/api/v2/records/1/latest")
+    client.get("/api/v2/records/1/latest")
+
+    metrics = client.get("/api/metrics").json
+
+    endpoint = metrics["endpoints"]["api.v2.get_record"]
+    assert endpoint["count"] >= 2
+    assert endpoint["per_request"]["service_ms"] > 0
+    assert metrics["services"]["upsert_record"]["count"] >= 1
+    assert metrics["caches"]["v2"]["hits"] >= 1
+    if not history_services(v2.api.service):
+        return
+    assert endpoint["per_request"]["sql_queries"] > 0
+    assert app.config["RECORD_DB"] in metrics["pools"]
+
+
+def test_slow_request_profiles(tmp_path: pathlib.Path) -> None:
+    app = create_app(
+        {
+            "RECORD_DB": str(tmp_path / "app.db"),
+            "PROFILE_SLOW_MS": 0,
+            "PROFILE_DIR": str(tmp_path / "profiles"),
+        }
+    )
+    client = app.test_client()
+
+    client.get("/api/v2/records/1/latest")
+    close_pools()
+
+    [profile] = (tmp_path / "profiles").iterdir()
+    assert "api.v2.get_record" in profile.name
+    assert pstats.Stats(str(profile)).total_calls > 0
+
+
+def test_changes_long_poll(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+
+    first = client.get("/api/v2/changes").json
+    assert [change["slug"] for change in first["changes"]] == ["1"]
+
+    timer = threading.Timer(
+        0.1,
+        app.test_client().post,
+        ("/api/v2/records/2/latest",),
+        {"json": {"name": "Bo"}},
+    )
+    timer.start()
+    start = time.monotonic()
+    waited = client.get(f"/api/v2/changes?cursor={first['next_cursor']}&wait=5").json
+    timer.join()
+
+    assert time.monotonic() - start < 1
+    assert [(c["slug"], c["version"]) for c in waited["changes"]] == [("2", 1)]
+    assert client.get("/api/v2/changes?wait=60").status_code == 400
+
+
+def test_changes_event_stream(app: Flask) -> None:
+    client = app.test_client()
+    client.post("/api/v2/records/1/latest", json={"name": "Anna"})
+    client.post("/api/v2/records/1/latest", json={"name": "Bo"})
+
+    response = client.get(
+        "/api/v2/changes/stream", headers={"Last-Event-ID": "1"}, buffered=False
+    )
+    event = next(iter(response.response))
+    response.close()
+
+    assert response.mimetype == "text/event-stream"
+    assert event.startswith(b"id: 2\nevent: change\ndata: ")
+    assert json.loads(event.split(b"data: ")[1])["version"] == 2
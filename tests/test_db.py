@@ -0,0 +1,81 @@
+import pathlib
+import sqlite3
+from typing import Generator
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def legacy_db() -> Generator[str, None, None]:
+    """Database file created with the original, unversioned schema."""
+    with sqlite3.connect("test_legacy.db") as conn:
+        conn.execute(db.records_sql)
+        conn.execute(db.versioned_records_sql)
+        conn.execute(db.revisions_sql)
+    conn.close()
+    yield "test_legacy.db"
+    pathlib.Path.unlink("test_legacy.db")
+
+
+def test_initialize_db_upgrades_in_place(legacy_db: str) -> None:
+    db.initialize_db(legacy_db)
+
+    with sqlite3.connect(legacy_db) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        indexes = [row[1] for row in conn.execute("PRAGMA index_list(history)")]
+    conn.close()
+
+    assert version == len(db.migrations)
+    assert "history_slug_version" in indexes
+
+
+def test_initialize_db_is_idempotent(legacy_db: str) -> None:
+    db.initialize_db(legacy_db)
+    db.initialize_db(legacy_db)
+
+    with sqlite3.connect(legacy_db) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+
+    assert version == len(db.migrations)
+
+
+def test_migration_starts_change_log(legacy_db: str) -> None:
+    with sqlite3.connect(legacy_db) as conn:
+        conn.execute(
+            """INSERT INTO versioned_records (slug, data, version, created_at)
+            VALUES ('1', '{}', 3, '2023-03-01 12:00:00')"""
+        )
+    conn.close()
+
+    db.initialize_db(legacy_db)
+
+    with sqlite3.connect(legacy_db) as conn:
+        changes = conn.execute("SELECT seq, slug, version FROM changes").fetchall()
+    conn.close()
+
+    assert changes == [(1, "1", 3)]
+
+
+def test_migration_flags_jsonpickle_rows(legacy_db: str) -> None:
+    with sqlite3.connect(legacy_db) as conn:
+        conn.executemany(
+            "INSERT INTO records (slug, data) VALUES (?, ?)",
+            [
+                ("1", '{"name": "Anna"}'),
+                ("2", '{"when": {"py/object": "datetime.datetime"}}'),
+            ],
+        )
+    conn.close()
+
+    db.initialize_db(legacy_db)
+
+    with sqlite3.connect(legacy_db) as conn:
+        flags = conn.execute(
+            "SELECT slug, legacy FROM records ORDER BY slug"
+        ).fetchall()
+    conn.close()
+
+    assert flags == [("1", 0), ("2", 1)]
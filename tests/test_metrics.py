@@ -0,0 +1,66 @@
+import sqlite3
+
+from entity.record import Record
+from metrics import Histogram, InstrumentedConnection, Metrics
+from service.record.codec import CompressedCodec
+from service.record.inmemory import InMemoryRecordService
+from service.record.instrumented import InstrumentedRecordService
+
+
+def test_histogram() -> None:
+    histogram = Histogram()
+    for ms in (0.1, 0.7, 3, 3, 40, 9000):
+        histogram.observe(ms)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot["count"] == 6
+    assert snapshot["p50_ms"] == 5
+    assert snapshot["p99_ms"] == float("inf")
+    assert snapshot["buckets"]["0.5"] == 1
+    assert snapshot["buckets"]["5"] == 2
+    assert snapshot["buckets"]["+Inf"] == 1
+
+
+def test_queries_are_counted_per_request() -> None:
+    registry = Metrics()
+    conn = sqlite3.connect(":memory:", factory=InstrumentedConnection)
+    conn.execute("CREATE TABLE t (n INTEGER)")
+
+    with registry.request("insert") as stats:
+        conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+        conn.cursor().execute("SELECT * FROM t").fetchall()
+    conn.execute("SELECT * FROM t").fetchall()
+    conn.close()
+
+    assert stats.queries == 2
+    assert stats.sql > 0
+    assert registry.snapshot()["endpoints"]["insert"]["per_request"]["sql_queries"] == 2
+
+
+def test_nested_codec_calls_count_once() -> None:
+    registry = Metrics()
+    codec = CompressedCodec(threshold=10)
+
+    with registry.request("codec") as stats:
+        codec.load(codec.dump({"name": "Anna" * 10}))
+        codec_time = stats.codec
+
+    assert 0 < codec_time
+    assert stats.codec_depth == 0
+
+
+def test_instrumented_service() -> None:
+    registry = Metrics()
+    service = InstrumentedRecordService(InMemoryRecordService(), registry)
+    service.create_record(Record("1", {"name": "Anna"}))
+    service.update_record("1", {"name": "Bo"})
+
+    with registry.request("history") as stats:
+        assert [record.version for record in service.iter_history("1")] == [1, 2]
+
+    services = registry.snapshot()["services"]
+    assert services["create_record"]["count"] == 1
+    assert services["update_record"]["count"] == 1
+    assert services["iter_history"]["count"] == 1
+    assert stats.service > 0
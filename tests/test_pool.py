@@ -0,0 +1,96 @@
+import pathlib
+import threading
+from typing import Generator
+
+import pytest
+
+from pool import ConnectionPool, PoolExhaustedError
+
+
+@pytest.fixture
+def pool() -> Generator[ConnectionPool, None, None]:
+    pool = ConnectionPool("test_pool.db", size=2, timeout=0.1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS items (name TEXT)")
+    yield pool
+    pool.close()
+    pathlib.Path.unlink("test_pool.db")
+
+
+def test_connection_is_reused(pool: ConnectionPool) -> None:
+    for _ in range(5):
+        with pool.connection() as conn:
+            conn.execute("SELECT * FROM items").fetchall()
+
+    assert pool.opened == 1
+
+
+def test_nested_checkout_shares_connection(pool: ConnectionPool) -> None:
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+
+
+def test_rollback_on_error(pool: ConnectionPool) -> None:
+    def insert_and_fail() -> None:
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('lost')")
+            raise ValueError
+
+    with pytest.raises(ValueError):
+        insert_and_fail()
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT * FROM items").fetchall() == []
+
+
+def test_pool_is_bounded(pool: ConnectionPool) -> None:
+    checked_out = threading.Barrier(3)
+    release = threading.Event()
+
+    def hold() -> None:
+        with pool.connection():
+            checked_out.wait()
+            release.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    checked_out.wait()
+
+    with pytest.raises(PoolExhaustedError):
+        with pool.connection():
+            pass
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_pragmas_applied() -> None:
+    pool = ConnectionPool("test_pool.db", pragmas={"cache_size": -4000})
+    try:
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -4000
+    finally:
+        pool.close()
+        pathlib.Path.unlink("test_pool.db")
+
+
+def test_unhealthy_connection_replaced(pool: ConnectionPool) -> None:
+    pool.health_check_interval = 0
+    with pool.connection() as conn:
+        stale = conn
+    stale.close()
+
+    with pool.connection() as conn:
+        assert conn is not stale
+        conn.execute("SELECT * FROM items").fetchall()
+
+    assert pool.opened == 2
+
+
+def test_unshared_checkout_is_not_joined(pool: ConnectionPool) -> None:
+    with pool.connection(shared=False) as unshared:
+        with pool.connection() as conn:
+            assert conn is not unshared
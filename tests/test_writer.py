@@ -0,0 +1,55 @@
+import pathlib
+import threading
+from typing import Generator
+
+import pytest
+
+import db
+from entity.record import Record
+from pool import close_pools
+from service.record.base import RecordAlreadyExistsError
+from service.record.v2 import RecordRevisionHistoryService
+from writer import close_write_queues, get_write_queue
+
+
+@pytest.fixture
+def service() -> Generator[RecordRevisionHistoryService, None, None]:
+    db.initialize_db("test_writer.db")
+    service = RecordRevisionHistoryService()
+    service.db_name = "test_writer.db"
+    service.single_writer = True
+    yield service
+    close_write_queues()
+    close_pools()
+    for suffix in ("", "-wal", "-shm"):
+        pathlib.Path("test_writer.db" + suffix).unlink(missing_ok=True)
+
+
+def test_writes_are_group_committed(service: RecordRevisionHistoryService) -> None:
+    threads, writes = 8, 10
+
+    def write(thread: int) -> None:
+        for n in range(writes):
+            service.upsert_record("1", {f"{thread}-{n}": "written"})
+
+    workers = [threading.Thread(target=write, args=(t,)) for t in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    write_queue = get_write_queue(service.db_name)
+
+    assert service.get_record("1").version == threads * writes
+    assert write_queue.writes == threads * writes
+    assert write_queue.batches <= write_queue.writes
+
+
+def test_failed_write_is_isolated(service: RecordRevisionHistoryService) -> None:
+    service.create_record(Record("1", {"name": "Anna"}))
+
+    with pytest.raises(RecordAlreadyExistsError):
+        service.create_record(Record("1", {"name": "Bo"}))
+    service.update_record("1", {"species": "human"})
+
+    assert service.get_record("1").data == {"name": "Anna", "species": "human"}
@@ -0,0 +1,143 @@
+import functools
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+from pool import ConnectionPool, get_pool
+
+T = TypeVar("T")
+DEFAULT_MAX_BATCH = 64
+
+_Write = tuple[Callable[[], Any], "Future[Any]"]
+
+
+class WriteQueue:
+    """In-process single writer that group-commits queued writes.
+
+    Writes submitted from any thread run one after another on the writer thread,
+    up to max_batch of them in one transaction. Each write runs in its own
+    savepoint, so a failing write is rolled back and raised to its caller without
+    undoing the rest of the batch. Callers block until their batch is committed.
+    """
+
+    def __init__(
+        self, pool: ConnectionPool, max_batch: int = DEFAULT_MAX_BATCH
+    ) -> None:
+        """Create the queue and start its writer thread."""
+        self.pool = pool
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue: queue.SimpleQueue[_Write | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name=f"writer {pool.db_name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, write: Callable[[], T]) -> T:
+        """Run write on the writer thread and return its result once committed."""
+        future: Future[T] = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def on_writer_thread(self) -> bool:
+        """Check whether the caller is already running inside a queued write."""
+        return threading.current_thread() is self._thread
+
+    def close(self) -> None:
+        """Stop the writer thread once queued writes are committed."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: list[_Write]) -> None:
+        outcomes: list[tuple[Future[Any], Any, BaseException | None]] = []
+        try:
+            with self.pool.connection(immediate=True) as conn:
+                for write, future in batch:
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        result = write()
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO queued_write")
+                        outcomes.append((future, None, e))
+                    else:
+                        outcomes.append((future, result, None))
+                    conn.execute("RELEASE queued_write")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_queues: dict[str, WriteQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(db_name: str) -> WriteQueue:
+    """Get the shared write queue for a database file, starting it on first use."""
+    write_queue = _queues.get(db_name)
+    if write_queue is not None:
+        return write_queue
+
+    with _queues_lock:
+        write_queue = _queues.get(db_name)
+        if write_queue is None:
+            write_queue = _queues[db_name] = WriteQueue(get_pool(db_name))
+
+    return write_queue
+
+
+def close_write_queues() -> None:
+    """Stop and forget all shared write queues."""
+    with _queues_lock:
+        write_queues = list(_queues.values())
+        _queues.clear()
+
+    for write_queue in write_queues:
+        write_queue.close()
+
+
+def queued(method: Callable[..., T]) -> Callable[..., T]:
+    """Run a service write method on the service's write queue when it has one."""
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+        write_queue = self.write_queue
+        if write_queue is None or write_queue.on_writer_thread():
+            return method(self, *args, **kwargs)
+
+        return write_queue.submit(functools.partial(method, self, *args, **kwargs))
+
+    return wrapper